@@ -0,0 +1,3 @@
+"""
+Benchmarks for Codemagic MCP server, run with `python -m benchmarks.run`.
+"""
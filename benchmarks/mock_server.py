@@ -0,0 +1,365 @@
+"""
+Local mock of the Codemagic API for benchmarks.
+
+Serves generated fixtures shaped like the real API: a build history of
+configurable size, multi-megabyte build and step logs (JSON with the log
+text in string values, like the real log endpoints), and large artifacts
+streamed in chunks. Every response can be delayed and a fraction of them
+answered with 503 to exercise the retry path. The server counts requests
+and TCP connections so the harness can report connection reuse.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+# Chunk size used when streaming artifacts
+ARTIFACT_CHUNK_SIZE = 256 * 1024
+
+# Steps every generated build runs, in order
+STEP_NAMES = ["Preparing build machine", "Fetching app sources", "Restoring cache", "Installing dependencies",
+              "Building iOS", "Building Android", "Running tests", "Publishing"]
+
+BUILD_STATUSES = ["finished"] * 7 + ["failed", "canceled", "timeout"]
+INSTANCE_TYPES = ["mac_mini_m2", "linux_x2", "windows_x2"]
+
+
+@dataclass
+class MockConfig:
+    """Fixture sizes and fault injection of the mock API."""
+
+    apps: int = 3
+    builds: int = 1000
+    log_bytes: int = 5 * 1024 * 1024
+    artifact_bytes: int = 50 * 1024 * 1024
+    latency: float = 0.02
+    jitter: float = 0.01
+    error_rate: float = 0.0
+    seed: int = 1
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def generate_builds(config: MockConfig) -> List[Dict[str, Any]]:
+    """Generate a build history, newest build first."""
+    rng = random.Random(config.seed)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    builds = []
+    for i in range(config.builds):
+        created = now - timedelta(minutes=37 * i)
+        started = created + timedelta(seconds=rng.randint(5, 600))
+        status = BUILD_STATUSES[rng.randrange(len(BUILD_STATUSES))]
+        steps = []
+        step_start = started
+        for j, name in enumerate(STEP_NAMES):
+            step_end = step_start + timedelta(seconds=rng.randint(5, 900))
+            failed = status == "failed" and j == len(STEP_NAMES) - 2
+            steps.append({
+                "_id": f"step{i:05d}{j}",
+                "name": name,
+                "status": "failed" if failed else "success",
+                "startedAt": _timestamp(step_start),
+                "finishedAt": _timestamp(step_end),
+            })
+            step_start = step_end
+            if failed:
+                break
+        builds.append({
+            "_id": f"build{i:05d}",
+            "appId": f"app{i % config.apps}",
+            "workflowId": f"workflow{i % 4}",
+            "branch": ["main", "develop", f"feature/{i % 17}"][i % 3],
+            "tag": f"v1.{i}" if i % 25 == 0 else None,
+            "status": status,
+            "instanceType": INSTANCE_TYPES[i % len(INSTANCE_TYPES)],
+            "createdAt": _timestamp(created),
+            "startedAt": _timestamp(started),
+            "finishedAt": _timestamp(step_start),
+            "commit": {"hash": f"{rng.getrandbits(160):040x}", "authorName": "Jane Doe",
+                       "commitMessage": "Update dependencies " * 10},
+            "config": {"workflows": {f"workflow{i % 4}": {"scripts": ["flutter build"] * 20}}},
+            "buildActions": steps,
+            "artefacts": [{"name": "app-release.ipa", "type": "ipa", "size": config.artifact_bytes,
+                           "url": f"https://api.codemagic.io/artifacts/{i:05d}/app-release.ipa"}],
+        })
+    return builds
+
+
+def generate_log(size: int, seed: int = 1) -> bytes:
+    """Generate a build log of about size bytes, with warnings and a failure near the end."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    number = 0
+    while total < size:
+        number += 1
+        roll = rng.random()
+        if roll < 0.01:
+            line = f"warning: deprecated API used in Module{number % 50}.swift:{number % 400}"
+        elif roll < 0.012:
+            line = f"error: cannot find 'Foo{number}' in scope"
+        else:
+            line = f"[{number:08d}] Compiling Source{number % 1000}.swift (arm64) " + "x" * rng.randint(10, 80)
+        lines.append(line)
+        total += len(line) + 1
+    lines.append("** BUILD FAILED **")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def build_log_response(log: bytes) -> bytes:
+    """Get the /builds/{id}/logs response for a log: its lines split over the steps, each with its logs."""
+    lines = log.decode().splitlines(keepends=True)
+    per_step = -(-len(lines) // len(STEP_NAMES))
+    steps = [
+        {"_id": f"step{j}", "name": name, "status": "failed" if j == len(STEP_NAMES) - 1 else "success",
+         "logs": "".join(lines[j * per_step:(j + 1) * per_step])}
+        for j, name in enumerate(STEP_NAMES)
+    ]
+    return json.dumps({"steps": steps}).encode()
+
+
+def step_log_response(log: bytes) -> bytes:
+    """Get the /builds/{id}/steps/{step_id}/logs response for a log."""
+    return json.dumps({"content": log.decode()}).encode()
+
+
+class MockCodemagicServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fixtures and request/connection counters."""
+
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig, address: Tuple[str, int] = ("127.0.0.1", 0)):
+        super().__init__(address, MockHandler)
+        self.config = config
+        self.builds = generate_builds(config)
+        self.builds_by_id = {build["_id"]: build for build in self.builds}
+        log = generate_log(config.log_bytes, config.seed)
+        self.build_log = build_log_response(log)
+        self.step_log = step_log_response(log)
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors_injected = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.max_open_connections = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address) -> None:
+        with self.lock:
+            self.connections += 1
+            self.open_connections += 1
+            self.max_open_connections = max(self.max_open_connections, self.open_connections)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request) -> None:
+        with self.lock:
+            self.open_connections -= 1
+        super().shutdown_request(request)
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients closing a connection mid-response, e.g. after reading a log tail, are expected
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def counters(self) -> Dict[str, int]:
+        """Get a snapshot of the request and connection counters."""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors_injected": self.errors_injected,
+                "connections": self.connections,
+                "open_connections": self.open_connections,
+                "max_open_connections": self.max_open_connections,
+            }
+
+    def reset_peak(self) -> None:
+        """Start measuring the peak of open connections from now."""
+        with self.lock:
+            self.max_open_connections = self.open_connections
+
+    def start(self) -> "MockCodemagicServer":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes requests to the fixture endpoints of the mock API."""
+
+    protocol_version = "HTTP/1.1"
+    server: MockCodemagicServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _byte_range(self, size: int) -> Optional[Tuple[int, int]]:
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not match:
+            return None
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        return start, min(end, size - 1)
+
+    def _send_bytes(self, size: int, content_type: str, read) -> None:
+        byte_range = self._byte_range(size)
+        if byte_range and byte_range[0] >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        position = start
+        while position <= end:
+            length = min(ARTIFACT_CHUNK_SIZE, end + 1 - position)
+            self.wfile.write(read(position, length))
+            position += length
+
+    def _inject_faults(self) -> bool:
+        config = self.server.config
+        with self.server.lock:
+            self.server.requests += 1
+            delay = config.latency + self.server.rng.uniform(0, config.jitter)
+            fail = self.server.rng.random() < config.error_rate
+            if fail:
+                self.server.errors_injected += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            self._send_json(503, {"error": "Service temporarily unavailable"})
+        return fail
+
+    def _read_body(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+
+    def do_GET(self) -> None:
+        if self._inject_faults():
+            return
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        server = self.server
+        apps = [{"_id": f"app{i}", "appName": f"App {i}", "workflowIds": [f"workflow{j}" for j in range(4)]}
+                for i in range(server.config.apps)]
+
+        if path == "/apps":
+            return self._send_json(200, {"applications": apps})
+
+        match = re.match(r"^/apps/([^/]+)(/workflows|/caches)?$", path)
+        if match:
+            app = next((app for app in apps if app["_id"] == match.group(1)), None)
+            if app is None:
+                return self._send_json(404, {"error": "Application not found"})
+            if match.group(2) == "/workflows":
+                return self._send_json(200, {"workflows": {
+                    f"workflow{j}": {"name": f"Workflow {j}", "instanceType": INSTANCE_TYPES[j % 3]} for j in range(4)
+                }})
+            if match.group(2) == "/caches":
+                return self._send_json(200, {"caches": [
+                    {"_id": f"{app['_id']}-cache{j}", "workflowId": f"workflow{j}", "size": (j + 1) * 512 * 1024 * 1024,
+                     "createdAt": _timestamp(datetime(2025, 12, 1 + j, tzinfo=timezone.utc)),
+                     "lastUsed": _timestamp(datetime(2025, 12, 20 + j, tzinfo=timezone.utc))} for j in range(4)
+                ]})
+            return self._send_json(200, {"application": app})
+
+        match = re.match(r"^/workflows/([^/]+)$", path)
+        if match:
+            return self._send_json(200, {"_id": match.group(1), "name": match.group(1), "scripts": []})
+
+        if path == "/builds":
+            builds = [
+                build for build in server.builds
+                if all(build.get(field) == query[param] for param, field in
+                       (("appId", "appId"), ("workflowId", "workflowId"), ("branch", "branch"), ("tag", "tag"))
+                       if param in query)
+            ]
+            skip = int(query.get("skip", 0))
+            limit = int(query.get("limit", 50))
+            return self._send_json(200, {"applications": apps, "builds": builds[skip:skip + limit]})
+
+        match = re.match(r"^/builds/([^/]+)(?:/(.+))?$", path)
+        if match:
+            build = server.builds_by_id.get(match.group(1))
+            if build is None:
+                return self._send_json(404, {"error": "Build not found"})
+            resource = match.group(2)
+            if resource is None:
+                app = next(app for app in apps if app["_id"] == build["appId"])
+                return self._send_json(200, {"application": app, "build": build})
+            if resource == "logs" or re.match(r"^steps/[^/]+/logs$", resource):
+                log = server.build_log if resource == "logs" else server.step_log
+                return self._send_bytes(len(log), "application/json", lambda start, length: log[start:start + length])
+            if resource in ("workflow", "steps"):
+                return self._send_json(200, {"steps": build["buildActions"]})
+            if resource == "timeline":
+                return self._send_json(200, {"timeline": [
+                    {"name": step["name"], "startedAt": step["startedAt"], "finishedAt": step["finishedAt"]}
+                    for step in build["buildActions"]
+                ]})
+            if resource == "artifacts":
+                return self._send_json(200, {"artifacts": build["artefacts"]})
+            if resource == "environment":
+                return self._send_json(200, {"environment": {
+                    "instanceType": build["instanceType"], "xcode": "16.2", "flutter": "3.27.1",
+                    "variables": {f"VAR_{j}": f"value{j}" for j in range(50)},
+                }})
+
+        if path.startswith("/artifacts/"):
+            pattern = bytes(range(256)) * (ARTIFACT_CHUNK_SIZE // 256)
+
+            def read(start: int, length: int) -> bytes:
+                offset = start % 256
+                return (pattern[offset:] + pattern[:offset])[:length]
+
+            return self._send_bytes(server.config.artifact_bytes, "application/octet-stream", read)
+
+        self._send_json(404, {"error": f"Unknown endpoint {path}"})
+
+    def do_POST(self) -> None:
+        self._read_body()
+        if self._inject_faults():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        if re.match(r"^/builds/[^/]+/cancel$", path):
+            return self._send_json(200, {})
+        if path == "/builds":
+            return self._send_json(200, {"buildId": "build-new"})
+        if re.match(r"^/artifacts/.+/public-url$", path):
+            return self._send_json(200, {"url": f"https://example.com{path}", "expiresAt": "2026-01-02T00:00:00Z"})
+        self._send_json(200, {})
+
+    def do_DELETE(self) -> None:
+        if self._inject_faults():
+            return
+        self._send_json(202, {})
@@ -0,0 +1,297 @@
+"""
+Benchmark harness for Codemagic MCP server.
+
+Starts the mock Codemagic API, points the server at it and calls tools
+through the MCP tool dispatcher, sequentially and concurrently. For each
+scenario it reports throughput, latency percentiles, memory use and the
+number of API requests and TCP connections, as JSON that can be compared
+across commits:
+
+    poetry run python -m benchmarks.run --output before.json
+    poetry run python -m benchmarks.run --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .mock_server import MockCodemagicServer, MockConfig
+
+
+@dataclass
+class Scenario:
+    """A tool called repeatedly with arguments derived from the call number."""
+
+    name: str
+    tool: str
+    arguments: Callable[[int], Dict[str, Any]]
+    calls: Optional[int] = None
+    concurrent: bool = True
+
+
+def build_scenarios(config: MockConfig, downloads: str) -> List[Scenario]:
+    """Get the benchmark scenarios for a mock fixture configuration, downloading artifacts into downloads."""
+    build_id = lambda i: f"build{i % config.builds:05d}"
+    failed_build = next(i for i in range(config.builds) if i % 10 == 7)
+
+    return [
+        Scenario("list_applications", "get_all_applications", lambda i: {}),
+        Scenario("list_builds", "get_builds", lambda i: {"compact": True}),
+        Scenario("build_status", "get_build_status", lambda i: {"build_id": build_id(i)}),
+        Scenario("build_status_compact", "get_build_status",
+                 lambda i: {"build_id": build_id(i), "fields": ["build.status", "build.finishedAt"]}),
+        Scenario("build_summary", "get_build_summary", lambda i: {"build_id": build_id(i), "compact": True}),
+        Scenario("find_failed_builds", "find_builds", lambda i: {"status": ["failed"], "max_results": 50}),
+        Scenario("build_timeline", "get_build_timeline", lambda i: {"build_id": build_id(i)}),
+        Scenario("build_logs", "get_build_logs", lambda i: {"build_id": build_id(i)}, calls=4),
+        Scenario("step_logs", "get_build_step_logs",
+                 lambda i: {"build_id": build_id(i), "step_id": f"step{i % config.builds:05d}0"}, calls=4),
+        Scenario("diagnose_build", "diagnose_build", lambda i: {"build_id": build_id(failed_build)}, calls=4),
+        Scenario("log_tail", "read_build_log", lambda i: {"build_id": build_id(i), "tail": 200}),
+        Scenario("log_errors", "read_build_log", lambda i: {"build_id": build_id(i), "severity": "error"}),
+        Scenario("log_head", "read_build_log", lambda i: {"build_id": build_id(failed_build), "max_lines": 100}),
+        Scenario("bulk_status", "get_builds_status_bulk",
+                 lambda i: {"build_ids": [build_id(i * 20 + j) for j in range(20)]}),
+        Scenario("sync_index", "sync_build_index", lambda i: {}, calls=1, concurrent=False),
+        Scenario("query_index", "query_build_index", lambda i: {"status": ["failed"], "limit": 50}),
+        Scenario("index_stats", "build_index_stats", lambda i: {"group_by": ["workflow_id", "status"]}),
+        Scenario("download_artifact", "download_artifact",
+                 lambda i: {"secure_filename": f"{i:05d}/app-release.ipa",
+                            "target_path": os.path.join(downloads, f"artifact-{i}.ipa"), "resume": False},
+                 calls=4),
+    ]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Get the nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    """Get the current resident set size in MB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident set size in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+async def run_scenario(
+    mcp: Any,
+    server: MockCodemagicServer,
+    scenario: Scenario,
+    mode: str,
+    calls: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Run one scenario and measure it."""
+    from codemagic_mcp.base import clear_cache, close_client
+
+    # Every scenario starts with an empty response cache and a fresh connection pool
+    clear_cache()
+    await close_client()
+    server.reset_peak()
+    before = server.counters()
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await mcp.call_tool(scenario.tool, scenario.arguments(i))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    wall = time.perf_counter() - started
+    after = server.counters()
+
+    return {
+        "scenario": scenario.name,
+        "tool": scenario.tool,
+        "mode": mode,
+        "calls": calls,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": round(wall, 4),
+        "throughput": round(calls / wall, 2) if wall else None,
+        "latency": {
+            "mean": round(sum(latencies) / len(latencies), 4),
+            "p50": round(percentile(latencies, 0.5), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+            "max": round(max(latencies), 4),
+        },
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "api_requests": after["requests"] - before["requests"],
+        "errors_injected": after["errors_injected"] - before["errors_injected"],
+        "connections_opened": after["connections"] - before["connections"],
+        "max_open_connections": after["max_open_connections"],
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any]) -> None:
+    """Annotate results with the relative change against a baseline run."""
+    previous = {(result["scenario"], result["mode"]): result for result in baseline.get("results", [])}
+    for result in results:
+        old = previous.get((result["scenario"], result["mode"]))
+        if not old:
+            continue
+        change = {}
+        for key in ("p50", "p99"):
+            if old["latency"].get(key):
+                change[f"latency_{key}"] = round(result["latency"][key] / old["latency"][key] - 1, 3)
+        if old.get("throughput"):
+            change["throughput"] = round(result["throughput"] / old["throughput"] - 1, 3)
+        change["peak_rss_mb"] = round(result["peak_rss_mb"] - old["peak_rss_mb"], 1)
+        result["change"] = change
+
+
+def git_commit() -> Optional[str]:
+    """Get the commit being benchmarked, if run from a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run all selected scenarios against a fresh mock API."""
+    config = MockConfig(
+        apps=args.apps,
+        builds=args.builds,
+        log_bytes=int(args.log_mb * 2 ** 20),
+        artifact_bytes=int(args.artifact_mb * 2 ** 20),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server = MockCodemagicServer(config).start()
+
+    with tempfile.TemporaryDirectory(prefix="codemagic-bench-") as workdir:
+        # The server reads its configuration when first imported
+        os.environ["CODEMAGIC_API_URL"] = server.url
+        os.environ["CODEMAGIC_API_KEY"] = "benchmark"
+        os.environ["CODEMAGIC_INDEX_PATH"] = os.path.join(workdir, "builds.sqlite3")
+        os.environ["CODEMAGIC_DISK_CACHE_DIR"] = os.path.join(workdir, "disk-cache")
+        os.environ["CODEMAGIC_RATE_LIMIT"] = str(args.rate_limit)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        import_started = time.perf_counter()
+        from codemagic_mcp.server import mcp
+        from codemagic_mcp.base import close_client
+        import_seconds = time.perf_counter() - import_started
+
+        downloads = os.path.join(workdir, "downloads")
+        results = []
+        for scenario in build_scenarios(config, downloads):
+            if args.scenario and scenario.name not in args.scenario:
+                continue
+            # Downloaded artifacts are removed between scenarios to bound disk use
+            shutil.rmtree(downloads, ignore_errors=True)
+            os.makedirs(downloads)
+            calls = scenario.calls or args.calls
+            results.append(await run_scenario(mcp, server, scenario, "single", calls, 1))
+            if scenario.concurrent and args.concurrency > 1:
+                results.append(await run_scenario(
+                    mcp, server, scenario, "concurrent", max(calls, args.concurrency), args.concurrency
+                ))
+            if not args.quiet:
+                for result in results[-2:] if scenario.concurrent and args.concurrency > 1 else results[-1:]:
+                    print(
+                        f"{result['scenario']:<22} {result['mode']:<10} {result['throughput']:>8} calls/s  "
+                        f"p50 {result['latency']['p50'] * 1000:>8.1f} ms  p99 {result['latency']['p99'] * 1000:>8.1f} ms  "
+                        f"rss {result['rss_mb']:>6.1f} MB  conns {result['connections_opened']:>3}  "
+                        f"errors {result['errors']}",
+                        file=sys.stderr
+                    )
+        await close_client()
+
+    server.shutdown()
+    server.server_close()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "import_seconds": round(import_seconds, 4),
+            "config": asdict(config),
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "rate_limit": args.rate_limit,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Codemagic MCP tools against a local mock API")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--scenario", action="append", help="Run only this scenario (repeatable)")
+    parser.add_argument("--calls", type=int, default=20, help="Calls per scenario (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent calls in the concurrent mode (default: 8)")
+    parser.add_argument("--apps", type=int, default=3, help="Number of mock applications (default: 3)")
+    parser.add_argument("--builds", type=int, default=1000, help="Number of builds in the mock history (default: 1000)")
+    parser.add_argument("--log-mb", type=float, default=5, help="Size of mock build and step logs in MB (default: 5)")
+    parser.add_argument("--artifact-mb", type=float, default=50, help="Size of mock artifacts in MB (default: 50)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Added latency per API response in seconds (default: 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Random extra latency up to this many seconds (default: 0.01)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of API requests answered with 503 (default: 0)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Client rate limit in requests per second, 0 disables it (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for fixtures and fault injection (default: 1)")
+    parser.add_argument("--quiet", action="store_true", help="Do not print a summary line per scenario to stderr")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(report["results"], json.load(baseline))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    # Without injected faults every call should succeed; a failing tool must not pass unnoticed
+    failed = [result["scenario"] for result in report["results"] if result["errors"]]
+    if failed and not args.error_rate:
+        print(f"Scenarios with errors: {', '.join(dict.fromkeys(failed))}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
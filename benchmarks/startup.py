@@ -0,0 +1,164 @@
+"""
+Startup profile for Codemagic MCP server.
+
+Spawns the server the way MCP clients do (python -m codemagic_mcp.server
+over stdio) and measures the time from process start until the response to
+the first tools/list request, with a cold and a warm tool manifest, next
+to the time of importing FastMCP alone. The budget applies to the warm
+overhead on top of that baseline, which is the part this package controls.
+Also reports the slowest imports from python -X importtime:
+
+    poetry run python -m benchmarks.startup
+    poetry run python -m benchmarks.startup --runs 10 --budget 0.15 --check
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+
+# Time the warm startup may add on top of starting Python and importing FastMCP,
+# until the first tools/list is answered, in seconds
+DEFAULT_BUDGET = 0.150
+
+SERVER_COMMAND = [sys.executable, "-m", "codemagic_mcp.server"]
+
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2025-03-26", "capabilities": {},
+               "clientInfo": {"name": "startup-benchmark", "version": "0"}},
+}
+INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+LIST_TOOLS = {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+
+
+def time_to_list_tools(env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Start the server and time the responses to initialize and the first tools/list.
+
+    Returns:
+        Dictionary with the seconds until each response and the number of tools listed
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        SERVER_COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env
+    )
+    try:
+        process.stdin.write((json.dumps(INITIALIZE) + "\n").encode())
+        process.stdin.flush()
+        result: Dict[str, Any] = {}
+        for line in process.stdout:
+            message = json.loads(line)
+            if message.get("id") == 1:
+                result["initialize"] = time.perf_counter() - started
+                process.stdin.write((json.dumps(INITIALIZED) + "\n" + json.dumps(LIST_TOOLS) + "\n").encode())
+                process.stdin.flush()
+            elif message.get("id") == 2:
+                result["list_tools"] = time.perf_counter() - started
+                result["tools"] = len(message["result"]["tools"])
+                return result
+        raise RuntimeError("Server exited before answering tools/list")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_profile(env: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Get the imports of the server, slowest first by cumulative time, from python -X importtime."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import codemagic_mcp.server"],
+        capture_output=True, text=True, env=env, check=True
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return sorted(imports, key=lambda item: item["cumulative_ms"], reverse=True)
+
+
+def summarize(samples: List[float]) -> Dict[str, Optional[float]]:
+    """Get the median, minimum and maximum of timing samples in seconds."""
+    return {
+        "median": round(statistics.median(samples), 4),
+        "min": round(min(samples), 4),
+        "max": round(max(samples), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile Codemagic MCP server startup")
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per scenario (default: 5)")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to report (default: 15)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="Warm startup overhead budget in seconds (default: 0.15)")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if the warm startup overhead exceeds the budget")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="codemagic-startup-") as workdir:
+        manifest = os.path.join(workdir, "tools.json")
+        env = {**os.environ, "CODEMAGIC_API_KEY": "startup", "CODEMAGIC_TOOL_MANIFEST": manifest}
+
+        # Baseline: the interpreter with FastMCP alone, which this package cannot speed up.
+        # Scenarios are interleaved so that machine noise affects them alike.
+        fastmcp_samples, cold, warm = [], [], []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "import mcp.server.fastmcp"], env=env, check=True)
+            fastmcp_samples.append(time.perf_counter() - started)
+            if os.path.exists(manifest):
+                os.remove(manifest)
+            cold.append(time_to_list_tools(env))
+            warm.append(time_to_list_tools(env))
+        imports = import_profile(env)
+
+        fastmcp = summarize(fastmcp_samples)
+        warm_list_tools = summarize([run["list_tools"] for run in warm])
+        # Fastest runs are compared, being the least disturbed by the machine
+        overhead = round(warm_list_tools["min"] - fastmcp["min"], 4)
+        report = {
+            "runs": args.runs,
+            "tools": warm[-1]["tools"],
+            "python": sys.version.split()[0],
+            "fastmcp_import": fastmcp,
+            "cold": {
+                "initialize": summarize([run["initialize"] for run in cold]),
+                "list_tools": summarize([run["list_tools"] for run in cold]),
+            },
+            "warm": {
+                "initialize": summarize([run["initialize"] for run in warm]),
+                "list_tools": warm_list_tools,
+            },
+            # Startup time spent beyond starting Python and importing FastMCP
+            "warm_overhead": overhead,
+            "budget": args.budget,
+            "within_budget": overhead <= args.budget,
+            "slowest_imports": imports[:args.top],
+            "package_imports": [item for item in imports if item["module"].startswith("codemagic_mcp")],
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    if args.check and not report["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 """
 Codemagic MCP package for integration with Codemagic CI/CD API.
 """
+from dotenv import load_dotenv
 
-__version__ = "0.1.0"
\ No newline at end of file
+__version__ = "0.1.0"
+
+# Load environment variables from .env file, before any module of the package reads its configuration
+load_dotenv()
@@ -0,0 +1,267 @@
+"""
+CI analytics for Codemagic MCP server.
+
+Walks the build history page by page and folds every build into compact
+per-group columns of numbers (durations, queue waits, step timings), so
+memory depends on the number of groups, not on the number of builds.
+Percentiles and rates are computed from those columns at the end and
+returned as small tables instead of raw build records.
+
+Step timings come from the steps of the build record or, when it has none,
+the build's steps endpoint, as in fetch_build_steps; the timeline is a list
+of events rather than per-step start and finish times.
+"""
+import asyncio
+import math
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List, Tuple
+from .base import parse_timestamp
+from .builds import iter_builds, extract_steps, fetch_build_resource, BUILDS_PAGE_SIZE
+
+
+# Build fields analytics can be grouped by
+GROUP_FIELDS = {
+    "app": "appId",
+    "workflow": "workflowId",
+    "branch": "branch",
+    "instance_type": "instanceType",
+}
+
+# How far back analytics look by default
+DEFAULT_WINDOW = timedelta(days=30)
+
+# Maximum builds analyzed per call by default
+DEFAULT_MAX_BUILDS = 1000
+
+# Maximum concurrent step requests for builds whose records lack steps
+STEPS_CONCURRENCY = 8
+
+SUCCESS_STATUSES = {"finished", "success"}
+FAILURE_STATUSES = {"failed", "timeout"}
+
+
+def percentile(values: array, q: float) -> Optional[float]:
+    """Get a percentile of a column by linear interpolation between the closest ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _seconds_between(start: Optional[str], end: Optional[str]) -> Optional[float]:
+    started = parse_timestamp(start)
+    finished = parse_timestamp(end)
+    if started is None or finished is None:
+        return None
+    return max(0.0, (finished - started).total_seconds())
+
+
+def _round(value: Optional[float], digits: int = 1) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+class BuildAggregator:
+    """Folds builds into per-group numeric columns and renders them as tables."""
+
+    def __init__(self, group_field: str):
+        self.group_field = group_field
+        self.builds = 0
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: {"success": 0, "failure": 0, "other": 0})
+        self.durations: Dict[str, array] = defaultdict(lambda: array("d"))
+        self.queue_waits: Dict[str, array] = defaultdict(lambda: array("d"))
+        self.machine_minutes: Dict[str, int] = defaultdict(int)
+        self.step_durations: Dict[Tuple[str, str], array] = defaultdict(lambda: array("d"))
+        self.step_runs: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {"runs": 0, "failures": 0, "flips": 0})
+        self._last_step_status: Dict[Tuple[str, str, str], bool] = {}
+
+    def add(self, build: Dict[str, Any], steps: List[Dict[str, Any]]) -> None:
+        """Fold one build and its steps into the columns."""
+        self.builds += 1
+        group = str(build.get(self.group_field) or "unknown")
+        status = str(build.get("status", "")).lower()
+        outcome = "success" if status in SUCCESS_STATUSES else "failure" if status in FAILURE_STATUSES else "other"
+        self.outcomes[group][outcome] += 1
+
+        duration = _seconds_between(build.get("startedAt"), build.get("finishedAt"))
+        if duration is not None and outcome != "other":
+            self.durations[group].append(duration)
+        if duration is not None:
+            self.machine_minutes[build.get("instanceType") or "unknown"] += math.ceil(duration / 60)
+
+        queue_wait = _seconds_between(build.get("createdAt"), build.get("startedAt"))
+        if queue_wait is not None:
+            self.queue_waits[build.get("instanceType") or "unknown"].append(queue_wait)
+
+        workflow = str(build.get("workflowId") or "unknown")
+        branch = str(build.get("branch") or build.get("tag") or "")
+        for step in steps:
+            name = step.get("name") or "unnamed"
+            step_status = str(step.get("status", "")).lower()
+            step_duration = _seconds_between(step.get("startedAt"), step.get("finishedAt"))
+            if step_duration is not None:
+                self.step_durations[(workflow, name)].append(step_duration)
+            if step_status not in SUCCESS_STATUSES and step_status not in FAILURE_STATUSES:
+                continue
+            failed = step_status in FAILURE_STATUSES
+            runs = self.step_runs[(workflow, name)]
+            runs["runs"] += 1
+            runs["failures"] += failed
+            # A flip is a step changing outcome from one build to the next on the same workflow and branch
+            key = (workflow, branch, name)
+            if key in self._last_step_status and self._last_step_status[key] != failed:
+                runs["flips"] += 1
+            self._last_step_status[key] = failed
+
+    def duration_table(self) -> Dict[str, Any]:
+        rows = []
+        for group, outcomes in sorted(self.outcomes.items(), key=lambda item: -sum(item[1].values())):
+            column = self.durations.get(group, array("d"))
+            decided = outcomes["success"] + outcomes["failure"]
+            rows.append([
+                group,
+                sum(outcomes.values()),
+                _round(outcomes["success"] / decided, 3) if decided else None,
+                _round(percentile(column, 0.5) / 60 if column else None),
+                _round(percentile(column, 0.95) / 60 if column else None),
+                _round(max(column) / 60 if column else None),
+            ])
+        return {"columns": ["group", "builds", "success_rate", "p50_minutes", "p95_minutes", "max_minutes"], "rows": rows}
+
+    def queue_table(self) -> Dict[str, Any]:
+        rows = [
+            [instance_type, len(column), _round(percentile(column, 0.5)), _round(percentile(column, 0.95)),
+             _round(max(column))]
+            for instance_type, column in sorted(self.queue_waits.items())
+        ]
+        return {"columns": ["instance_type", "builds", "p50_seconds", "p95_seconds", "max_seconds"], "rows": rows}
+
+    def step_table(self, top: int) -> Dict[str, Any]:
+        rows = [
+            [workflow, name, len(column), _round(percentile(column, 0.5)), _round(percentile(column, 0.95)),
+             _round(sum(column) / 60)]
+            for (workflow, name), column in self.step_durations.items()
+        ]
+        rows.sort(key=lambda row: -row[5])
+        return {
+            "columns": ["workflow", "step", "runs", "p50_seconds", "p95_seconds", "total_minutes"],
+            "rows": rows[:top],
+        }
+
+    def flaky_table(self, top: int) -> Dict[str, Any]:
+        rows = []
+        for (workflow, name), runs in self.step_runs.items():
+            if not runs["failures"] or runs["failures"] == runs["runs"]:
+                continue
+            rows.append([
+                workflow, name, runs["runs"], runs["failures"],
+                _round(runs["failures"] / runs["runs"], 3),
+                runs["flips"],
+                _round(runs["flips"] / max(1, runs["runs"] - 1), 3),
+            ])
+        rows.sort(key=lambda row: (-row[6], -row[3]))
+        return {
+            "columns": ["workflow", "step", "runs", "failures", "failure_rate", "flips", "flip_rate"],
+            "rows": rows[:top],
+        }
+
+    def cost_table(self, rates: Optional[Dict[str, float]]) -> Dict[str, Any]:
+        rows = []
+        for instance_type, minutes in sorted(self.machine_minutes.items(), key=lambda item: -item[1]):
+            rate = (rates or {}).get(instance_type)
+            rows.append([instance_type, minutes, _round(minutes * rate, 2) if rate is not None else None])
+        return {"columns": ["instance_type", "billable_minutes", "cost"], "rows": rows}
+
+
+def register_analytics_tools(mcp: FastMCP) -> None:
+    """Register all analytics tools with the MCP server."""
+
+    @mcp.tool()
+    async def analyze_builds(
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        since: Optional[str] = None,
+        group_by: str = "workflow",
+        max_builds: int = DEFAULT_MAX_BUILDS,
+        include_steps: bool = True,
+        rates: Optional[Dict[str, float]] = None,
+        top: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Compute CI performance analytics over the build history on the server.
+
+        Returns compact tables instead of build records: build duration (p50/p95) and success rate per
+        group, queue wait per instance type, the slowest steps of each workflow, flaky steps (steps that both pass and
+        fail on the same workflow, with how often their outcome flips between consecutive builds), and
+        billable machine minutes per instance type.
+
+        Args:
+            app_id: Optional filter by application identifier
+            workflow_id: Optional filter by workflow identifier
+            branch: Optional filter by branch name
+            since: Optional ISO 8601 timestamp of the oldest build to include (default: 30 days ago)
+            group_by: Group durations by 'app', 'workflow', 'branch' or 'instance_type' (default: 'workflow')
+            max_builds: Maximum number of builds to analyze, newest first (default: 1000)
+            include_steps: Include step timings and flaky steps (default: True)
+            rates: Optional cost per billable minute by instance type, e.g. {'mac_mini_m2': 0.095}
+            top: Number of rows in the step tables (default: 10)
+
+        Returns:
+            Dictionary with the number of builds analyzed and one table (columns and rows) per metric
+        """
+        if group_by not in GROUP_FIELDS:
+            raise ValueError(f"group_by must be one of: {', '.join(GROUP_FIELDS)}")
+        if since is None:
+            since = (datetime.now(timezone.utc) - DEFAULT_WINDOW).isoformat()
+
+        aggregator = BuildAggregator(GROUP_FIELDS[group_by])
+        semaphore = asyncio.Semaphore(STEPS_CONCURRENCY)
+
+        async def build_steps(build: Dict[str, Any]) -> List[Dict[str, Any]]:
+            steps = extract_steps(build)
+            if steps or not include_steps or not build.get("_id"):
+                return steps
+            async with semaphore:
+                try:
+                    return extract_steps(await fetch_build_resource(build["_id"], "steps"))
+                except Exception:
+                    return []
+
+        async def fold(page: List[Dict[str, Any]]) -> None:
+            all_steps = await asyncio.gather(*map(build_steps, page))
+            for build, steps in zip(page, all_steps):
+                aggregator.add(build, steps if include_steps else [])
+
+        # Builds are folded one page at a time, so only a page of records is held in memory
+        page: List[Dict[str, Any]] = []
+        oldest = None
+        async for build in iter_builds(
+            app_id=app_id, workflow_id=workflow_id, branch=branch, since=since, max_results=max_builds
+        ):
+            page.append(build)
+            oldest = build.get("createdAt") or oldest
+            if len(page) >= BUILDS_PAGE_SIZE:
+                await fold(page)
+                page = []
+        if page:
+            await fold(page)
+
+        result = {
+            "builds": aggregator.builds,
+            "since": since,
+            "oldest_build": oldest,
+            "group_by": group_by,
+            "durations": aggregator.duration_table(),
+            "queue_wait": aggregator.queue_table(),
+            "machine_minutes": aggregator.cost_table(rates),
+        }
+        if include_steps:
+            result["slowest_steps"] = aggregator.step_table(top)
+            result["flaky_steps"] = aggregator.flaky_table(top)
+        return result
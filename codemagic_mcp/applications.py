@@ -3,39 +3,53 @@ Applications API module for Codemagic MCP server.
 """
 from mcp.server.fastmcp import FastMCP
 from typing import Optional, Dict, Any, List
-from .base import make_request
+from .base import make_request, invalidate_cache
+from .projection import shape_response
 
 
 def register_applications_tools(mcp: FastMCP) -> None:
     """Register all application-related tools with the MCP server."""
     
     @mcp.tool()
-    def get_all_applications() -> Dict[str, List[Dict[str, Any]]]:
+    async def get_all_applications(
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Retrieve all applications from Codemagic.
+        
+        Args:
+            fields: Optional field paths to return, e.g. ['applications[*]._id', 'applications[*].appName']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing the applications
         """
-        response = make_request("GET", "/apps")
-        return response.json()
+        response = await make_request("GET", "/apps")
+        return shape_response(response.json(), fields, compact, "applications")
 
     @mcp.tool()
-    def get_application(app_id: str) -> Dict[str, Dict[str, Any]]:
+    async def get_application(
+        app_id: str,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Dict[str, Any]]:
         """
         Retrieve a specific application from Codemagic by ID.
         
         Args:
             app_id: Application ID
+            fields: Optional field paths to return, e.g. ['application._id', 'application.appName']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing the application details
         """
-        response = make_request("GET", f"/apps/{app_id}")
-        return response.json()
+        response = await make_request("GET", f"/apps/{app_id}")
+        return shape_response(response.json(), fields, compact, "applications")
 
     @mcp.tool()
-    def add_application(repository_url: str, team_id: Optional[str] = None) -> Dict[str, Any]:
+    async def add_application(repository_url: str, team_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Add a new application to Codemagic.
         
@@ -50,11 +64,12 @@ def register_applications_tools(mcp: FastMCP) -> None:
         if team_id:
             data["teamId"] = team_id
             
-        response = make_request("POST", "/apps", json=data)
+        response = await make_request("POST", "/apps", json=data)
+        invalidate_cache("/apps")
         return response.json()
 
     @mcp.tool()
-    def add_application_private(
+    async def add_application_private(
         repository_url: str,
         ssh_key_data: str,
         ssh_key_passphrase: Optional[str] = None,
@@ -88,5 +103,6 @@ def register_applications_tools(mcp: FastMCP) -> None:
         if team_id:
             data["teamId"] = team_id
             
-        response = make_request("POST", "/apps/new", json=data)
+        response = await make_request("POST", "/apps/new", json=data)
+        invalidate_cache("/apps")
         return response.json()
@@ -1,47 +1,235 @@
 """
 Artifacts API module for Codemagic MCP server.
 """
-from mcp.server.fastmcp import FastMCP
-from typing import Dict, Any
-from .base import make_request
+import asyncio
+import hashlib
+import os
+import re
+import httpx
+from mcp.server.fastmcp import FastMCP, Context
+from typing import Dict, Any, Awaitable, Callable, Optional
+from .base import make_request, stream_request
+
+
+# Largest artifact get_artifact returns inline, bigger ones must be downloaded to disk
+MAX_INLINE_ARTIFACT_BYTES = int(os.environ.get("CODEMAGIC_MAX_INLINE_ARTIFACT_BYTES", str(10 * 1024 * 1024)))
+
+# Size of the chunks artifacts are streamed and hashed in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[int, Optional[int]], Awaitable[None]]
+
+
+def hash_file(path: str, algorithm: str = "sha256") -> Any:
+    """Hash an existing file in chunks, e.g. so resumed downloads get a full-file digest."""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+
+def content_range_start(value: Optional[str]) -> Optional[int]:
+    """Get the first byte position of a Content-Range header such as 'bytes 100-199/200'."""
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)$", (value or "").strip())
+    return int(match.group(1)) if match else None
+
+
+def progress_reporter(ctx: Optional[Context]) -> Optional[ProgressCallback]:
+    """Get a callback reporting progress to the MCP client, or None if the call did not come from one."""
+    if ctx is None:
+        return None
+    try:
+        ctx.request_context
+    except ValueError:
+        return None
+
+    async def report(done: int, total: Optional[int]) -> None:
+        await ctx.report_progress(done, total)
+
+    return report
+
+
+async def download_artifact_to(
+    secure_filename: str,
+    path: str,
+    resume: bool = True,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Stream an artifact to a file without holding it in memory.
+
+    The download goes to "<path>.part" and is renamed to path once complete.
+    With resume enabled, an existing partial file is continued with an HTTP
+    Range request; if the server ignores the range, or answers with a range
+    starting elsewhere, the download restarts. Hashing and writing run in a
+    worker thread, so large files do not block the event loop.
+
+    Args:
+        secure_filename: The secure filename of the artifact (uuid1/uuid2/filename.ext)
+        path: Destination file path
+        resume: Continue a previous partial download if one exists
+        progress: Optional coroutine called with (downloaded bytes, total bytes or None)
+
+    Returns:
+        Dictionary with the path, size, sha256 and content type of the file
+    """
+    part_path = f"{path}.part"
+    offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    try:
+        async with stream_request("GET", f"/artifacts/{secure_filename}", headers=headers) as response:
+            restart = False
+            if response.status_code == 206:
+                start = content_range_start(response.headers.get("content-range"))
+                if start != offset:
+                    if not offset:
+                        raise RuntimeError(f"Unrequested partial response for artifact {secure_filename}")
+                    # Appending another part of the file than asked for would corrupt it
+                    restart = True
+
+            if not restart:
+                if response.status_code == 206 and offset:
+                    sha256 = await asyncio.to_thread(hash_file, part_path)
+                    mode = "ab"
+                else:
+                    # A 206 for the whole file is as good as a 200
+                    offset = 0
+                    sha256 = hashlib.sha256()
+                    mode = "wb"
+
+                content_length = response.headers.get("content-length")
+                total = offset + int(content_length) if content_length else None
+                content_type = response.headers.get("content-type")
+
+                downloaded = offset
+                with open(part_path, mode) as f:
+
+                    def write(chunk: bytes) -> None:
+                        f.write(chunk)
+                        sha256.update(chunk)
+
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        await asyncio.to_thread(write, chunk)
+                        downloaded += len(chunk)
+                        if progress is not None:
+                            await progress(downloaded, total)
+    except httpx.HTTPStatusError as e:
+        # The partial file is not a prefix of the artifact anymore, start over
+        if offset and e.response.status_code == 416:
+            restart = True
+        else:
+            raise
+
+    if restart:
+        os.remove(part_path)
+        return await download_artifact_to(secure_filename, path, resume=False, progress=progress)
+
+    os.replace(part_path, path)
+    return {
+        "path": os.path.abspath(path),
+        "size": downloaded,
+        "sha256": sha256.hexdigest(),
+        "content_type": content_type,
+    }
+
+
+async def request_public_artifact_url(secure_filename: str, expires_at: int) -> Dict[str, Any]:
+    """
+    Create a public download URL for an artifact.
+
+    Args:
+        secure_filename: The secure filename of the artifact (uuid1/uuid2/filename.ext)
+        expires_at: URL expiration UNIX timestamp in seconds
+
+    Returns:
+        Dictionary containing the public artifact URL and expiration timestamp
+    """
+    data = {"expiresAt": expires_at}
+
+    response = await make_request(
+        "POST",
+        f"/artifacts/{secure_filename}/public-url",
+        json=data
+    )
+    return response.json()
 
 
 def register_artifacts_tools(mcp: FastMCP) -> None:
     """Register all artifact-related tools with the MCP server."""
-    
+
     @mcp.tool()
-    def get_artifact(secure_filename: str) -> bytes:
+    async def get_artifact(secure_filename: str) -> bytes:
         """
         Get authenticated download URL for a build artifact.
-        
+
+        Only artifacts up to CODEMAGIC_MAX_INLINE_ARTIFACT_BYTES (default 10 MB) are
+        returned inline; use download_artifact for larger files.
+
         Args:
             secure_filename: The secure filename of the artifact (from Builds API or Codemagic UI)
                              Format: uuid1/uuid2/filename.ext
-        
+
         Returns:
             The artifact file content as bytes
         """
-        response = make_request("GET", f"/artifacts/{secure_filename}")
-        return response.content
+        too_large = ValueError(
+            f"Artifact is larger than {MAX_INLINE_ARTIFACT_BYTES} bytes, "
+            "use download_artifact to save it to disk instead"
+        )
+
+        async with stream_request("GET", f"/artifacts/{secure_filename}") as response:
+            content_length = response.headers.get("content-length")
+            if content_length and int(content_length) > MAX_INLINE_ARTIFACT_BYTES:
+                raise too_large
+
+            content = bytearray()
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                content.extend(chunk)
+                if len(content) > MAX_INLINE_ARTIFACT_BYTES:
+                    raise too_large
+        return bytes(content)
+
+    @mcp.tool()
+    async def download_artifact(
+        secure_filename: str,
+        target_path: str,
+        resume: bool = True,
+        ctx: Optional[Context] = None
+    ) -> Dict[str, Any]:
+        """
+        Download a build artifact to disk, streaming it in chunks.
+
+        Interrupted downloads are resumed from the partial "<target_path>.part" file.
+        Progress is reported to the client while the file is downloading.
+
+        Args:
+            secure_filename: The secure filename of the artifact (from Builds API or Codemagic UI)
+                             Format: uuid1/uuid2/filename.ext
+            target_path: File path to write to, or an existing directory to save the artifact in
+            resume: Continue a previous partial download if one exists (default: True)
+
+        Returns:
+            Dictionary with the file path, size in bytes, sha256 and content type
+        """
+        path = os.path.expanduser(target_path)
+        if os.path.isdir(path):
+            path = os.path.join(path, os.path.basename(secure_filename))
+
+        return await download_artifact_to(secure_filename, path, resume=resume, progress=progress_reporter(ctx))
 
     @mcp.tool()
-    def create_public_artifact_url(secure_filename: str, expires_at: int) -> Dict[str, Any]:
+    async def create_public_artifact_url(secure_filename: str, expires_at: int) -> Dict[str, Any]:
         """
         Create a public download URL for a build artifact.
-        
+
         Args:
             secure_filename: The secure filename of the artifact (from Builds API or Codemagic UI)
                              Format: uuid1/uuid2/filename.ext
             expires_at: URL expiration UNIX timestamp in seconds
-            
+
         Returns:
             Dictionary containing the public artifact URL and expiration timestamp
         """
-        data = {"expiresAt": expires_at}
-        
-        response = make_request(
-            "POST",
-            f"/artifacts/{secure_filename}/public-url", 
-            json=data
-        )
-        return response.json()
+        return await request_public_artifact_url(secure_filename, expires_at)
@@ -1,50 +1,464 @@
 """
 Base module for Codemagic MCP server with common functionality.
 """
+import asyncio
+import math
 import os
-import requests
-from typing import Dict, Any
-from dotenv import load_dotenv
+import re
+import time
+import httpx
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+from .metrics import metrics, span, endpoint_template
+from .scheduler import RequestScheduler, create_scheduler, IDEMPOTENT_METHODS
+from .tenants import current_tenant, get_tenant_config
 
 
 # Global variables
-BASE_URL = "https://api.codemagic.io"
+BASE_URL = os.environ.get("CODEMAGIC_API_URL", "https://api.codemagic.io").rstrip("/")
 
-# Load environment variables from .env file
-load_dotenv()
+# Transport tuning (overridable through the environment)
+POOL_SIZE = int(os.environ.get("CODEMAGIC_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("CODEMAGIC_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.environ.get("CODEMAGIC_READ_TIMEOUT", "60"))
+
+# Maximum number of cached GET responses (0 disables the response cache)
+CACHE_SIZE = int(os.environ.get("CODEMAGIC_CACHE_SIZE", "256"))
+
+# Time-to-live in seconds for cacheable GET endpoints, first match wins.
+# Endpoints that do not match any pattern are never cached.
+CACHE_TTLS = [
+    (re.compile(r"^/apps$"), 60.0),
+    (re.compile(r"^/apps/[^/]+$"), 60.0),
+    (re.compile(r"^/apps/[^/]+/workflows$"), 300.0),
+    (re.compile(r"^/apps/[^/]+/caches$"), 30.0),
+    (re.compile(r"^/workflows/[^/]+$"), 300.0),
+    (re.compile(r"^/builds/[^/]+$"), 5.0),
+]
+
+# Build statuses after which a build never changes again
+TERMINAL_BUILD_STATUSES = frozenset({"finished", "failed", "canceled", "timeout", "skipped"})
+
+
+class CacheEntry:
+    """A cached API response with its expiry time and validator."""
+
+    def __init__(self, response: httpx.Response, ttl: Optional[float]):
+        self.response = response
+        self.etag = response.headers.get("etag")
+        self.refresh(ttl)
+
+    def refresh(self, ttl: Optional[float]) -> None:
+        """Extend the entry's lifetime by ttl seconds (None keeps it forever)."""
+        self.expires_at = math.inf if ttl is None else time.monotonic() + ttl
+
+    def is_fresh(self) -> bool:
+        """Whether the entry can be served without contacting the API."""
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of GET responses keyed by endpoint and query parameters.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Tuple], CacheEntry]" = OrderedDict()
+
+    def get(self, key: Tuple[str, Tuple]) -> Optional[CacheEntry]:
+        """Get an entry, fresh or stale, and mark it as recently used."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[str, Tuple], response: httpx.Response, ttl: Optional[float]) -> None:
+        """Store a response, evicting the least recently used entries if needed."""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = CacheEntry(response, ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pin(self, endpoint: str) -> None:
+        """Keep every cached response for an endpoint forever."""
+        for key, entry in self._entries.items():
+            if key[0] == endpoint:
+                entry.refresh(None)
+
+    def invalidate(self, endpoint: str) -> None:
+        """Drop every cached response for an endpoint, whatever its parameters."""
+        for key in [key for key in self._entries if key[0] == endpoint]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all cached responses."""
+        self._entries.clear()
+
+
+class Session:
+    """
+    Connection pool, request scheduler and response cache of one tenant.
+
+    Tenants never share a session, so each has its own rate limit budget
+    and cached responses are only ever served to the tenant that fetched them.
+    """
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.client: Optional[httpx.AsyncClient] = None
+        self.token: Optional[str] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.scheduler: Optional[RequestScheduler] = None
+        self.cache = ResponseCache(CACHE_SIZE)
+        # GET requests currently in flight, by endpoint and params, shared by identical concurrent requests
+        self.in_flight: Dict[Tuple, "asyncio.Task[httpx.Response]"] = {}
+
+
+_sessions: Dict[str, Session] = {}
+
+
+def _normalize_endpoint(endpoint: str) -> str:
+    return "/" + endpoint.strip("/")
+
+
+def get_cache_ttl(endpoint: str) -> float:
+    """
+    Get the cache time-to-live for a GET endpoint.
+
+    Args:
+        endpoint: API endpoint (without base URL)
+
+    Returns:
+        TTL in seconds, 0 if the endpoint is not cacheable
+    """
+    path = _normalize_endpoint(endpoint)
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.match(path):
+            return ttl
+    return 0.0
+
+
+def invalidate_cache(*endpoints: str) -> None:
+    """
+    Drop cached responses for the given endpoints after a mutating call.
+
+    Args:
+        *endpoints: API endpoints (without base URL)
+    """
+    cache = _tenant_session().cache
+    for endpoint in endpoints:
+        cache.invalidate(_normalize_endpoint(endpoint))
+
+
+def pin_cache(endpoint: str) -> None:
+    """
+    Keep the cached response for an endpoint forever, for data that can no longer change.
+
+    Args:
+        endpoint: API endpoint (without base URL)
+    """
+    _tenant_session().cache.pin(_normalize_endpoint(endpoint))
+
+
+def peek_cache(endpoint: str) -> Optional[httpx.Response]:
+    """
+    Get the cached response for an endpoint without contacting the API, even if stale.
+
+    Args:
+        endpoint: API endpoint (without base URL), requested without parameters
+
+    Returns:
+        The cached response, or None if there is none
+    """
+    entry = _tenant_session().cache.get((_normalize_endpoint(endpoint), ()))
+    return entry.response if entry is not None else None
+
+
+def clear_cache() -> None:
+    """Drop all cached responses of every tenant."""
+    for session in _sessions.values():
+        session.cache.clear()
+
+
+def _tenant_session() -> Session:
+    tenant = current_tenant()
+    if tenant not in _sessions:
+        _sessions[tenant] = Session(tenant)
+    return _sessions[tenant]
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse an ISO 8601 timestamp from the API into an aware datetime.
+
+    Args:
+        value: Timestamp such as "2024-05-01T10:00:00.000Z", or None
+
+    Returns:
+        Datetime in UTC, or None if the value is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
 
 
 def get_headers() -> Dict[str, str]:
-    """Get headers for Codemagic API requests with API token from environment"""
-    api_token = os.environ.get("CODEMAGIC_API_KEY")
-    if not api_token:
-        raise ValueError("CODEMAGIC_API_KEY environment variable is required")
-    
+    """Get headers for Codemagic API requests with the API token of the current tenant"""
+    api_token = get_tenant_config().get_api_key()
+
     return {
         "Content-Type": "application/json",
         "x-auth-token": api_token
     }
 
 
-def make_request(method: str, endpoint: str, **kwargs) -> requests.Response:
+def get_session() -> Session:
+    """
+    Get the session of the current tenant, with a client ready for the running event loop.
+
+    The client keeps connections to the API alive between tool calls and
+    carries the auth headers, so they are only built once. It is rebuilt
+    if the tenant's API key changes or when called from a different event
+    loop than the one it was created on, together with the request
+    scheduler that rate limits it.
+
+    Returns:
+        The tenant's session
+    """
+    headers = get_headers()
+    session = _tenant_session()
+
+    loop = asyncio.get_running_loop()
+    if (
+        session.client is None
+        or session.client.is_closed
+        or session.token != headers["x-auth-token"]
+        or session.loop is not loop
+    ):
+        # A client bound to another (possibly closed) loop cannot be closed
+        # from here; its connections are dropped with it.
+        if session.client is not None and session.loop is loop and not session.client.is_closed:
+            loop.create_task(session.client.aclose())
+        # Cached responses belong to the previous credentials
+        if session.token != headers["x-auth-token"]:
+            session.cache.clear()
+
+        config = get_tenant_config(session.tenant)
+        session.client = httpx.AsyncClient(
+            headers=headers,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        session.token = headers["x-auth-token"]
+        session.loop = loop
+        session.scheduler = create_scheduler(config.rate_limit, config.rate_burst)
+    return session
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the pooled async HTTP client of the current tenant."""
+    return get_session().client
+
+
+def get_scheduler() -> RequestScheduler:
+    """Get the request scheduler of the current tenant's HTTP client."""
+    return get_session().scheduler
+
+
+async def close_client() -> None:
+    """Close the HTTP clients of all tenants and release their pooled connections."""
+    for session in _sessions.values():
+        client = session.client
+        session.client = None
+        session.token = None
+        session.loop = None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+
+async def make_request(method: str, endpoint: str, **kwargs) -> httpx.Response:
     """
     Make a request to the Codemagic API with proper error handling.
-    
+
+    GET requests to endpoints listed in CACHE_TTLS are served from the
+    response cache while fresh. Stale entries are revalidated with
+    If-None-Match when the API returned an ETag for them.
+
+    Concurrent identical GET requests (same endpoint and params, no other
+    arguments) share a single in-flight request and all receive its response.
+
+    Requests go through the scheduler, which rate limits them, retries
+    idempotent requests on 429/5xx and network errors, and fails fast
+    while the API is down.
+
     Args:
         method: HTTP method (GET, POST, DELETE, etc.)
         endpoint: API endpoint (without base URL)
-        **kwargs: Additional arguments for requests
-        
+        idempotent: Whether the request may be retried after it reached the API
+                    (default: True for GET, HEAD and OPTIONS)
+        **kwargs: Additional arguments for httpx
+
     Returns:
         Response object
     """
     url = f"{BASE_URL}/{endpoint.lstrip('/')}"
-    headers = get_headers()
-    
-    # Merge headers if provided
-    if 'headers' in kwargs:
-        headers.update(kwargs.pop('headers'))
-    
-    response = requests.request(method, url, headers=headers, **kwargs)
-    response.raise_for_status()
+    session = get_session()
+    idempotent = kwargs.pop("idempotent", method.upper() in IDEMPOTENT_METHODS)
+    request_key = None
+    if method.upper() == "GET":
+        params = kwargs.get("params") or {}
+        request_key = (_normalize_endpoint(endpoint), tuple(sorted(params.items())))
+
+    cache_key = None
+    entry = None
+    ttl = get_cache_ttl(endpoint) if request_key is not None else 0.0
+    if ttl:
+        cache_key = request_key
+        entry = session.cache.get(cache_key)
+        if entry is not None and entry.is_fresh():
+            metrics.record_cache(endpoint, "hit")
+            return entry.response
+
+    if request_key is None or not set(kwargs) <= {"params"}:
+        return await _send_request(session, method, endpoint, url, idempotent, kwargs, cache_key, entry, ttl)
+
+    loop = asyncio.get_running_loop()
+    task = session.in_flight.get(request_key)
+    if task is not None and task.get_loop() is loop:
+        metrics.record_coalesced(method, endpoint)
+    else:
+        task = loop.create_task(_send_request(session, method, endpoint, url, idempotent, kwargs, cache_key, entry, ttl))
+        session.in_flight[request_key] = task
+        task.add_done_callback(lambda done: _finish_in_flight(session, request_key, done))
+    # Shielded, so that a caller giving up does not cancel the request for the others
+    return await asyncio.shield(task)
+
+
+def _finish_in_flight(session: Session, request_key: Tuple, task: "asyncio.Task[httpx.Response]") -> None:
+    if session.in_flight.get(request_key) is task:
+        del session.in_flight[request_key]
+    # Mark the error as retrieved, in case every caller gave up before it was raised
+    if not task.cancelled():
+        task.exception()
+
+
+async def _send_request(
+    session: Session,
+    method: str,
+    endpoint: str,
+    url: str,
+    idempotent: bool,
+    kwargs: Dict[str, Any],
+    cache_key: Optional[Tuple],
+    entry: Optional[CacheEntry],
+    ttl: float
+) -> httpx.Response:
+    """Send a request through the scheduler, revalidating and updating the response cache."""
+    if entry is not None and entry.etag:
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "If-None-Match": entry.etag}
+
+    with span(f"{method.upper()} {endpoint_template(endpoint)}", "CLIENT", **{"http.method": method.upper()}) as current:
+        started = time.perf_counter()
+        try:
+            response = await session.scheduler.send(lambda: session.client.request(method, url, **kwargs), idempotent)
+        except Exception as e:
+            metrics.record_request(method, endpoint, None, time.perf_counter() - started, error=e)
+            raise
+        _record_response(method, endpoint, response, started, len(response.content), current)
+
+        if entry is not None and response.status_code == 304:
+            metrics.record_cache(endpoint, "revalidated")
+            entry.refresh(ttl)
+            return entry.response
+        if ttl:
+            metrics.record_cache(endpoint, "miss")
+
+        response.raise_for_status()
+    if cache_key is not None:
+        session.cache.put(cache_key, response, ttl)
     return response
+
+
+def _record_response(
+    method: str,
+    endpoint: str,
+    response: httpx.Response,
+    started: float,
+    bytes_in: int,
+    current: Optional[Dict[str, Any]]
+) -> None:
+    """Record the metrics of a completed request and annotate its span."""
+    retries = response.extensions.get("retries", 0)
+    error = None
+    if response.is_error:
+        error = httpx.HTTPStatusError(
+            f"HTTP {response.status_code}", request=response.request, response=response
+        )
+    metrics.record_request(
+        method,
+        endpoint,
+        response.status_code,
+        time.perf_counter() - started,
+        bytes_in=bytes_in,
+        bytes_out=int(response.request.headers.get("content-length", 0)),
+        retries=retries,
+        error=error
+    )
+    if current is not None:
+        current["attributes"].update({
+            "http.status_code": response.status_code,
+            "http.response_content_length": bytes_in,
+            "http.retry_count": retries,
+        })
+
+
+@asynccontextmanager
+async def stream_request(method: str, endpoint: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    Make a streaming request to the Codemagic API.
+
+    The response body is not read up front, so large payloads can be
+    consumed in chunks with response.aiter_bytes() or aiter_lines().
+    Streaming responses are never cached. They are scheduled like
+    make_request, but only retried until the response headers arrive.
+
+    Args:
+        method: HTTP method (GET, POST, DELETE, etc.)
+        endpoint: API endpoint (without base URL)
+        **kwargs: Additional arguments for httpx
+
+    Yields:
+        Response object with an unread body
+    """
+    url = f"{BASE_URL}/{endpoint.lstrip('/')}"
+    session = get_session()
+    idempotent = kwargs.pop("idempotent", method.upper() in IDEMPOTENT_METHODS)
+    client = session.client
+    request = client.build_request(method, url, **kwargs)
+
+    with span(f"{method.upper()} {endpoint_template(endpoint)}", "CLIENT", **{"http.method": method.upper()}) as current:
+        started = time.perf_counter()
+        try:
+            response = await session.scheduler.send(lambda: client.send(request, stream=True), idempotent)
+        except Exception as e:
+            metrics.record_request(method, endpoint, None, time.perf_counter() - started, error=e)
+            raise
+        try:
+            response.raise_for_status()
+            yield response
+        finally:
+            await response.aclose()
+            # Recorded once the body is consumed, so latency and size cover the whole stream
+            _record_response(method, endpoint, response, started, response.num_bytes_downloaded, current)
@@ -2,15 +2,260 @@
 Builds API module for Codemagic MCP server.
 """
 from mcp.server.fastmcp import FastMCP
-from typing import Optional, Dict, Any, List
-from .base import make_request
+import asyncio
+import json
+import httpx
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable, Set
+from .base import make_request, invalidate_cache, pin_cache, peek_cache, parse_timestamp, TERMINAL_BUILD_STATUSES
+from .disk_cache import disk_cache
+from .index import get_build_index
+from .metrics import metrics
+from .projection import shape_response
+from .tenants import namespaced
+
+
+# Seconds to wait for each part of a build summary
+SUMMARY_PART_TIMEOUT = 30.0
+
+# Number of builds requested per page when walking build history
+BUILDS_PAGE_SIZE = 50
+
+
+async def iter_builds(
+    app_id: Optional[str] = None,
+    workflow_id: Optional[str] = None,
+    branch: Optional[str] = None,
+    tag: Optional[str] = None,
+    since: Optional[str] = None,
+    predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    max_results: Optional[int] = None,
+    page_size: int = BUILDS_PAGE_SIZE
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Walk the build history page by page, newest builds first.
+
+    Pages are fetched with the API's skip/limit parameters only as the
+    caller consumes builds, and the walk stops as soon as max_results
+    builds matched, a build older than since is reached, or a page is empty
+    or only repeats builds already seen (an API ignoring skip would otherwise
+    be walked forever).
+
+    Args:
+        app_id: Optional filter by application identifier
+        workflow_id: Optional filter by workflow identifier
+        branch: Optional filter by branch name
+        tag: Optional filter by tag name
+        since: Optional ISO 8601 timestamp, older builds end the walk
+        predicate: Optional function selecting which builds to yield
+        max_results: Optional maximum number of builds to yield
+        page_size: Number of builds to request per page
+
+    Yields:
+        Build dictionaries as returned by the API
+    """
+    params = {}
+    if app_id:
+        params["appId"] = app_id
+    if workflow_id:
+        params["workflowId"] = workflow_id
+    if branch:
+        params["branch"] = branch
+    if tag:
+        params["tag"] = tag
+
+    cutoff = parse_timestamp(since)
+    if since and cutoff is None:
+        raise ValueError(f"Invalid ISO 8601 timestamp: {since}")
+
+    skip = 0
+    yielded = 0
+    seen: Set[str] = set()
+    while True:
+        response = await make_request("GET", "/builds", params={**params, "skip": skip, "limit": page_size})
+        builds = response.json().get("builds", [])
+        page_ids = {build["_id"] for build in builds if build.get("_id")}
+        if page_ids and page_ids <= seen:
+            return
+
+        for build in builds:
+            # Pages shift when builds are started during the walk, repeating the last ones
+            if build.get("_id") in seen:
+                continue
+            created_at = parse_timestamp(build.get("createdAt"))
+            if cutoff and created_at and created_at < cutoff:
+                return
+            if predicate is not None and not predicate(build):
+                continue
+            yield build
+            yielded += 1
+            if max_results and yielded >= max_results:
+                return
+
+        # A short page does not mean the end: the API may cap limit below page_size
+        if not builds:
+            return
+        seen |= page_ids
+        skip += len(builds)
+
+
+async def fetch_build_status(build_id: str) -> Dict[str, Any]:
+    """
+    Fetch the status of a build and record it in the build index.
+
+    Args:
+        build_id: The build identifier
+
+    Returns:
+        Dictionary containing the application and build information
+    """
+    response = await make_request("GET", f"/builds/{build_id}")
+    data = response.json()
+    build_index = get_build_index()
+    await build_index.run(build_index.record, data.get("build", {}))
+    # Finished builds never change, keep their status cached for good
+    if data.get("build", {}).get("status") in TERMINAL_BUILD_STATUSES:
+        pin_cache(f"/builds/{build_id}")
+    return data
+
+
+def extract_steps(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Get the list of steps from a build, steps or workflow response.
+
+    Args:
+        payload: Parsed response of /builds/{id}, /builds/{id}/steps or /builds/{id}/workflow
+
+    Returns:
+        The steps in execution order, empty if the payload has none
+    """
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        for key in ("buildActions", "steps", "workflowSteps", "actions"):
+            if isinstance(payload.get(key), list):
+                return payload[key]
+        if isinstance(payload.get("build"), dict):
+            return extract_steps(payload["build"])
+    return []
+
+
+async def fetch_build_steps(build_id: str) -> List[Dict[str, Any]]:
+    """
+    Fetch the steps of a build with their status and timing.
+
+    The steps are taken from the (cached) build record when it has them,
+    and from the build's steps endpoint otherwise.
+
+    Args:
+        build_id: The build identifier
+
+    Returns:
+        The steps in execution order
+    """
+    steps = extract_steps(await fetch_build_status(build_id))
+    if not steps:
+        steps = extract_steps(await fetch_build_resource(build_id, "steps"))
+    return steps
+
+
+async def known_build_status(build_id: str) -> Optional[str]:
+    """
+    Get the status of a build without asking the API, from the response cache or the build index.
+
+    Args:
+        build_id: The build identifier
+
+    Returns:
+        The last known status, or None if the build was not seen yet
+    """
+    cached = peek_cache(f"/builds/{build_id}")
+    if cached is not None:
+        try:
+            status = cached.json().get("build", {}).get("status")
+        except ValueError:
+            status = None
+        if status is not None:
+            return status
+    build_index = get_build_index()
+    return await build_index.run(build_index.status, build_id)
+
+
+async def fetch_build_resource(build_id: str, resource: str) -> Any:
+    """
+    Fetch an immutable part of a build, such as its logs or steps, through the disk cache.
+
+    An entry is only written when the build had already finished before the
+    resource was fetched, so the cache never holds data of a running build.
+    Builds already known to have finished are fetched with a single request;
+    otherwise the status is fetched alongside the resource, not before it,
+    and the build counts as finished if it finished before the resource was
+    requested.
+
+    Args:
+        build_id: The build identifier
+        resource: Path below the build, e.g. 'logs', 'steps' or 'steps/{step_id}/logs'
+
+    Returns:
+        The parsed JSON response
+    """
+    endpoint = f"/builds/{build_id}/{resource}"
+    cache_id = namespaced(build_id)
+    content = await asyncio.to_thread(disk_cache.get, cache_id, resource)
+    if content is not None:
+        metrics.record_cache(endpoint, "disk_hit")
+        return json.loads(content)
+
+    if not disk_cache.enabled:
+        return (await make_request("GET", endpoint)).json()
+
+    finished = await known_build_status(build_id) in TERMINAL_BUILD_STATUSES
+    if finished:
+        response = await make_request("GET", endpoint)
+    else:
+        requested_at = datetime.now(timezone.utc)
+        status, response = await asyncio.gather(
+            fetch_build_status(build_id), make_request("GET", endpoint), return_exceptions=True
+        )
+        if isinstance(response, BaseException):
+            raise response
+        if not isinstance(status, BaseException):
+            build = status.get("build", {})
+            finished_at = parse_timestamp(build.get("finishedAt"))
+            finished = (
+                build.get("status") in TERMINAL_BUILD_STATUSES
+                and finished_at is not None
+                and finished_at <= requested_at
+            )
+        elif not isinstance(status, httpx.HTTPError):
+            raise status
+    if finished:
+        await asyncio.to_thread(disk_cache.put, cache_id, resource, response.content)
+    return response.json()
+
+
+async def request_build_cancel(build_id: str) -> Dict[str, Any]:
+    """
+    Cancel a running build.
+
+    Args:
+        build_id: The build identifier
+
+    Returns:
+        Response from the API (empty if successful)
+    """
+    response = await make_request("POST", f"/builds/{build_id}/cancel")
+    invalidate_cache(f"/builds/{build_id}")
+    if response.status_code == 208:  # Already Reported (build already finished)
+        return {"message": "Build has already finished"}
+    return response.json() if response.content else {}
 
 
 def register_builds_tools(mcp: FastMCP) -> None:
     """Register all build-related tools with the MCP server."""
     
     @mcp.tool()
-    def start_build(
+    async def start_build(
         app_id: str,
         workflow_id: str,
         branch: Optional[str] = None,
@@ -53,15 +298,17 @@ def register_builds_tools(mcp: FastMCP) -> None:
         if instance_type:
             data["instanceType"] = instance_type
         
-        response = make_request("POST", "/builds", json=data)
+        response = await make_request("POST", "/builds", json=data)
         return response.json()
 
     @mcp.tool()
-    def get_builds(
+    async def get_builds(
         app_id: Optional[str] = None,
         workflow_id: Optional[str] = None,
         branch: Optional[str] = None,
-        tag: Optional[str] = None
+        tag: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
     ) -> Dict[str, Any]:
         """
         Get a list of builds from Codemagic build history.
@@ -71,6 +318,8 @@ def register_builds_tools(mcp: FastMCP) -> None:
             workflow_id: Optional filter by workflow identifier
             branch: Optional filter by branch name
             tag: Optional filter by tag name
+            fields: Optional field paths to return, e.g. ['builds[*]._id', 'builds[*].status']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing applications and builds information
@@ -85,25 +334,82 @@ def register_builds_tools(mcp: FastMCP) -> None:
         if tag:
             params["tag"] = tag
         
-        response = make_request("GET", "/builds", params=params)
-        return response.json()
+        response = await make_request("GET", "/builds", params=params)
+        return shape_response(response.json(), fields, compact, "builds")
 
     @mcp.tool()
-    def get_build_status(build_id: str) -> Dict[str, Any]:
+    async def find_builds(
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        tag: Optional[str] = None,
+        status: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        max_results: int = 20,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Find the most recent builds matching a filter, walking older build history as needed.
+        
+        Only as many pages are fetched as are needed to collect max_results matching builds.
+        
+        Args:
+            app_id: Optional filter by application identifier
+            workflow_id: Optional filter by workflow identifier
+            branch: Optional filter by branch name
+            tag: Optional filter by tag name
+            status: Optional list of build statuses to include (e.g. ['finished', 'failed'])
+            since: Optional ISO 8601 timestamp, only builds created after it are returned
+            max_results: Maximum number of builds to return (default: 20)
+            fields: Optional field paths to return, e.g. ['builds[*]._id', 'builds[*].status']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
+            
+        Returns:
+            Dictionary with the matching builds, newest first, and their count
+        """
+        if max_results < 1:
+            raise ValueError("max_results must be at least 1")
+        
+        predicate = None
+        if status:
+            statuses = set(status)
+            predicate = lambda build: build.get("status") in statuses
+        
+        builds = [
+            build async for build in iter_builds(
+                app_id=app_id,
+                workflow_id=workflow_id,
+                branch=branch,
+                tag=tag,
+                since=since,
+                predicate=predicate,
+                max_results=max_results
+            )
+        ]
+        return shape_response({"builds": builds, "count": len(builds)}, fields, compact, "builds")
+
+    @mcp.tool()
+    async def get_build_status(
+        build_id: str,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
         """
         Get the status of a build on Codemagic.
         
         Args:
             build_id: The build identifier
+            fields: Optional field paths to return, e.g. ['build.status', 'build.finishedAt']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing the application and build information
         """
-        response = make_request("GET", f"/builds/{build_id}")
-        return response.json()
+        return shape_response(await fetch_build_status(build_id), fields, compact, "build")
 
     @mcp.tool()
-    def cancel_build(build_id: str) -> Dict[str, Any]:
+    async def cancel_build(build_id: str) -> Dict[str, Any]:
         """
         Cancel a running build on Codemagic.
         
@@ -113,13 +419,10 @@ def register_builds_tools(mcp: FastMCP) -> None:
         Returns:
             Response from the API (empty if successful)
         """
-        response = make_request("POST", f"/builds/{build_id}/cancel")
-        if response.status_code == 208:  # Already Reported (build already finished)
-            return {"message": "Build has already finished"}
-        return response.json() if response.content else {}
+        return await request_build_cancel(build_id)
 
     @mcp.tool()
-    def get_build_logs(build_id: str) -> Dict[str, Any]:
+    async def get_build_logs(build_id: str) -> Dict[str, Any]:
         """
         Get the build logs for a specific build, including step-by-step execution details.
         
@@ -129,11 +432,10 @@ def register_builds_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing the build logs with step-by-step details
         """
-        response = make_request("GET", f"/builds/{build_id}/logs")
-        return response.json()
+        return await fetch_build_resource(build_id, "logs")
 
     @mcp.tool()
-    def get_build_workflow_steps(build_id: str) -> Dict[str, Any]:
+    async def get_build_workflow_steps(build_id: str) -> Dict[str, Any]:
         """
         Get the workflow steps and their execution details for a specific build.
         
@@ -143,11 +445,10 @@ def register_builds_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing workflow steps with their status, timing, and details
         """
-        response = make_request("GET", f"/builds/{build_id}/workflow")
-        return response.json()
+        return await fetch_build_resource(build_id, "workflow")
 
     @mcp.tool()
-    def get_build_artifacts(build_id: str) -> Dict[str, Any]:
+    async def get_build_artifacts(build_id: str) -> Dict[str, Any]:
         """
         Get all artifacts produced by a specific build.
         
@@ -157,11 +458,10 @@ def register_builds_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing the list of artifacts with their details
         """
-        response = make_request("GET", f"/builds/{build_id}/artifacts")
-        return response.json()
+        return await fetch_build_resource(build_id, "artifacts")
 
     @mcp.tool()
-    def get_build_environment(build_id: str) -> Dict[str, Any]:
+    async def get_build_environment(build_id: str) -> Dict[str, Any]:
         """
         Get the environment variables and configuration used for a specific build.
         
@@ -171,16 +471,17 @@ def register_builds_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing environment variables and build configuration
         """
-        response = make_request("GET", f"/builds/{build_id}/environment")
-        return response.json()
+        return await fetch_build_resource(build_id, "environment")
 
     @mcp.tool()
-    def get_builds_detailed(
+    async def get_builds_detailed(
         app_id: Optional[str] = None,
         workflow_id: Optional[str] = None,
         branch: Optional[str] = None,
         tag: Optional[str] = None,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
     ) -> Dict[str, Any]:
         """
         Get a detailed list of builds with enhanced metadata including status, timing, and workflow information.
@@ -191,6 +492,8 @@ def register_builds_tools(mcp: FastMCP) -> None:
             branch: Optional filter by branch name
             tag: Optional filter by tag name
             limit: Optional limit on number of builds to return (default: 50)
+            fields: Optional field paths to return, e.g. ['builds[*]._id', 'builds[*].status']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing detailed builds information with enhanced metadata
@@ -207,48 +510,57 @@ def register_builds_tools(mcp: FastMCP) -> None:
         if limit:
             params["limit"] = limit
         
-        response = make_request("GET", "/builds/detailed", params=params)
-        return response.json()
+        response = await make_request("GET", "/builds/detailed", params=params)
+        return shape_response(response.json(), fields, compact, "builds")
 
     @mcp.tool()
-    def get_build_summary(build_id: str) -> Dict[str, Any]:
+    async def get_build_summary(
+        build_id: str,
+        part_timeout: float = SUMMARY_PART_TIMEOUT,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
         """
         Get a comprehensive summary of a build including status, metadata, logs summary, and artifacts.
         
+        All parts of the summary are fetched concurrently. A part that fails or
+        does not finish within the timeout is reported with the reason instead
+        of its data, except the build itself, without which the call fails.
+        
         Args:
             build_id: The build identifier
+            part_timeout: Maximum number of seconds to wait for each part (default: 30)
+            fields: Optional field paths to return, e.g. ['build.build.status', 'artifacts']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing comprehensive build summary with all relevant information
         """
-        # Get basic build info
-        build_info = get_build_status(build_id)
+        parts = {
+            "build": get_build_status,
+            "logs": get_build_logs,
+            "workflow": get_build_workflow_steps,
+            "artifacts": get_build_artifacts,
+            "environment": get_build_environment,
+        }
         
-        # Get additional details
-        try:
-            logs = get_build_logs(build_id)
-        except:
-            logs = {"error": "Logs not available"}
+        results = await asyncio.gather(
+            *(asyncio.wait_for(fetch(build_id), part_timeout) for fetch in parts.values()),
+            return_exceptions=True
+        )
         
-        try:
-            workflow = get_build_workflow_steps(build_id)
-        except:
-            workflow = {"error": "Workflow steps not available"}
+        summary = {}
+        for name, result in zip(parts, results):
+            # The build itself is required, everything else is best effort
+            if name == "build" and isinstance(result, asyncio.TimeoutError):
+                raise TimeoutError(f"Build {build_id} did not arrive within {part_timeout} seconds")
+            if name == "build" and isinstance(result, Exception):
+                raise result
+            if isinstance(result, asyncio.TimeoutError):
+                summary[name] = {"error": f"Timed out after {part_timeout} seconds"}
+            elif isinstance(result, Exception):
+                summary[name] = {"error": f"{type(result).__name__}: {result}"}
+            else:
+                summary[name] = result
         
-        try:
-            artifacts = get_build_artifacts(build_id)
-        except:
-            artifacts = {"error": "Artifacts not available"}
-        
-        try:
-            environment = get_build_environment(build_id)
-        except:
-            environment = {"error": "Environment not available"}
-        
-        return {
-            "build": build_info,
-            "logs": logs,
-            "workflow": workflow,
-            "artifacts": artifacts,
-            "environment": environment
-        }
+        return shape_response(summary, fields, compact, "summary")
@@ -0,0 +1,171 @@
+"""
+Bulk operations across many builds and applications for Codemagic MCP server.
+
+Every batch runs with bounded concurrency over the shared connection pool
+and reports a result or an error per item, so one failing item never
+aborts the rest of the batch.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List, Awaitable, Callable, Iterable, TypeVar
+from .base import make_request, TERMINAL_BUILD_STATUSES
+from .builds import fetch_build_status, iter_builds, request_build_cancel
+from .projection import shape_response
+
+
+# Maximum number of concurrent API requests per batch
+BULK_CONCURRENCY = int(os.environ.get("CODEMAGIC_BULK_CONCURRENCY", "8"))
+
+# How many days back cancel_builds_bulk looks for running builds matching a filter by default
+RUNNING_BUILDS_DAYS = 7.0
+
+T = TypeVar("T")
+
+
+async def run_bounded(
+    items: Iterable[T],
+    operation: Callable[[T], Awaitable[Any]],
+    concurrency: int = BULK_CONCURRENCY
+) -> List[Dict[str, Any]]:
+    """
+    Run an operation on every item with at most concurrency operations in flight.
+
+    Args:
+        items: Items to process, typically IDs
+        operation: Coroutine function called with each item
+        concurrency: Maximum number of concurrent operations
+
+    Returns:
+        One dictionary per item, in order, with the item as id and either
+        ok=True and the result, or ok=False and the error
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: T) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"id": item, "ok": True, "result": await operation(item)}
+            except Exception as e:
+                return {"id": item, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    return list(await asyncio.gather(*map(run, items)))
+
+
+def batch_report(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Wrap per-item results with success and failure counts."""
+    succeeded = sum(1 for result in results if result["ok"])
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+async def list_app_ids() -> List[str]:
+    """Get the IDs of all applications."""
+    response = await make_request("GET", "/apps")
+    return [app["_id"] for app in response.json().get("applications", []) if app.get("_id")]
+
+
+async def fetch_caches_bulk(app_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch the caches of many applications concurrently.
+
+    Args:
+        app_ids: Application identifiers, all applications if omitted
+
+    Returns:
+        One result per application, as returned by run_bounded, with the caches response as result
+    """
+    if app_ids is None:
+        app_ids = await list_app_ids()
+
+    async def caches(app_id: str) -> Dict[str, Any]:
+        response = await make_request("GET", f"/apps/{app_id}/caches")
+        return response.json()
+
+    return await run_bounded(dict.fromkeys(app_ids), caches)
+
+
+def register_bulk_tools(mcp: FastMCP) -> None:
+    """Register all bulk operation tools with the MCP server."""
+
+    @mcp.tool()
+    async def get_builds_status_bulk(
+        build_ids: List[str],
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get the status of many builds in one call.
+
+        Args:
+            build_ids: The build identifiers
+            fields: Optional field paths to return per build, e.g. ['build.status', 'build.finishedAt']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
+
+        Returns:
+            Dictionary with a result or error per build and the number of succeeded and failed builds
+        """
+        async def status(build_id: str) -> Dict[str, Any]:
+            return shape_response(await fetch_build_status(build_id), fields, compact, "build")
+
+        return batch_report(await run_bounded(dict.fromkeys(build_ids), status))
+
+    @mcp.tool()
+    async def get_caches_bulk(app_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Get the caches of many applications in one call.
+
+        Args:
+            app_ids: Optional application identifiers, all applications if omitted
+
+        Returns:
+            Dictionary with the cache list or error per application and the number of succeeded and failed apps
+        """
+        return batch_report(await fetch_caches_bulk(app_ids))
+
+    @mcp.tool()
+    async def cancel_builds_bulk(
+        build_ids: Optional[List[str]] = None,
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        within_days: Optional[float] = RUNNING_BUILDS_DAYS,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Cancel many builds in one call, either by ID or all running builds matching a filter.
+
+        Builds matching a filter are searched among those created in the last within_days
+        days; pass None to search the whole history, e.g. for builds stuck in the queue.
+
+        Args:
+            build_ids: Optional build identifiers to cancel
+            app_id: Without build_ids, cancel running builds of this application
+            workflow_id: Without build_ids, cancel running builds of this workflow
+            branch: Without build_ids, cancel running builds on this branch
+            within_days: Without build_ids, only cancel builds created in this many days, None for any age (default: 7)
+            dry_run: Only report which builds would be canceled (default: False)
+
+        Returns:
+            Dictionary with a result or error per build and the number of succeeded and failed cancellations
+        """
+        if build_ids is None:
+            if not (app_id or workflow_id or branch):
+                raise ValueError("Either build_ids or at least one of app_id, workflow_id or branch is required")
+            since = (
+                (datetime.now(timezone.utc) - timedelta(days=within_days)).isoformat()
+                if within_days is not None else None
+            )
+            build_ids = [
+                build["_id"] async for build in iter_builds(
+                    app_id=app_id,
+                    workflow_id=workflow_id,
+                    branch=branch,
+                    since=since,
+                    predicate=lambda build: build.get("status") not in TERMINAL_BUILD_STATUSES
+                )
+            ]
+
+        if dry_run:
+            return {"build_ids": build_ids, "count": len(build_ids), "dry_run": True}
+        return batch_report(await run_bounded(dict.fromkeys(build_ids), request_build_cancel))
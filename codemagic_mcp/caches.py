@@ -1,16 +1,190 @@
 """
 Caches API module for Codemagic MCP server.
 """
+import re
+import statistics
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
 from mcp.server.fastmcp import FastMCP
-from typing import Dict, Any, List
-from .base import make_request
+from typing import Optional, Dict, Any, List, Tuple
+from .base import make_request, invalidate_cache, parse_timestamp, TERMINAL_BUILD_STATUSES
+from .builds import iter_builds, extract_steps, fetch_build_resource
+from .bulk import run_bounded, batch_report, fetch_caches_bulk
+
+
+# Order of cache rankings, by the value they sort on (descending)
+CACHE_SORT_KEYS = {
+    "size": "size_mb",
+    "age": "age_days",
+    "idle": "idle_days",
+    "restore_time": "restore_p50_seconds",
+}
+
+# Step names that restore or save a cache
+RESTORE_STEP_PATTERN = re.compile(r"restor\w* cache|cache restor|download\w* cache", re.IGNORECASE)
+SAVE_STEP_PATTERN = re.compile(r"sav\w* cache|cache sav|upload\w* cache", re.IGNORECASE)
+
+# Recent finished builds per workflow whose steps are timed by scan_caches
+DEFAULT_TIMED_BUILDS = 5
+
+# How far back, and through how many builds, scan_caches looks for a workflow's finished builds
+TIMED_BUILDS_WINDOW = timedelta(days=30)
+MAX_TIMED_BUILDS_SCAN = 200
+
+BYTES_PER_MB = 1024 * 1024
+
+
+def _days_since(value: Optional[str], now: datetime) -> Optional[float]:
+    timestamp = parse_timestamp(value)
+    return round((now - timestamp).total_seconds() / 86400, 1) if timestamp else None
+
+
+async def fetch_app_caches(app_ids: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Fetch the caches of many applications concurrently, as flat lists of caches and errors.
+
+    Args:
+        app_ids: Application identifiers, all applications if omitted
+
+    Returns:
+        The caches, each with its appId, and the per-application errors
+    """
+    results = await fetch_caches_bulk(app_ids)
+    return (
+        [
+            {**cache, "appId": cache.get("appId") or result["id"]}
+            for result in results if result["ok"]
+            for cache in result["result"].get("caches", [])
+        ],
+        [result for result in results if not result["ok"]],
+    )
+
+
+async def time_cache_steps(app_id: str, workflow_id: str, builds: int) -> Dict[str, Any]:
+    """
+    Time the cache restore and save steps of a workflow's recent finished builds.
+
+    Only builds created within TIMED_BUILDS_WINDOW are considered, and the
+    search gives up after MAX_TIMED_BUILDS_SCAN builds, so a workflow without
+    finished builds does not walk the whole history.
+
+    Args:
+        app_id: The application identifier
+        workflow_id: The workflow identifier
+        builds: Number of recent finished builds to time
+
+    Returns:
+        Dictionary with the number of builds timed, the median restore and save
+        seconds, and the median share of the build spent on them
+    """
+    restore, save, share = [], [], []
+    since = (datetime.now(timezone.utc) - TIMED_BUILDS_WINDOW).isoformat()
+    recent = []
+    scanned = 0
+    async with aclosing(iter_builds(app_id=app_id, workflow_id=workflow_id, since=since)) as candidates:
+        async for candidate in candidates:
+            scanned += 1
+            if candidate.get("status") in TERMINAL_BUILD_STATUSES:
+                recent.append(candidate)
+            if len(recent) >= builds or scanned >= MAX_TIMED_BUILDS_SCAN:
+                break
+
+    for build in recent:
+        steps = extract_steps(build)
+        if not steps and build.get("_id"):
+            steps = extract_steps(await fetch_build_resource(build["_id"], "workflow"))
+        restore_seconds = save_seconds = 0.0
+        for step in steps:
+            started, finished = parse_timestamp(step.get("startedAt")), parse_timestamp(step.get("finishedAt"))
+            if not (started and finished):
+                continue
+            name = step.get("name") or ""
+            if RESTORE_STEP_PATTERN.search(name):
+                restore_seconds += (finished - started).total_seconds()
+            elif SAVE_STEP_PATTERN.search(name):
+                save_seconds += (finished - started).total_seconds()
+        restore.append(restore_seconds)
+        save.append(save_seconds)
+        started, finished = parse_timestamp(build.get("startedAt")), parse_timestamp(build.get("finishedAt"))
+        if started and finished and finished > started:
+            share.append((restore_seconds + save_seconds) / (finished - started).total_seconds())
+
+    return {
+        "builds": len(restore),
+        "restore_p50_seconds": round(statistics.median(restore), 1) if restore else None,
+        "save_p50_seconds": round(statistics.median(save), 1) if save else None,
+        "cache_share": round(statistics.median(share), 3) if share else None,
+    }
+
+
+def matches_policy(
+    cache: Dict[str, Any],
+    older_than_days: Optional[float],
+    unused_for_days: Optional[float],
+    larger_than_mb: Optional[float]
+) -> List[str]:
+    """
+    Check a ranked cache against a pruning policy; any one condition selects the cache.
+
+    Age conditions never match a cache without the timestamp they need,
+    see unknown_age.
+
+    Returns:
+        The reasons the cache matches, empty if it does not
+    """
+    reasons = []
+    if older_than_days is not None and cache.get("age_days") is not None and cache["age_days"] > older_than_days:
+        reasons.append(f"older than {older_than_days:g} days")
+    if unused_for_days is not None and cache.get("idle_days") is not None and cache["idle_days"] > unused_for_days:
+        reasons.append(f"unused for {unused_for_days:g} days")
+    if larger_than_mb is not None and cache.get("size_mb", 0) > larger_than_mb:
+        reasons.append(f"larger than {larger_than_mb:g} MB")
+    return reasons
+
+
+def unknown_age(cache: Dict[str, Any], older_than_days: Optional[float], unused_for_days: Optional[float]) -> List[str]:
+    """
+    Get the age conditions of a pruning policy a ranked cache cannot be checked against.
+
+    Returns:
+        The missing fields, 'age_days' and/or 'idle_days', empty if every age condition can be checked
+    """
+    missing = []
+    if older_than_days is not None and cache.get("age_days") is None:
+        missing.append("age_days")
+    if unused_for_days is not None and cache.get("idle_days") is None:
+        missing.append("idle_days")
+    return missing
+
+
+def rank_caches(caches: List[Dict[str, Any]], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Flatten caches into rows with their size in MB, age and days since last use."""
+    now = now or datetime.now(timezone.utc)
+    return [
+        {
+            "app_id": cache.get("appId"),
+            "cache_id": cache.get("_id"),
+            "workflow_id": cache.get("workflowId"),
+            "size_mb": round((cache.get("size") or 0) / BYTES_PER_MB, 1),
+            "age_days": _days_since(cache.get("createdAt"), now),
+            "idle_days": _days_since(cache.get("lastUsed"), now),
+        }
+        for cache in caches
+    ]
+
+
+async def delete_cache(app_id: str, cache_id: str) -> Dict[str, Any]:
+    """Delete one cache of an application."""
+    response = await make_request("DELETE", f"/apps/{app_id}/caches/{cache_id}")
+    invalidate_cache(f"/apps/{app_id}/caches")
+    return response.json()
 
 
 def register_caches_tools(mcp: FastMCP) -> None:
     """Register all cache-related tools with the MCP server."""
     
     @mcp.tool()
-    def get_app_caches(app_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    async def get_app_caches(app_id: str) -> Dict[str, List[Dict[str, Any]]]:
         """
         Retrieve a list of caches for an application.
         
@@ -20,11 +194,11 @@ def register_caches_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing the list of caches for the application
         """
-        response = make_request("GET", f"/apps/{app_id}/caches")
+        response = await make_request("GET", f"/apps/{app_id}/caches")
         return response.json()
 
     @mcp.tool()
-    def delete_all_app_caches(app_id: str) -> Dict[str, Any]:
+    async def delete_all_app_caches(app_id: str) -> Dict[str, Any]:
         """
         Delete all stored caches for an application.
         
@@ -34,14 +208,15 @@ def register_caches_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary with the list of cache IDs that will be deleted and a message
         """
-        response = make_request("DELETE", f"/apps/{app_id}/caches")
+        response = await make_request("DELETE", f"/apps/{app_id}/caches")
+        invalidate_cache(f"/apps/{app_id}/caches")
         # API returns 202 Accepted for successful cache deletion
         if response.status_code == 202:
             return response.json()
         return response.json()
 
     @mcp.tool()
-    def delete_app_cache(app_id: str, cache_id: str) -> Dict[str, Any]:
+    async def delete_app_cache(app_id: str, cache_id: str) -> Dict[str, Any]:
         """
         Delete a specific cache from an application.
         
@@ -52,8 +227,129 @@ def register_caches_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary with the deleted cache ID and a message
         """
-        response = make_request("DELETE", f"/apps/{app_id}/caches/{cache_id}")
-        # API returns 202 Accepted for successful cache deletion
-        if response.status_code == 202:
-            return response.json()
-        return response.json()
+        return await delete_cache(app_id, cache_id)
+
+    @mcp.tool()
+    async def scan_caches(
+        app_ids: Optional[List[str]] = None,
+        sort_by: str = "size",
+        time_steps: bool = True,
+        builds_per_workflow: int = DEFAULT_TIMED_BUILDS,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Rank the caches of many (or all) applications by size, age or last use.
+
+        With time_steps, the cache restore and save steps of each cached workflow's recent
+        finished builds are timed too, showing which caches slow builds down the most.
+
+        Args:
+            app_ids: Optional application identifiers, all applications if omitted
+            sort_by: 'size', 'age', 'idle' (days since last use) or 'restore_time' (default: 'size')
+            time_steps: Time the cache steps of recent builds of each cached workflow (default: True)
+            builds_per_workflow: Number of recent finished builds timed per workflow (default: 5)
+            limit: Maximum number of caches to return (default: 50)
+
+        Returns:
+            Dictionary with the ranked caches (columns and rows), their total count and size,
+            and the applications whose caches could not be fetched
+        """
+        if sort_by not in CACHE_SORT_KEYS:
+            raise ValueError(f"sort_by must be one of: {', '.join(CACHE_SORT_KEYS)}")
+        if sort_by == "restore_time" and not time_steps:
+            raise ValueError("sort_by 'restore_time' requires time_steps")
+
+        caches, errors = await fetch_app_caches(app_ids)
+        rows = rank_caches(caches)
+
+        if time_steps:
+            workflows = list(dict.fromkeys(
+                (row["app_id"], row["workflow_id"]) for row in rows if row["workflow_id"]
+            ))
+
+            async def timing(workflow: Tuple[str, str]) -> Dict[str, Any]:
+                return await time_cache_steps(*workflow, builds_per_workflow)
+
+            timings = {result["id"]: result.get("result", {}) for result in await run_bounded(workflows, timing)}
+            for row in rows:
+                timing_row = timings.get((row["app_id"], row["workflow_id"]), {})
+                row.update(
+                    restore_p50_seconds=timing_row.get("restore_p50_seconds"),
+                    save_p50_seconds=timing_row.get("save_p50_seconds"),
+                    cache_share=timing_row.get("cache_share"),
+                )
+
+        key = CACHE_SORT_KEYS[sort_by]
+        rows.sort(key=lambda row: row.get(key) if row.get(key) is not None else -1, reverse=True)
+        columns = list(rows[0]) if rows else ["app_id", "cache_id", "workflow_id", "size_mb", "age_days", "idle_days"]
+        return {
+            "columns": columns,
+            "rows": [[row[column] for column in columns] for row in rows[:limit]],
+            "count": len(rows),
+            "total_size_mb": round(sum(row["size_mb"] for row in rows), 1),
+            "errors": errors,
+        }
+
+    @mcp.tool()
+    async def prune_caches(
+        app_ids: Optional[List[str]] = None,
+        workflow_id: Optional[str] = None,
+        older_than_days: Optional[float] = None,
+        unused_for_days: Optional[float] = None,
+        larger_than_gb: Optional[float] = None,
+        dry_run: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Delete the caches matching a policy across many (or all) applications.
+
+        A cache is deleted if it matches any of the given conditions, e.g. older_than_days=14
+        and larger_than_gb=2 deletes caches older than 14 days or over 2 GB.
+
+        Args:
+            app_ids: Optional application identifiers, all applications if omitted
+            workflow_id: Optional filter by workflow identifier
+            older_than_days: Delete caches created more than this many days ago
+            unused_for_days: Delete caches not used for more than this many days
+            larger_than_gb: Delete caches larger than this many GB
+            dry_run: Only report which caches would be deleted and the space freed (default: True)
+
+        Returns:
+            Dictionary with the matching caches and why they match, the space freed, the caches
+            of unknown age (kept, since the API reported no creation or last-use time the age
+            conditions need), and unless dry_run, a result or error per deleted cache
+        """
+        if older_than_days is None and unused_for_days is None and larger_than_gb is None:
+            raise ValueError("At least one of older_than_days, unused_for_days or larger_than_gb is required")
+
+        caches, errors = await fetch_app_caches(app_ids)
+        larger_than_mb = larger_than_gb * 1024 if larger_than_gb is not None else None
+        selected, unknown = [], []
+        for row in rank_caches(caches):
+            if workflow_id is not None and row["workflow_id"] != workflow_id:
+                continue
+            reasons = matches_policy(row, older_than_days, unused_for_days, larger_than_mb)
+            if reasons:
+                selected.append({**row, "reasons": reasons})
+                continue
+            missing = unknown_age(row, older_than_days, unused_for_days)
+            if missing:
+                unknown.append({**row, "missing": missing})
+
+        report = {
+            "caches": selected,
+            "count": len(selected),
+            "freed_mb": round(sum(row["size_mb"] for row in selected), 1),
+            "unknown_age": unknown,
+            "errors": errors,
+            "dry_run": dry_run,
+        }
+        if dry_run:
+            return report
+
+        async def delete(row: Dict[str, Any]) -> Dict[str, Any]:
+            return await delete_cache(row["app_id"], row["cache_id"])
+
+        results = await run_bounded(selected, delete)
+        for result, row in zip(results, selected):
+            result["id"] = row["cache_id"]
+        return {**report, **batch_report(results)}
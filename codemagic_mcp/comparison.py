@@ -0,0 +1,324 @@
+"""
+Build comparison tools for Codemagic MCP server.
+
+Compares a build with another build, or with the median of a workflow's
+recent successful builds, on the server: steps are aligned by name and
+only the steps whose duration changed significantly, and the environment
+and software versions that differ, are returned.
+"""
+import asyncio
+import statistics
+from collections import Counter
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List, Tuple
+from .base import parse_timestamp
+from .builds import iter_builds, extract_steps, fetch_build_status, fetch_build_resource
+from .bulk import run_bounded
+
+
+# Number of recent successful builds forming the rolling baseline by default
+DEFAULT_BASELINE_BUILDS = 5
+
+# A step duration change is significant if it exceeds both thresholds
+DEFAULT_MIN_DELTA_SECONDS = 30.0
+DEFAULT_MIN_DELTA_RATIO = 0.2
+
+# Maximum environment differences returned
+MAX_ENVIRONMENT_DIFFERENCES = 50
+
+# Longest environment value returned, longer ones are cut
+MAX_VALUE_LENGTH = 200
+
+BASELINE_STATUSES = {"finished"}
+
+# How far before the build, and through how many builds, the rolling baseline is searched
+BASELINE_WINDOW = timedelta(days=30)
+MAX_BASELINE_SCAN = 500
+
+
+def _seconds(start: Optional[str], end: Optional[str]) -> Optional[float]:
+    started, finished = parse_timestamp(start), parse_timestamp(end)
+    if started is None or finished is None:
+        return None
+    return max(0.0, (finished - started).total_seconds())
+
+
+def step_durations(steps: List[Dict[str, Any]], timeline: Any = None) -> Dict[str, float]:
+    """
+    Get the duration of every step, keyed by name.
+
+    Repeated names are numbered ('Run script', 'Run script #2') so that they
+    align with the same occurrence in another build. Steps without timing
+    take it from the timeline entry of the same name.
+
+    Args:
+        steps: Steps of the build
+        timeline: Optional parsed timeline response of the build
+
+    Returns:
+        Step name to duration in seconds, in execution order
+    """
+    events = timeline.get("timeline", timeline.get("events", [])) if isinstance(timeline, dict) else timeline or []
+    timed = {}
+    for event in events if isinstance(events, list) else []:
+        if isinstance(event, dict) and event.get("name"):
+            timed.setdefault(event["name"], _seconds(event.get("startedAt"), event.get("finishedAt")))
+
+    durations: Dict[str, float] = {}
+    seen: Counter = Counter()
+    for step in steps or [{"name": name} for name in timed]:
+        name = step.get("name") or "unnamed"
+        seen[name] += 1
+        key = name if seen[name] == 1 else f"{name} #{seen[name]}"
+        duration = _seconds(step.get("startedAt"), step.get("finishedAt"))
+        if duration is None and seen[name] == 1:
+            duration = timed.get(name)
+        if duration is not None:
+            durations[key] = duration
+    return durations
+
+
+def _round(value: Optional[float], digits: int = 1) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested dictionaries into dotted keys, e.g. {'variables': {'A': 1}} to {'variables.A': 1}."""
+    if not isinstance(value, dict):
+        return {prefix: value} if prefix else {}
+    flat = {}
+    for key, item in value.items():
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def _short(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+        return value[:MAX_VALUE_LENGTH] + "..."
+    return value
+
+
+async def fetch_build_profile(build: Dict[str, Any], environment: bool) -> Dict[str, Any]:
+    """
+    Fetch what is compared of a build: step durations, total duration, queue wait and environment.
+
+    The timeline and environment are fetched concurrently and are best effort;
+    a build without them is still compared by its steps.
+
+    Args:
+        build: Build record, at least with its _id
+        environment: Whether to fetch the environment
+
+    Returns:
+        Dictionary with the build ID, status, durations and flattened environment
+    """
+    build_id = build["_id"]
+    parts = [fetch_build_resource(build_id, "timeline")]
+    if environment:
+        parts.append(fetch_build_resource(build_id, "environment"))
+    steps = extract_steps(build)
+    if not steps:
+        parts.append(fetch_build_resource(build_id, "steps"))
+    results = await asyncio.gather(*parts, return_exceptions=True)
+    timeline = results[0] if not isinstance(results[0], Exception) else None
+    env = results[1] if environment and not isinstance(results[1], Exception) else None
+    if not steps and not isinstance(results[-1], Exception):
+        steps = extract_steps(results[-1])
+
+    env = env.get("environment", env) if isinstance(env, dict) else env
+    return {
+        "build_id": build_id,
+        "status": build.get("status"),
+        "duration": _seconds(build.get("startedAt"), build.get("finishedAt")),
+        "queue_wait": _seconds(build.get("createdAt"), build.get("startedAt")),
+        "steps": step_durations(steps, timeline),
+        "environment": flatten(env) if env is not None else None,
+    }
+
+
+async def find_baseline_builds(build: Dict[str, Any], count: int, same_branch: bool) -> List[Dict[str, Any]]:
+    """
+    Find the most recent successful builds of a build's workflow that were created before it.
+
+    Only builds created within BASELINE_WINDOW before the build are considered,
+    and the search gives up after MAX_BASELINE_SCAN builds, so a workflow
+    without successful builds does not walk the whole history.
+
+    Args:
+        build: The build to find a baseline for
+        count: Number of builds
+        same_branch: Only consider builds of the same branch
+
+    Returns:
+        Build records, newest first
+    """
+    created_at = parse_timestamp(build.get("createdAt"))
+    since = (created_at or datetime.now(timezone.utc)) - BASELINE_WINDOW
+
+    def is_baseline(candidate: Dict[str, Any]) -> bool:
+        candidate_created_at = parse_timestamp(candidate.get("createdAt"))
+        return (
+            candidate.get("_id") != build["_id"]
+            and candidate.get("status") in BASELINE_STATUSES
+            and (created_at is None or candidate_created_at is None or candidate_created_at < created_at)
+        )
+
+    baselines = []
+    scanned = 0
+    async with aclosing(iter_builds(
+        app_id=build.get("appId"),
+        workflow_id=build.get("workflowId"),
+        branch=build.get("branch") if same_branch else None,
+        since=since.isoformat()
+    )) as candidates:
+        async for candidate in candidates:
+            scanned += 1
+            if is_baseline(candidate):
+                baselines.append(candidate)
+            if len(baselines) >= count or scanned >= MAX_BASELINE_SCAN:
+                break
+    return baselines
+
+
+def diff_steps(
+    target: Dict[str, float],
+    baselines: List[Dict[str, float]],
+    min_delta_seconds: float,
+    min_delta_ratio: float
+) -> Tuple[List[List[Any]], int]:
+    """
+    Compare step durations with the median of the baseline builds.
+
+    Returns:
+        Rows of significant differences, largest first, and the number of steps compared
+    """
+    names = list(dict.fromkeys([*target, *(name for baseline in baselines for name in baseline)]))
+
+    rows = []
+    for name in names:
+        samples = [baseline[name] for baseline in baselines if name in baseline]
+        baseline_seconds = statistics.median(samples) if samples else None
+        seconds = target.get(name)
+        if seconds is None or baseline_seconds is None:
+            change = "added" if baseline_seconds is None else "removed"
+            rows.append([name, change, _round(baseline_seconds), _round(seconds), None, None])
+            continue
+        delta = seconds - baseline_seconds
+        ratio = delta / baseline_seconds if baseline_seconds else None
+        if abs(delta) < min_delta_seconds or (ratio is not None and abs(ratio) < min_delta_ratio):
+            continue
+        rows.append([name, "slower" if delta > 0 else "faster", _round(baseline_seconds), _round(seconds),
+                     _round(delta), _round(ratio, 3)])
+    # Largest changes first, then added and removed steps
+    rows.sort(key=lambda row: -abs(row[4]) if row[4] is not None else 0)
+    return rows, len(names)
+
+
+def diff_environment(target: Dict[str, Any], baselines: List[Dict[str, Any]]) -> List[List[Any]]:
+    """
+    Compare an environment with the most common value of each key among the baseline builds.
+
+    Returns:
+        Rows of key, baseline value and value, for keys that differ or exist on one side only
+    """
+    rows = []
+    keys = dict.fromkeys([*target, *(key for baseline in baselines for key in baseline)])
+    for key in keys:
+        # Values may be unhashable lists, so they are counted by their repr
+        usual_repr = Counter(repr(baseline.get(key)) for baseline in baselines).most_common(1)[0][0]
+        usual = next(baseline.get(key) for baseline in baselines if repr(baseline.get(key)) == usual_repr)
+        if target.get(key) != usual:
+            rows.append([key, _short(usual), _short(target.get(key))])
+    return rows
+
+
+def register_comparison_tools(mcp: FastMCP) -> None:
+    """Register all build comparison tools with the MCP server."""
+
+    @mcp.tool()
+    async def compare_builds(
+        build_id: str,
+        baseline_build_id: Optional[str] = None,
+        baseline_builds: int = DEFAULT_BASELINE_BUILDS,
+        same_branch: bool = False,
+        min_delta_seconds: float = DEFAULT_MIN_DELTA_SECONDS,
+        min_delta_ratio: float = DEFAULT_MIN_DELTA_RATIO,
+        include_environment: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Find which steps of a build got slower or faster, and what changed in its environment.
+
+        The build is compared with baseline_build_id, or else with the median of the last
+        baseline_builds successful builds of the same workflow created before it. Steps are
+        aligned by name and only significant duration changes are returned: at least
+        min_delta_seconds and min_delta_ratio of the baseline duration.
+
+        Args:
+            build_id: The build to examine
+            baseline_build_id: Optional build to compare with instead of the rolling baseline
+            baseline_builds: Number of recent successful builds in the rolling baseline (default: 5)
+            same_branch: Only use builds of the same branch as the rolling baseline (default: False)
+            min_delta_seconds: Smallest step duration change reported, in seconds (default: 30)
+            min_delta_ratio: Smallest step duration change reported, relative to the baseline (default: 0.2)
+            include_environment: Compare environment variables and software versions (default: True)
+
+        Returns:
+            Dictionary with the baseline build IDs, total duration and queue wait of both sides,
+            the significant step changes and the environment differences
+        """
+        target_record = (await fetch_build_status(build_id)).get("build", {})
+        target_record.setdefault("_id", build_id)
+        if baseline_build_id is not None:
+            baseline_records = [(await fetch_build_status(baseline_build_id)).get("build", {})]
+            baseline_records[0].setdefault("_id", baseline_build_id)
+        else:
+            baseline_records = await find_baseline_builds(target_record, baseline_builds, same_branch)
+        if not baseline_records:
+            raise ValueError(
+                f"No successful builds of workflow {target_record.get('workflowId')} in the "
+                f"{BASELINE_WINDOW.days} days before this build to compare with"
+            )
+
+        async def profile(record: Dict[str, Any]) -> Dict[str, Any]:
+            return await fetch_build_profile(record, include_environment)
+
+        results = await run_bounded([target_record, *baseline_records], profile)
+        if not results[0]["ok"]:
+            raise RuntimeError(f"Could not fetch build {build_id}: {results[0]['error']}")
+        target = results[0]["result"]
+        baselines = [result["result"] for result in results[1:] if result["ok"]]
+
+        step_rows, compared = diff_steps(
+            target["steps"], [baseline["steps"] for baseline in baselines], min_delta_seconds, min_delta_ratio
+        )
+
+        def median(key: str) -> Optional[float]:
+            values = [baseline[key] for baseline in baselines if baseline[key] is not None]
+            return _round(statistics.median(values)) if values else None
+
+        result = {
+            "build_id": build_id,
+            "status": target["status"],
+            "baseline_build_ids": [baseline["build_id"] for baseline in baselines],
+            "duration": {"baseline": median("duration"), "build": _round(target["duration"])},
+            "queue_wait": {"baseline": median("queue_wait"), "build": _round(target["queue_wait"])},
+            "steps_compared": compared,
+            "step_changes": {
+                "columns": ["step", "change", "baseline_seconds", "seconds", "delta_seconds", "delta_ratio"],
+                "rows": step_rows,
+            },
+        }
+        if include_environment:
+            environments = [baseline["environment"] for baseline in baselines if baseline["environment"] is not None]
+            if target["environment"] is None or not environments:
+                result["environment_changes"] = {"error": "Environment not available"}
+            else:
+                rows = diff_environment(target["environment"], environments)
+                result["environment_changes"] = {
+                    "columns": ["key", "baseline", "build"],
+                    "rows": rows[:MAX_ENVIRONMENT_DIFFERENCES],
+                    "truncated": len(rows) > MAX_ENVIRONMENT_DIFFERENCES,
+                }
+        return result
@@ -0,0 +1,321 @@
+"""
+Build failure diagnosis for Codemagic MCP server.
+
+Finds the step a build failed in and streams only that step's log through
+a set of known error signatures (Xcode, Gradle, Flutter, CocoaPods, code
+signing and common infrastructure failures). Instead of the whole log, the
+client gets a short ranked list of likely causes with the lines around them.
+"""
+import math
+import re
+from collections import deque
+from contextlib import aclosing
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List, Pattern
+from .base import TERMINAL_BUILD_STATUSES
+from .builds import fetch_build_status, fetch_build_steps
+from .logs import iter_log_lines, log_endpoint, MAX_LINE_LENGTH
+
+
+# Step statuses that mark the step a build failed in
+FAILED_STEP_STATUSES = {"failed", "timeout"}
+
+# Lines of context kept before and after a matching line
+CONTEXT_LINES = 3
+
+# Line windows kept per cause
+MAX_WINDOWS_PER_CAUSE = 2
+
+# Causes returned by default
+DEFAULT_MAX_CAUSES = 5
+
+# Last lines of the log returned when no signature matches
+FALLBACK_TAIL_LINES = 20
+
+
+class ErrorSignature:
+    """A known failure: a pattern recognizing its log lines, a weight for ranking and a hint."""
+
+    def __init__(self, name: str, category: str, pattern: str, weight: float, hint: str, ignore_case: bool = False):
+        self.name = name
+        self.category = category
+        self.pattern = pattern
+        self.weight = weight
+        self.hint = hint
+        self.ignore_case = ignore_case
+        self.regex: Pattern[str] = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+# Known failures; the weight reflects how likely a match is the root cause
+# rather than a consequence of it, e.g. "BUILD FAILED" merely follows the real error.
+ERROR_SIGNATURES: List[ErrorSignature] = [
+    # Code signing
+    ErrorSignature("provisioning_profile", "signing",
+                   r"No (matching )?provisioning profiles? (found|matching)|requires a provisioning profile|"
+                   r"Provisioning profile .+ doesn't (include|match)", 10,
+                   "Provisioning profile missing or not matching the bundle ID, team or certificate", ignore_case=True),
+    ErrorSignature("signing_certificate", "signing",
+                   r"No (signing )?certificate .*found|code ?sign(ing)? identity .*not found|"
+                   r"errSecInternalComponent|Code ?Sign error|certificate has (expired|been revoked)", 10,
+                   "Signing certificate missing, expired or not in the keychain", ignore_case=True),
+    ErrorSignature("android_keystore", "signing",
+                   r"Keystore was tampered with|keystore password was incorrect|Failed to read key .+ from store|"
+                   r"KeytoolException", 10,
+                   "Android keystore, key alias or password is wrong", ignore_case=True),
+    # Xcode
+    ErrorSignature("xcode_compile_error", "xcode", r"\.(swift|m|mm|h|c|cc|cpp):\d+:\d+: error: ", 9,
+                   "Compiler error in iOS/macOS source code"),
+    ErrorSignature("xcode_linker_error", "xcode",
+                   r"ld: (library|framework) not found|Undefined symbols? for architecture|"
+                   r"linker command failed with exit code", 8,
+                   "Linking failed: missing library or framework, or an undefined symbol"),
+    ErrorSignature("xcode_missing_module", "xcode", r"error: no such module|module '[^']+' not found", 8,
+                   "A Swift module or pod is not built or linked, check the Podfile or package dependencies",
+                   ignore_case=True),
+    ErrorSignature("xcode_sdk_mismatch", "xcode",
+                   r"requires? (a )?(minimum )?(version of )?Xcode|SDK \S+ cannot be located|"
+                   r"is not available in Xcode|Unable to find a destination matching", 7,
+                   "Xcode or SDK version on the build machine does not match the project", ignore_case=True),
+    ErrorSignature("xcode_test_failure", "xcode", r"error: -\[\S+ \S+\] : |Test Case .+ failed|Testing failed:", 6,
+                   "iOS unit or UI tests failed"),
+    ErrorSignature("xcode_build_failed", "xcode", r"\*\* (BUILD|ARCHIVE|TEST|CLEAN) FAILED \*\*", 2,
+                   "Xcode build failed, see the errors before this line"),
+    # CocoaPods
+    ErrorSignature("cocoapods_incompatible", "cocoapods",
+                   r"CocoaPods could not find compatible versions for pod|"
+                   r"required a higher minimum deployment target", 9,
+                   "Pod versions conflict or need a higher iOS deployment target"),
+    ErrorSignature("cocoapods_missing_spec", "cocoapods",
+                   r"Unable to find a specification for|None of your spec sources contain a spec", 8,
+                   "Pod not found in the spec repos, the repo may be out of date"),
+    ErrorSignature("cocoapods_repo", "cocoapods", r"out-of-date source repos|CDN: trunk .*(failed|error)", 6,
+                   "CocoaPods spec repo out of date or unreachable, run pod repo update"),
+    ErrorSignature("cocoapods_install", "cocoapods", r"Error running pod install|pod install.* failed", 4,
+                   "pod install failed, see the CocoaPods errors before this line"),
+    # Flutter and Dart
+    ErrorSignature("dart_compile_error", "flutter", r"\.dart:\d+:\d+: Error: |Error: Compilation failed", 9,
+                   "Dart compilation error"),
+    ErrorSignature("pub_version_solving", "flutter",
+                   r"version solving failed|pub get failed|Because .+ depends on .+ which", 8,
+                   "Dart package versions conflict"),
+    ErrorSignature("dart_sdk_version", "flutter", r"The current Dart SDK version is|requires SDK version", 7,
+                   "Package requires a different Flutter/Dart SDK version than the build machine has"),
+    ErrorSignature("flutter_test_failure", "flutter", r"Some tests failed\.|\[E\]$", 6,
+                   "Flutter tests failed"),
+    ErrorSignature("flutter_platform_build", "flutter",
+                   r"Gradle task \S+ failed with exit code|Failed to build iOS app|Error \(Xcode\):", 4,
+                   "Platform build failed, see the Gradle or Xcode errors around this line"),
+    # Gradle and Android
+    ErrorSignature("kotlin_java_compile_error", "gradle",
+                   r"^e: .+\.kts?:|\.java:\d+: error: |Compilation error\. See log for more details", 9,
+                   "Kotlin or Java compilation error"),
+    ErrorSignature("gradle_out_of_memory", "gradle",
+                   r"OutOfMemoryError|Java heap space|GC overhead limit exceeded|"
+                   r"Gradle build daemon disappeared unexpectedly", 9,
+                   "Gradle ran out of memory, raise org.gradle.jvmargs or use a larger instance"),
+    ErrorSignature("gradle_dependency_resolution", "gradle",
+                   r"Could not (resolve|find) [\w.\-]+:[\w.\-]+|Could not resolve all (files|dependencies|artifacts)", 8,
+                   "A Gradle dependency could not be resolved"),
+    ErrorSignature("android_sdk", "gradle",
+                   r"SDK location not found|failed to find (target|Build Tools)|License for package .+ not accepted|"
+                   r"requires (compileSdk|Android Gradle plugin)", 7,
+                   "Android SDK, build tools or Gradle plugin version missing or mismatched"),
+    ErrorSignature("gradle_task_failed", "gradle", r"Execution failed for task '[^']+'", 5,
+                   "A Gradle task failed, see the cause reported below it"),
+    ErrorSignature("gradle_build_failed", "gradle", r"FAILURE: Build failed with an exception|BUILD FAILED in \d", 2,
+                   "Gradle build failed, see the task failure and cause before this line"),
+    # Infrastructure and scripts
+    ErrorSignature("disk_full", "infrastructure", r"No space left on device", 9,
+                   "The build machine ran out of disk space", ignore_case=True),
+    ErrorSignature("network", "infrastructure",
+                   r"Could not resolve host|Connection (timed out|refused|reset)|SSL(Error| certificate problem)|"
+                   r"Failed to connect to|(502|503|504) (Bad Gateway|Service Unavailable|Gateway Time-?out)", 5,
+                   "A network request failed, possibly transient", ignore_case=True),
+    ErrorSignature("timeout", "infrastructure", r"timed out after|Timeout of \d+ minutes|build (has )?timed out", 5,
+                   "A command or the build reached its time limit", ignore_case=True),
+    ErrorSignature("command_not_found", "script", r"command not found|: not found$", 4,
+                   "A script calls a tool that is not installed"),
+    ErrorSignature("script_exit_code", "script",
+                   r"exited with status code \d+|returned non-zero exit status|Process completed with exit code [1-9]", 2,
+                   "A script command exited with an error"),
+    ErrorSignature("generic_error", "generic", r"^\s*(\[?(error|fatal)\]?:?\s)", 1,
+                   "An error line not recognized by a more specific signature", ignore_case=True),
+]
+
+_prefilter: Optional[Pattern[str]] = None
+
+
+def add_error_signature(
+    name: str,
+    category: str,
+    pattern: str,
+    weight: float,
+    hint: str,
+    ignore_case: bool = False
+) -> None:
+    """
+    Add a custom error signature, or replace the one with the same name.
+
+    Args:
+        name: Unique signature name
+        category: Category, e.g. 'xcode', 'gradle' or a project-specific one
+        pattern: Regular expression matching a log line
+        weight: Ranking weight, 10 for a sure root cause, 2 for generic failure lines
+        hint: Short explanation of the cause
+        ignore_case: Match the pattern case-insensitively
+    """
+    global _prefilter
+
+    signature = ErrorSignature(name, category, pattern, weight, hint, ignore_case)
+    ERROR_SIGNATURES[:] = [existing for existing in ERROR_SIGNATURES if existing.name != name]
+    ERROR_SIGNATURES.append(signature)
+    _prefilter = None
+
+
+def get_prefilter() -> Pattern[str]:
+    """Get a single regex matching any signature, so most lines are rejected with one search."""
+    global _prefilter
+
+    if _prefilter is None:
+        _prefilter = re.compile("|".join(
+            f"(?i:{signature.pattern})" if signature.ignore_case else f"(?:{signature.pattern})"
+            for signature in ERROR_SIGNATURES
+        ), re.MULTILINE)
+    return _prefilter
+
+
+def find_failed_step(steps: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Get the first step that failed or timed out, if any."""
+    return next((step for step in steps if str(step.get("status", "")).lower() in FAILED_STEP_STATUSES), None)
+
+
+async def scan_log(endpoint: str, max_causes: int = DEFAULT_MAX_CAUSES) -> Dict[str, Any]:
+    """
+    Stream a log and match every line against the error signatures.
+
+    Lines come from logs.iter_log_lines, which extracts them from the JSON
+    log response as it downloads; each is matched whole, however long.
+
+    Args:
+        endpoint: Log endpoint, see logs.log_endpoint
+        max_causes: Maximum number of causes to return
+
+    Returns:
+        Dictionary with the ranked causes, the number of lines scanned, and the
+        last lines of the log when no signature matched
+    """
+    prefilter = get_prefilter()
+    signatures = list(ERROR_SIGNATURES)
+    causes: Dict[str, Dict[str, Any]] = {}
+    before: deque = deque(maxlen=CONTEXT_LINES)
+    tail: deque = deque(maxlen=FALLBACK_TAIL_LINES)
+    open_windows: List[Dict[str, Any]] = []
+    line_number = 0
+
+    async with aclosing(iter_log_lines(endpoint)) as log_lines:
+        async for _, text in log_lines:
+            line_number += 1
+            # Signatures match the whole line; only the excerpt returned is cut
+            entry = {"line": line_number, "text": text[:MAX_LINE_LENGTH]}
+
+            for window in open_windows:
+                window["lines"].append(entry)
+                window["remaining"] -= 1
+            open_windows = [window for window in open_windows if window["remaining"] > 0]
+
+            if prefilter.search(text):
+                matched = [signature for signature in signatures if signature.regex.search(text)]
+                # Generic signatures only count for lines nothing more specific recognizes
+                matched = [signature for signature in matched if signature.category != "generic"] or matched
+                for signature in matched:
+                    cause = causes.setdefault(signature.name, {
+                        "signature": signature.name,
+                        "category": signature.category,
+                        "hint": signature.hint,
+                        "weight": signature.weight,
+                        "count": 0,
+                        "first_line": line_number,
+                        "windows": [],
+                    })
+                    cause["count"] += 1
+                    # Lines already shown in the previous window are not repeated
+                    windows = cause["windows"]
+                    if len(windows) < MAX_WINDOWS_PER_CAUSE and (
+                        not windows or windows[-1]["lines"][-1]["line"] < line_number - CONTEXT_LINES
+                    ):
+                        window = {"match_line": line_number, "lines": [*before, entry], "remaining": CONTEXT_LINES}
+                        windows.append(window)
+                        open_windows.append(window)
+
+            before.append(entry)
+            tail.append(entry)
+
+    # Heavier signatures first; repeated matches add a little, the earliest match breaks ties
+    ranked = sorted(
+        causes.values(),
+        key=lambda cause: (-(cause["weight"] + math.log10(cause["count"])), cause["first_line"])
+    )[:max_causes]
+    for cause in ranked:
+        cause["score"] = round(cause.pop("weight") + math.log10(cause["count"]), 2)
+        for window in cause["windows"]:
+            window.pop("remaining", None)
+
+    result: Dict[str, Any] = {"causes": ranked, "scanned_lines": line_number}
+    if not ranked:
+        result["tail"] = list(tail)
+    return result
+
+
+def register_diagnosis_tools(mcp: FastMCP) -> None:
+    """Register all diagnosis tools with the MCP server."""
+
+    @mcp.tool()
+    async def diagnose_build(
+        build_id: str,
+        step_id: Optional[str] = None,
+        max_causes: int = DEFAULT_MAX_CAUSES
+    ) -> Dict[str, Any]:
+        """
+        Diagnose why a build failed without downloading its whole log.
+
+        Finds the failed step, streams only that step's log through known error signatures
+        (Xcode, Gradle, Flutter, CocoaPods, code signing, infrastructure) and returns the likely
+        causes ranked, each with a hint and the lines around its first matches. When no step is
+        marked as failed, the whole build log is scanned.
+
+        Args:
+            build_id: The build identifier
+            step_id: Optional step to scan instead of the failed one
+            max_causes: Maximum number of causes to return (default: 5)
+
+        Returns:
+            Dictionary with the build status, the scanned step, the ranked causes and, when nothing
+            matched, the last lines of the log
+        """
+        if max_causes < 1:
+            raise ValueError("max_causes must be at least 1")
+
+        build = (await fetch_build_status(build_id)).get("build", {})
+        status = build.get("status")
+        steps = await fetch_build_steps(build_id)
+
+        if step_id:
+            step = next((step for step in steps if (step.get("_id") or step.get("id")) == step_id), {"_id": step_id})
+        else:
+            step = find_failed_step(steps)
+        scanned_step = None
+        if step is not None:
+            step_id = step.get("_id") or step.get("id")
+            scanned_step = {"id": step_id, "name": step.get("name"), "status": step.get("status")}
+
+        result = await scan_log(log_endpoint(build_id, step_id), max_causes)
+        diagnosis = {
+            "build_id": build_id,
+            "status": status,
+            "finished": status in TERMINAL_BUILD_STATUSES,
+            "step": scanned_step,
+            **result,
+        }
+        if status not in ("failed", "timeout") and scanned_step is None:
+            diagnosis["note"] = f"Build status is {status!r}, not a failure"
+        return diagnosis
@@ -0,0 +1,199 @@
+"""
+Persistent cache of immutable build data for Codemagic MCP server.
+
+The logs, steps, timeline, artifact list and environment of a finished
+build never change, so they are kept on disk across sessions instead of
+being fetched again by every new session. Payloads are stored compressed
+under their SHA-256 digest, so identical payloads are stored once, and a
+SQLite table maps (build ID, resource) to a digest and tracks when each
+entry was last used, for LRU eviction within a size budget.
+
+Several server processes can share the cache: SQLite serializes updates of
+the table, and payload files are written to a temporary file and renamed
+into place, so a reader never sees a partial file. An entry whose file has
+disappeared (evicted by another process) is treated as a miss.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional
+
+
+DISK_CACHE_DIR = os.environ.get(
+    "CODEMAGIC_DISK_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "codemagic-mcp", "builds")
+)
+
+# Size budget of the compressed payloads in bytes (0 disables the disk cache)
+DISK_CACHE_SIZE = int(os.environ.get("CODEMAGIC_DISK_CACHE_SIZE", str(512 * 1024 * 1024)))
+
+# Eviction frees space down to this fraction of the budget, so that it does not run on every write
+EVICTION_TARGET = 0.9
+
+COMPRESSION_LEVEL = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    build_id TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (build_id, resource)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+"""
+
+
+class DiskCache:
+    """Content-addressed, size-bounded store of compressed build payloads."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        # Calls come from worker threads; one connection is shared under this lock
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache stores anything."""
+        return self.max_bytes > 0
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the cache database, creating the directory and schema if needed."""
+        if self._conn is None:
+            os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+            # A generous busy timeout lets other server processes finish their writes
+            conn = sqlite3.connect(os.path.join(self.directory, "cache.sqlite3"), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], f"{digest}.zz")
+
+    def get(self, build_id: str, resource: str) -> Optional[bytes]:
+        """
+        Get a cached payload.
+
+        Args:
+            build_id: The build identifier
+            resource: Resource type, e.g. 'logs' or 'steps'
+
+        Returns:
+            The uncompressed payload, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self.connect()
+            row = conn.execute(
+                "SELECT digest FROM entries WHERE build_id = ? AND resource = ?", (build_id, resource)
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self._blob_path(row[0]), "rb") as file:
+                    content = zlib.decompress(file.read())
+            except (OSError, zlib.error):
+                with conn:
+                    conn.execute("DELETE FROM entries WHERE build_id = ? AND resource = ?", (build_id, resource))
+                return None
+            with conn:
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE build_id = ? AND resource = ?",
+                    (time.time(), build_id, resource)
+                )
+            return content
+
+    def put(self, build_id: str, resource: str, content: bytes) -> None:
+        """
+        Store a payload, evicting the least recently used entries if over budget.
+
+        Args:
+            build_id: The build identifier
+            resource: Resource type, e.g. 'logs' or 'steps'
+            content: Uncompressed payload
+        """
+        if not self.enabled:
+            return
+        digest = hashlib.sha256(content).hexdigest()
+        compressed = zlib.compress(content, COMPRESSION_LEVEL)
+        if len(compressed) > self.max_bytes * EVICTION_TARGET:
+            return
+
+        with self._lock:
+            conn = self.connect()
+            path = self._blob_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "wb") as file:
+                    file.write(compressed)
+                os.replace(temp_path, path)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (build_id, resource, digest, size, raw_size, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (build_id, resource, digest, len(compressed), len(content), time.time())
+                )
+            self._evict(conn)
+
+    def _total_size(self, conn: sqlite3.Connection) -> int:
+        # Entries sharing a digest share one file
+        row = conn.execute("SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM entries GROUP BY digest)").fetchone()
+        return row[0] or 0
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = self._total_size(conn)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICTION_TARGET
+        rows = conn.execute(
+            "SELECT build_id, resource, digest, size FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        for build_id, resource, digest, size in rows:
+            if total <= target:
+                break
+            with conn:
+                conn.execute("DELETE FROM entries WHERE build_id = ? AND resource = ?", (build_id, resource))
+                shared = conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            if shared is None:
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+                total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of entries and their compressed and uncompressed sizes."""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            conn = self.connect()
+            entries, raw_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(raw_size), 0) FROM entries").fetchone()
+            return {
+                "enabled": True,
+                "directory": self.directory,
+                "entries": entries,
+                "size": self._total_size(conn),
+                "raw_size": raw_size,
+                "max_size": self.max_bytes,
+            }
+
+
+disk_cache = DiskCache(DISK_CACHE_DIR, DISK_CACHE_SIZE)
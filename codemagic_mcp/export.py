@@ -0,0 +1,239 @@
+"""
+Bulk artifact export for Codemagic MCP server.
+
+Mirrors the artifacts of many builds to a local directory. Files are
+streamed to disk several at a time, and a manifest in the export directory
+records every completed file, so an interrupted export is resumed by running
+it again: completed files are skipped, and partial ones continue where they
+stopped.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse, unquote
+from mcp.server.fastmcp import FastMCP, Context
+from typing import Optional, Dict, Any, List
+from .artifacts import download_artifact_to, hash_file, request_public_artifact_url, progress_reporter
+from .builds import iter_builds, fetch_build_resource
+from .bulk import run_bounded, batch_report
+
+
+# Maximum number of artifacts downloaded at the same time
+EXPORT_CONCURRENCY = int(os.environ.get("CODEMAGIC_EXPORT_CONCURRENCY", "4"))
+
+# Name of the manifest written to the export directory
+MANIFEST_NAME = ".codemagic-export.json"
+
+# Maximum number of builds exported when selecting builds by filter
+DEFAULT_MAX_BUILDS = 20
+
+# Build IDs become directory names, so they may only hold characters that cannot leave the export directory
+SAFE_BUILD_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def extract_artifacts(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Get the list of artifacts from a build or build artifacts response.
+
+    Args:
+        payload: Parsed response of /builds/{id} or /builds/{id}/artifacts
+
+    Returns:
+        The artifacts, empty if the payload has none
+    """
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return []
+    for key in ("artifacts", "artefacts"):
+        if isinstance(payload.get(key), list):
+            return payload[key]
+    if isinstance(payload.get("build"), dict):
+        return extract_artifacts(payload["build"])
+    return []
+
+
+def artifact_secure_filename(artifact: Dict[str, Any]) -> Optional[str]:
+    """Get the secure filename (uuid1/uuid2/filename.ext) of an artifact from its download URL."""
+    if artifact.get("secureFilename"):
+        return artifact["secureFilename"]
+    path = unquote(urlparse(artifact.get("url") or "").path)
+    marker = "/artifacts/"
+    if marker not in path:
+        return None
+    return path.split(marker, 1)[1].removesuffix("/public-url")
+
+
+class ExportManifest:
+    """Record of the files completed by an export, keyed by secure filename."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.files: Dict[str, Dict[str, Any]] = json.load(file).get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+        self._lock = threading.Lock()
+
+    def is_complete(self, secure_filename: str, path: str) -> bool:
+        """Whether a file was exported and has not changed on disk since."""
+        entry = self.files.get(secure_filename)
+        if entry is None or entry.get("path") != path:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns")
+
+    def record(self, secure_filename: str, entry: Dict[str, Any]) -> None:
+        """Record a completed file and write the manifest atomically; safe to call from several threads."""
+        with self._lock:
+            self.files[secure_filename] = {**entry, "mtime_ns": os.stat(entry["path"]).st_mtime_ns}
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"files": self.files}, file, indent=1)
+            os.replace(temp_path, self.path)
+
+
+def matches_listing(path: str, artifact: Dict[str, Any]) -> bool:
+    """
+    Check whether an existing file is the artifact described by the build's listing.
+
+    The size must match; if the listing includes an MD5 checksum, so must the file's.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if artifact.get("size") is None or size != artifact["size"]:
+        return False
+    if artifact.get("md5"):
+        return hash_file(path, "md5").hexdigest() == artifact["md5"]
+    return True
+
+
+def register_export_tools(mcp: FastMCP) -> None:
+    """Register all artifact export tools with the MCP server."""
+
+    @mcp.tool()
+    async def export_build_artifacts(
+        target_dir: str,
+        build_ids: Optional[List[str]] = None,
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        tag: Optional[str] = None,
+        status: Optional[str] = "finished",
+        max_builds: int = DEFAULT_MAX_BUILDS,
+        artifact_types: Optional[List[str]] = None,
+        download: bool = True,
+        public_urls_expire_in: Optional[int] = None,
+        concurrency: int = EXPORT_CONCURRENCY,
+        ctx: Optional[Context] = None
+    ) -> Dict[str, Any]:
+        """
+        Export the artifacts of many builds to a local directory, and optionally create public URLs for them.
+
+        Artifacts are saved as <target_dir>/<build_id>/<filename>, streamed to disk several at a time.
+        Files that already exist with the size (and checksum, if known) from the build's artifact listing
+        are skipped. Running the same export again resumes it after an interruption.
+
+        Args:
+            target_dir: Directory to export to, created if missing
+            build_ids: Optional build identifiers to export
+            app_id: Without build_ids, export builds of this application
+            workflow_id: Without build_ids, export builds of this workflow
+            branch: Without build_ids, export builds on this branch
+            tag: Without build_ids, export builds of this tag
+            status: Without build_ids, only export builds with this status (default: 'finished', None for any)
+            max_builds: Without build_ids, maximum number of builds to export, newest first (default: 20)
+            artifact_types: Optional artifact types to export, e.g. ['ipa', 'aab']
+            download: Download the files (default: True); disable to only create public URLs
+            public_urls_expire_in: Optional lifetime in seconds of public URLs to create for every artifact
+            concurrency: Maximum number of concurrent downloads (default: 4)
+
+        Returns:
+            Dictionary with a result or error per artifact and the number of downloaded, skipped and failed artifacts
+        """
+        if build_ids is None:
+            if not (app_id or workflow_id or branch or tag):
+                raise ValueError("Either build_ids or at least one of app_id, workflow_id, branch or tag is required")
+            build_ids = [
+                build["_id"] async for build in iter_builds(
+                    app_id=app_id,
+                    workflow_id=workflow_id,
+                    branch=branch,
+                    tag=tag,
+                    predicate=lambda build: status is None or build.get("status") == status,
+                    max_results=max_builds
+                )
+            ]
+        unsafe = [build_id for build_id in build_ids if not SAFE_BUILD_ID.match(build_id)]
+        if unsafe:
+            raise ValueError(f"Invalid build IDs: {', '.join(map(repr, unsafe))}")
+
+        async def artifacts_of(build_id: str) -> List[Dict[str, Any]]:
+            return extract_artifacts(await fetch_build_resource(build_id, "artifacts"))
+
+        listings = await run_bounded(dict.fromkeys(build_ids), artifacts_of)
+        results = [listing for listing in listings if not listing["ok"]]
+        items = []
+        for listing in listings:
+            if not listing["ok"]:
+                continue
+            for artifact in listing["result"]:
+                secure_filename = artifact_secure_filename(artifact)
+                if secure_filename is None:
+                    continue
+                if artifact_types and artifact.get("type") not in artifact_types:
+                    continue
+                items.append((listing["id"], secure_filename, artifact))
+
+        directory = os.path.abspath(os.path.expanduser(target_dir))
+        os.makedirs(directory, exist_ok=True)
+        manifest = ExportManifest(directory)
+        expires_at = int(time.time()) + public_urls_expire_in if public_urls_expire_in else None
+        completed = 0
+        progress = progress_reporter(ctx)
+
+        async def export(item: Any) -> Dict[str, Any]:
+            nonlocal completed
+            build_id, secure_filename, artifact = item
+            path = os.path.join(directory, build_id, os.path.basename(secure_filename))
+            result: Dict[str, Any] = {"build_id": build_id, "name": artifact.get("name"), "path": path}
+
+            if download:
+                if manifest.is_complete(secure_filename, path) or await asyncio.to_thread(matches_listing, path, artifact):
+                    result["status"] = "skipped"
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    downloaded = await download_artifact_to(secure_filename, path)
+                    await asyncio.to_thread(manifest.record, secure_filename, {"build_id": build_id, **downloaded})
+                    result.update(status="downloaded", size=downloaded["size"], sha256=downloaded["sha256"])
+            if expires_at is not None:
+                result["public_url"] = (await request_public_artifact_url(secure_filename, expires_at)).get("url")
+
+            completed += 1
+            if progress is not None:
+                await progress(completed, len(items))
+            return result
+
+        exported = await run_bounded(items, export, concurrency)
+        for entry, (_, secure_filename, _) in zip(exported, items):
+            entry["id"] = secure_filename
+        results.extend(exported)
+
+        report = batch_report(results)
+        statuses = [entry["result"].get("status") for entry in exported if entry["ok"]]
+        report.update(
+            target_dir=directory,
+            builds=len(build_ids),
+            downloaded=statuses.count("downloaded"),
+            skipped=statuses.count("skipped"),
+        )
+        return report
@@ -0,0 +1,199 @@
+"""
+Build history index tools for Codemagic MCP server.
+"""
+import asyncio
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List
+from .base import make_request
+from .builds import iter_builds, BUILDS_PAGE_SIZE
+from .index import get_build_index, build_row
+
+
+# Number of builds fetched by the first sync of a scope
+INITIAL_SYNC_BUILDS = 1000
+
+# Maximum concurrent status requests when refreshing unfinished builds
+REFRESH_CONCURRENCY = 8
+
+
+async def sync_index(app_id: Optional[str] = None, max_builds: int = INITIAL_SYNC_BUILDS) -> Dict[str, Any]:
+    """
+    Bring the build index up to date with the API.
+
+    Only builds created since the newest build of the previous sync are
+    fetched, plus a status refresh for indexed builds that had not finished.
+    The first sync of a scope backfills up to max_builds builds.
+
+    Args:
+        app_id: Optional application to sync, all applications otherwise
+        max_builds: Number of builds to backfill on the first sync
+
+    Returns:
+        Dictionary with the number of new, updated and refreshed builds
+    """
+    scope = app_id or "*"
+    build_index = get_build_index()
+    last_created_at = await build_index.run(build_index.last_created_at, scope) or None
+
+    seen = set()
+    newest = last_created_at
+    batch: List[Dict[str, Any]] = []
+    async for build in iter_builds(
+        app_id=app_id,
+        since=last_created_at,
+        max_results=None if last_created_at else max_builds
+    ):
+        batch.append(build)
+        row = build_row(build)
+        seen.add(row["id"])
+        if row["created_at"] and (newest is None or row["created_at"] > newest):
+            newest = row["created_at"]
+        if len(batch) >= BUILDS_PAGE_SIZE:
+            await build_index.run(build_index.upsert, batch)
+            batch = []
+    await build_index.run(build_index.upsert, batch)
+
+    semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+    async def refresh(build_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                response = await make_request("GET", f"/builds/{build_id}")
+            except Exception:
+                return None
+            return response.json().get("build")
+
+    pending = [build_id for build_id in await build_index.run(build_index.pending_ids, app_id) if build_id not in seen]
+    refreshed = [build for build in await asyncio.gather(*map(refresh, pending)) if build]
+    await build_index.run(build_index.upsert, refreshed)
+
+    await build_index.run(build_index.mark_synced, scope, newest)
+    return {
+        "scope": scope,
+        "fetched": len(seen),
+        "refreshed": len(refreshed),
+        "refresh_failed": len(pending) - len(refreshed),
+        "last_created_at": newest,
+    }
+
+
+def register_history_tools(mcp: FastMCP) -> None:
+    """Register all build history index tools with the MCP server."""
+
+    @mcp.tool()
+    async def sync_build_index(app_id: Optional[str] = None, max_builds: int = INITIAL_SYNC_BUILDS) -> Dict[str, Any]:
+        """
+        Incrementally sync the local build history index with Codemagic.
+
+        Fetches only builds newer than the last sync, and refreshes indexed builds that were still running.
+
+        Args:
+            app_id: Optional application to sync, all applications otherwise
+            max_builds: Number of builds to backfill on the first sync (default: 1000)
+
+        Returns:
+            Dictionary with the number of fetched and refreshed builds
+        """
+        return await sync_index(app_id, max_builds)
+
+    @mcp.tool()
+    async def query_build_index(
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        tag: Optional[str] = None,
+        status: Optional[List[str]] = None,
+        instance_type: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        order_by: str = "created_at",
+        descending: bool = True,
+        limit: int = 20,
+        include_data: bool = False,
+        sync: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Query builds from the local build history index, e.g. the last green build on main for a workflow.
+
+        Args:
+            app_id: Optional filter by application identifier
+            workflow_id: Optional filter by workflow identifier
+            branch: Optional filter by branch name
+            tag: Optional filter by tag name
+            status: Optional list of build statuses to include (e.g. ['finished'])
+            instance_type: Optional filter by instance type
+            since: Optional ISO 8601 timestamp, only builds created at or after it
+            until: Optional ISO 8601 timestamp, only builds created before it
+            order_by: One of 'created_at', 'started_at', 'finished_at', 'duration' (default: 'created_at')
+            descending: Sort in descending order (default: True)
+            limit: Maximum number of builds to return (default: 20)
+            include_data: Include the full build payload (default: False)
+            sync: Sync the index before querying (default: False, always done if the application was never synced)
+
+        Returns:
+            Dictionary with the matching builds and their count
+        """
+        build_index = get_build_index()
+        # Queries of an application that was never synced would silently come back empty
+        if sync or not await build_index.run(build_index.is_synced, app_id or "*"):
+            await sync_index(app_id)
+
+        builds = await build_index.run(
+            build_index.query,
+            {
+                "app_id": app_id,
+                "workflow_id": workflow_id,
+                "branch": branch,
+                "tag": tag,
+                "status": status,
+                "instance_type": instance_type,
+            },
+            since=since,
+            until=until,
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            include_data=include_data
+        )
+        return {"builds": builds, "count": len(builds)}
+
+    @mcp.tool()
+    async def build_index_stats(
+        group_by: Optional[List[str]] = None,
+        app_id: Optional[str] = None,
+        workflow_id: Optional[str] = None,
+        branch: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        sync: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Aggregate build counts, failure rates and durations from the local build history index.
+
+        Args:
+            group_by: Columns to group by: 'app_id', 'workflow_id', 'branch', 'tag', 'status',
+                      'instance_type' (default: ['workflow_id'])
+            app_id: Optional filter by application identifier
+            workflow_id: Optional filter by workflow identifier
+            branch: Optional filter by branch name
+            since: Optional ISO 8601 timestamp, only builds created at or after it
+            until: Optional ISO 8601 timestamp, only builds created before it
+            sync: Sync the index before aggregating (default: False, always done if the application was never synced)
+
+        Returns:
+            Dictionary with one row per group: count, failed, failure_rate, avg_duration,
+            max_duration (seconds) and last_created_at
+        """
+        build_index = get_build_index()
+        # Queries of an application that was never synced would silently come back empty
+        if sync or not await build_index.run(build_index.is_synced, app_id or "*"):
+            await sync_index(app_id)
+
+        groups = await build_index.run(
+            build_index.stats,
+            group_by or ["workflow_id"],
+            {"app_id": app_id, "workflow_id": workflow_id, "branch": branch},
+            since=since,
+            until=until
+        )
+        return {"groups": groups}
@@ -0,0 +1,343 @@
+"""
+Local build-history index for Codemagic MCP server.
+
+Build records are stored in a SQLite database so that filtered, sorted and
+aggregated questions about build history can be answered without scanning
+the API. The index is created by the first sync (see history.py) and is
+kept up to date by every build status the server fetches afterwards.
+Database work runs on a dedicated thread, off the event loop.
+"""
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, Iterable, List, Optional, TypeVar
+from .base import parse_timestamp, TERMINAL_BUILD_STATUSES
+from .tenants import current_tenant, ENV_TENANT
+
+
+INDEX_PATH = os.environ.get(
+    "CODEMAGIC_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "codemagic-mcp", "builds.sqlite3")
+)
+
+# Columns that queries may filter, group and sort by
+GROUP_COLUMNS = ("app_id", "workflow_id", "branch", "tag", "status", "instance_type")
+ORDER_COLUMNS = ("created_at", "started_at", "finished_at", "duration")
+
+# Runs every index operation; a single thread, so no connection is ever used concurrently
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="codemagic-index")
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id TEXT PRIMARY KEY,
+    app_id TEXT,
+    workflow_id TEXT,
+    branch TEXT,
+    tag TEXT,
+    status TEXT,
+    instance_type TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    duration REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_workflow ON builds (app_id, workflow_id, branch, created_at);
+CREATE INDEX IF NOT EXISTS builds_created ON builds (created_at);
+CREATE INDEX IF NOT EXISTS builds_status ON builds (status);
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT PRIMARY KEY,
+    last_created_at TEXT,
+    synced_at TEXT NOT NULL
+);
+"""
+
+
+def _iso(value: Optional[str]) -> Optional[str]:
+    """Normalize an API timestamp to a UTC ISO string that sorts chronologically."""
+    parsed = parse_timestamp(value)
+    return parsed.astimezone(timezone.utc).isoformat() if parsed else None
+
+
+def build_row(build: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a build from the API into an index row.
+
+    Args:
+        build: Build dictionary as returned by the API
+
+    Returns:
+        Dictionary with one key per index column
+    """
+    started_at = parse_timestamp(build.get("startedAt"))
+    finished_at = parse_timestamp(build.get("finishedAt"))
+    duration = (finished_at - started_at).total_seconds() if started_at and finished_at else None
+
+    return {
+        "id": build.get("_id") or build.get("id"),
+        "app_id": build.get("appId"),
+        "workflow_id": build.get("workflowId"),
+        "branch": build.get("branch"),
+        "tag": build.get("tag"),
+        "status": build.get("status"),
+        "instance_type": build.get("instanceType"),
+        "created_at": _iso(build.get("createdAt")),
+        "started_at": _iso(build.get("startedAt")),
+        "finished_at": _iso(build.get("finishedAt")),
+        "duration": duration,
+        "data": json.dumps(build, separators=(",", ":")),
+    }
+
+
+class BuildIndex:
+    """SQLite-backed store of build records."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def exists(self) -> bool:
+        """Whether the index has been created by a sync."""
+        return self._conn is not None or os.path.exists(self.path)
+
+    async def run(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a method of the index on the index thread, keeping SQLite I/O off the event loop.
+
+        Args:
+            method: Bound method of this index, e.g. self.upsert
+            *args: Positional arguments of the method
+            **kwargs: Keyword arguments of the method
+
+        Returns:
+            The method's result
+        """
+        return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(method, *args, **kwargs))
+
+    def is_synced(self, scope: str) -> bool:
+        """Whether a scope, or all applications, has been synced at least once."""
+        if not self.exists():
+            return False
+        row = self.connect().execute(
+            "SELECT 1 FROM sync_state WHERE scope IN (?, '*') LIMIT 1", (scope,)
+        ).fetchone()
+        return row is not None
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the database, creating it and its schema if needed."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def upsert(self, builds: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or update builds.
+
+        Args:
+            builds: Build dictionaries as returned by the API
+
+        Returns:
+            Number of builds written
+        """
+        rows = [row for row in map(build_row, builds) if row["id"]]
+        if not rows:
+            return 0
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO builds (id, app_id, workflow_id, branch, tag, status, instance_type,
+                                    created_at, started_at, finished_at, duration, data)
+                VALUES (:id, :app_id, :workflow_id, :branch, :tag, :status, :instance_type,
+                        :created_at, :started_at, :finished_at, :duration, :data)
+                ON CONFLICT(id) DO UPDATE SET
+                    status = excluded.status,
+                    instance_type = excluded.instance_type,
+                    started_at = excluded.started_at,
+                    finished_at = excluded.finished_at,
+                    duration = excluded.duration,
+                    data = excluded.data
+                """,
+                rows
+            )
+        return len(rows)
+
+    def record(self, build: Dict[str, Any]) -> None:
+        """Update a single build if the index is in use, otherwise do nothing."""
+        if self.exists():
+            self.upsert([build])
+
+    def status(self, build_id: str) -> Optional[str]:
+        """Get the indexed status of a build, or None if the build is not indexed."""
+        if not self.exists():
+            return None
+        row = self.connect().execute("SELECT status FROM builds WHERE id = ?", (build_id,)).fetchone()
+        return row["status"] if row else None
+
+    def last_created_at(self, scope: str) -> Optional[str]:
+        """Get the creation time of the newest build seen by the last sync of a scope."""
+        row = self.connect().execute(
+            "SELECT last_created_at FROM sync_state WHERE scope = ?", (scope,)
+        ).fetchone()
+        return row["last_created_at"] if row else None
+
+    def mark_synced(self, scope: str, last_created_at: Optional[str]) -> None:
+        """Record a finished sync of a scope."""
+        conn = self.connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO sync_state (scope, last_created_at, synced_at) VALUES (?, ?, ?)
+                ON CONFLICT(scope) DO UPDATE SET
+                    last_created_at = MAX(COALESCE(sync_state.last_created_at, ''), COALESCE(excluded.last_created_at, '')),
+                    synced_at = excluded.synced_at
+                """,
+                (scope, last_created_at, datetime.now(timezone.utc).isoformat())
+            )
+
+    def pending_ids(self, app_id: Optional[str] = None) -> List[str]:
+        """Get the IDs of indexed builds that have not reached a terminal state."""
+        sql = f"SELECT id FROM builds WHERE status NOT IN ({','.join('?' * len(TERMINAL_BUILD_STATUSES))})"
+        args: List[Any] = sorted(TERMINAL_BUILD_STATUSES)
+        if app_id:
+            sql += " AND app_id = ?"
+            args.append(app_id)
+        return [row["id"] for row in self.connect().execute(sql, args)]
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        order_by: str = "created_at",
+        descending: bool = True,
+        limit: int = 20,
+        include_data: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Select builds from the index.
+
+        Args:
+            filters: Column name to value (or list of values) for columns in GROUP_COLUMNS
+            since: Optional ISO 8601 timestamp, only builds created at or after it
+            until: Optional ISO 8601 timestamp, only builds created before it
+            order_by: Column in ORDER_COLUMNS to sort by
+            descending: Sort newest/longest first
+            limit: Maximum number of builds to return
+            include_data: Include the full build payload from the API
+
+        Returns:
+            List of build rows
+        """
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"order_by must be one of {', '.join(ORDER_COLUMNS)}")
+
+        where, args = self._where(filters, since, until)
+        columns = "*" if include_data else "id, " + ", ".join(GROUP_COLUMNS + ORDER_COLUMNS)
+        sql = (
+            f"SELECT {columns} FROM builds{where} "
+            f"ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'} LIMIT ?"
+        )
+        rows = []
+        for row in self.connect().execute(sql, [*args, limit]):
+            item = dict(row)
+            if include_data:
+                item["data"] = json.loads(item["data"])
+            rows.append(item)
+        return rows
+
+    def stats(
+        self,
+        group_by: List[str],
+        filters: Dict[str, Any],
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregate build counts, failure rates and durations per group.
+
+        Args:
+            group_by: Columns in GROUP_COLUMNS to group by
+            filters: Column name to value (or list of values) for columns in GROUP_COLUMNS
+            since: Optional ISO 8601 timestamp, only builds created at or after it
+            until: Optional ISO 8601 timestamp, only builds created before it
+
+        Returns:
+            One row per group with count, failed, failure_rate, avg/max duration and last build time
+        """
+        invalid = [column for column in group_by if column not in GROUP_COLUMNS]
+        if invalid:
+            raise ValueError(f"Cannot group by {', '.join(invalid)}; use {', '.join(GROUP_COLUMNS)}")
+
+        where, args = self._where(filters, since, until)
+        groups = ", ".join(group_by)
+        sql = (
+            f"SELECT {groups + ', ' if groups else ''}"
+            "COUNT(*) AS count, "
+            "SUM(status IN ('failed', 'timeout')) AS failed, "
+            "ROUND(1.0 * SUM(status IN ('failed', 'timeout')) / COUNT(*), 4) AS failure_rate, "
+            "ROUND(AVG(duration), 1) AS avg_duration, "
+            "MAX(duration) AS max_duration, "
+            "MAX(created_at) AS last_created_at "
+            f"FROM builds{where}"
+            f"{' GROUP BY ' + groups if groups else ''} ORDER BY count DESC"
+        )
+        return [dict(row) for row in self.connect().execute(sql, args)]
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], since: Optional[str], until: Optional[str]):
+        clauses = []
+        args: List[Any] = []
+        for column, value in filters.items():
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot filter by {column}")
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"{column} IN ({','.join('?' * len(value))})")
+                args.extend(value)
+            else:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        for bound, op in ((since, ">="), (until, "<")):
+            if bound:
+                normalized = _iso(bound)
+                if normalized is None:
+                    raise ValueError(f"Invalid ISO 8601 timestamp: {bound}")
+                clauses.append(f"created_at {op} ?")
+                args.append(normalized)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+_indexes: Dict[str, BuildIndex] = {}
+
+
+def get_build_index() -> BuildIndex:
+    """
+    Get the build index of the current tenant.
+
+    The CODEMAGIC_API_KEY tenant uses INDEX_PATH; every other tenant gets its
+    own database next to it, e.g. builds-acme.sqlite3.
+    """
+    tenant = current_tenant()
+    if tenant not in _indexes:
+        root, ext = os.path.splitext(INDEX_PATH)
+        _indexes[tenant] = BuildIndex(INDEX_PATH if tenant == ENV_TENANT else f"{root}-{tenant}{ext}")
+    return _indexes[tenant]
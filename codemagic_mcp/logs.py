@@ -0,0 +1,321 @@
+"""
+Log streaming tools for Codemagic MCP server.
+
+Build and step logs are streamed line by line and filtered as they arrive,
+so only the lines asked for are kept in memory and returned to the client.
+The log endpoints serve JSON, so the log text is pulled out of the response
+by an incremental scanner instead of parsing the whole document.
+"""
+import codecs
+import re
+import string
+from collections import deque
+from contextlib import aclosing
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
+from .base import stream_request
+
+
+# Severity levels from least to most severe, with the pattern recognizing each
+SEVERITY_PATTERNS = {
+    "warning": re.compile(r"\bwarn(ing)?\b", re.IGNORECASE),
+    "error": re.compile(r"\b(error|fatal|failed|failure|exception)\b|\*\* BUILD FAILED \*\*", re.IGNORECASE),
+}
+SEVERITY_LEVELS = ("info", "warning", "error")
+
+# Longest line returned to the client, longer lines are cut
+MAX_LINE_LENGTH = 1000
+
+# Default number of lines returned per read
+DEFAULT_MAX_LINES = 200
+
+# Keys of the JSON log responses whose string values are log text
+LOG_TEXT_KEYS = {"logs", "log", "content", "output"}
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def classify_severity(line: str) -> str:
+    """
+    Get the severity of a log line.
+
+    Args:
+        line: Log line
+
+    Returns:
+        'error', 'warning' or 'info'
+    """
+    for level in reversed(SEVERITY_LEVELS[1:]):
+        if SEVERITY_PATTERNS[level].search(line):
+            return level
+    return "info"
+
+
+def log_endpoint(build_id: str, step_id: Optional[str] = None) -> str:
+    """Get the API endpoint of a build log, or of one step's log."""
+    if step_id:
+        return f"/builds/{build_id}/steps/{step_id}/logs"
+    return f"/builds/{build_id}/logs"
+
+
+class LogTextScanner:
+    """
+    Incremental scanner pulling the log text out of a JSON log response as it streams.
+
+    The log endpoints answer with JSON, e.g. {"steps": [{"name": ..., "logs": "..."}]}
+    for a build and {"content": "..."} for a step. Only the string values under
+    LOG_TEXT_KEYS are passed on, unescaped and chunk by chunk, so no string is
+    ever held whole; everything else in the response is skipped.
+    """
+
+    def __init__(self):
+        # Open containers, each with the key the strings in it belong to
+        self._stack: List[List[Any]] = []
+        self._expect_key = False
+        self._in_string: Optional[str] = None  # 'key', 'log' or 'skip'
+        self._key_parts: List[str] = []
+        self._escape = ""
+        self._high_surrogate: Optional[str] = None
+        self._at_line_start = True
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Scan the next part of the response.
+
+        Args:
+            text: Decoded response text, continuing where the previous part ended
+
+        Returns:
+            Fragments of log text; separate log strings are separated by a line break
+        """
+        out: List[str] = []
+        position = 0
+        while position < len(text):
+            if self._in_string is not None:
+                position = self._scan_string(text, position, out)
+                continue
+            char = text[position]
+            position += 1
+            top = self._stack[-1] if self._stack else None
+            if char == '"':
+                if top is not None and top[0] == "{" and self._expect_key:
+                    self._in_string = "key"
+                    self._key_parts = []
+                elif top is None or top[1] in LOG_TEXT_KEYS:
+                    self._in_string = "log"
+                    if not self._at_line_start:
+                        self._emit("\n", out)
+                else:
+                    self._in_string = "skip"
+            elif char == "{":
+                self._stack.append(["{", top[1] if top is not None and top[0] == "[" else self._key(top)])
+                self._expect_key = True
+            elif char == "[":
+                self._stack.append(["[", self._key(top)])
+                self._expect_key = False
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = top is not None and top[0] == "{"
+            elif char == ":":
+                self._expect_key = False
+        return out
+
+    @staticmethod
+    def _key(top: Optional[List[Any]]) -> Optional[str]:
+        return top[1] if top is not None else None
+
+    def _emit(self, fragment: str, out: List[str]) -> None:
+        if self._in_string == "key":
+            self._key_parts.append(fragment)
+        elif self._in_string == "log":
+            out.append(fragment)
+            self._at_line_start = fragment.endswith("\n")
+
+    def _scan_string(self, text: str, position: int, out: List[str]) -> int:
+        if self._escape:
+            return self._scan_escape(text, position, out)
+        match = _STRING_SPECIAL.search(text, position)
+        end = match.start() if match else len(text)
+        if end > position and self._in_string != "skip":
+            self._emit(text[position:end], out)
+        if match is None:
+            return end
+        if text[end] == "\\":
+            self._escape = "\\"
+            return end + 1
+        # Closing quote
+        if self._in_string == "key" and self._stack:
+            self._stack[-1][1] = "".join(self._key_parts)
+        self._in_string = None
+        return end + 1
+
+    def _scan_escape(self, text: str, position: int, out: List[str]) -> int:
+        while position < len(text) and (len(self._escape) < 2 or (self._escape[1] == "u" and len(self._escape) < 6)):
+            self._escape += text[position]
+            position += 1
+        if len(self._escape) < 2 or (self._escape[1] == "u" and len(self._escape) < 6):
+            return position
+        escape, self._escape = self._escape, ""
+        if escape[1] != "u":
+            char = _ESCAPES.get(escape[1], escape[1])
+        else:
+            char = chr(int(escape[2:], 16)) if all(c in string.hexdigits for c in escape[2:]) else "\ufffd"
+            if "\ud800" <= char <= "\udbff":
+                self._high_surrogate = char
+                return position
+            if self._high_surrogate is not None and "\udc00" <= char <= "\udfff":
+                char = (self._high_surrogate + char).encode("utf-16", "surrogatepass").decode("utf-16")
+        self._high_surrogate = None
+        if self._in_string != "skip":
+            self._emit(char, out)
+        return position
+
+
+async def iter_log_text(endpoint: str) -> AsyncIterator[str]:
+    """
+    Stream the text of a build or step log in fragments, as the JSON response arrives.
+
+    Args:
+        endpoint: Log endpoint, see log_endpoint
+
+    Yields:
+        Fragments of log text
+    """
+    scanner = LogTextScanner()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async with stream_request("GET", endpoint, headers={"Accept": "application/json"}) as response:
+        async for chunk in response.aiter_bytes():
+            for fragment in scanner.feed(decoder.decode(chunk)):
+                yield fragment
+        for fragment in scanner.feed(decoder.decode(b"", final=True)):
+            yield fragment
+
+
+async def iter_log_lines(endpoint: str, byte_offset: int = 0) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Stream a log line by line.
+
+    The log is extracted from the JSON response while it downloads, see
+    LogTextScanner. Offsets count UTF-8 bytes of the log text, not of the
+    response, so lines before byte_offset are read but not yielded.
+
+    Args:
+        endpoint: Log endpoint, see log_endpoint
+        byte_offset: Byte position in the log text to start at, normally the end of a previously read line
+
+    Yields:
+        Tuples of (byte offset just past the line, line text without the line break)
+    """
+    position = 0
+    parts: List[str] = []
+    async with aclosing(iter_log_text(endpoint)) as fragments:
+        async for fragment in fragments:
+            start = 0
+            while True:
+                end = fragment.find("\n", start)
+                if end < 0:
+                    break
+                parts.append(fragment[start:end])
+                line = "".join(parts)
+                parts = []
+                position += len(line.encode("utf-8")) + 1
+                if position > byte_offset:
+                    yield position, line.rstrip("\r")
+                start = end + 1
+            if start < len(fragment):
+                parts.append(fragment[start:])
+    if parts:
+        line = "".join(parts)
+        position += len(line.encode("utf-8"))
+        if position > byte_offset:
+            yield position, line.rstrip("\r")
+
+
+def register_logs_tools(mcp: FastMCP) -> None:
+    """Register all log streaming tools with the MCP server."""
+
+    @mcp.tool()
+    async def read_build_log(
+        build_id: str,
+        step_id: Optional[str] = None,
+        tail: Optional[int] = None,
+        byte_offset: int = 0,
+        line_offset: int = 0,
+        max_lines: int = DEFAULT_MAX_LINES,
+        pattern: Optional[str] = None,
+        severity: Optional[str] = None,
+        ignore_case: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Read a build or step log incrementally, with tailing and filtering applied while streaming.
+
+        Use the returned next_byte_offset and next_line as byte_offset and line_offset to continue reading
+        where the previous call stopped, e.g. to follow a running build's log.
+
+        Args:
+            build_id: The build identifier
+            step_id: Optional step identifier to read only that step's log
+            tail: Optional number of last (matching) lines to return instead of the first ones
+            byte_offset: Byte position in the log text to start reading at (default: 0)
+            line_offset: With byte_offset, the number of lines before that position (next_line of the
+                         previous read); without it, the number of lines to skip
+            max_lines: Maximum number of lines to return when not tailing (default: 200)
+            pattern: Optional regular expression lines must match
+            severity: Optional minimum severity lines must have: 'warning' or 'error'
+            ignore_case: Match pattern case-insensitively (default: True)
+
+        Returns:
+            Dictionary with the lines (number and text), whether the end of the log was reached,
+            and next_byte_offset/next_line to continue from
+        """
+        if severity is not None and severity not in SEVERITY_LEVELS[1:]:
+            raise ValueError("severity must be either 'warning' or 'error'")
+        if tail is not None and tail < 1:
+            raise ValueError("tail must be at least 1")
+        if max_lines < 1:
+            raise ValueError("max_lines must be at least 1")
+
+        regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0) if pattern else None
+        min_level = SEVERITY_LEVELS.index(severity) if severity else 0
+
+        def matches(text: str) -> bool:
+            if regex is not None and not regex.search(text):
+                return False
+            return not min_level or SEVERITY_LEVELS.index(classify_severity(text)) >= min_level
+
+        line_number = line_offset if byte_offset else 0
+        skip_lines = 0 if byte_offset else line_offset
+        next_byte_offset = byte_offset
+        lines = deque(maxlen=tail)
+        scanned = 0
+        eof = True
+
+        # Closed explicitly so that stopping early also stops the download
+        async with aclosing(iter_log_lines(log_endpoint(build_id, step_id), byte_offset)) as log_lines:
+            async for end, text in log_lines:
+                line_number += 1
+                if line_number <= skip_lines:
+                    next_byte_offset = end
+                    continue
+                scanned += 1
+                if matches(text):
+                    if tail is None and len(lines) >= max_lines:
+                        # Leave this line for the next read
+                        line_number -= 1
+                        eof = False
+                        break
+                    lines.append({"line": line_number, "text": text[:MAX_LINE_LENGTH]})
+                next_byte_offset = end
+
+        return {
+            "lines": list(lines),
+            "returned": len(lines),
+            "scanned": scanned,
+            "eof": eof,
+            "next_byte_offset": next_byte_offset,
+            "next_line": line_number,
+        }
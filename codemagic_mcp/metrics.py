@@ -0,0 +1,345 @@
+"""
+Instrumentation for Codemagic MCP server.
+
+Records latency histograms, status codes, payload sizes, retries, errors
+and cache outcomes for every API request and tool call. The data is
+exposed by the get_metrics tool as JSON or Prometheus text, and spans can
+optionally be exported as OpenTelemetry-style JSON lines to a local file.
+"""
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+# File spans are appended to as JSON lines, tracing is off when unset
+TRACE_FILE = os.environ.get("CODEMAGIC_TRACE_FILE")
+
+# Path segments that are identifiers, replaced so that metrics are grouped per endpoint
+_ENDPOINT_PATTERNS = [
+    (re.compile(r"^/artifacts/.+?(/public-url)?$"), lambda m: "/artifacts/{secure_filename}" + (m.group(1) or "")),
+    (re.compile(r"/(apps|builds|steps|caches|workflows|team|collaborator)/[^/]+"), lambda m: f"/{m.group(1)}/{{id}}"),
+]
+
+
+def endpoint_template(endpoint: str) -> str:
+    """
+    Replace identifiers in an API endpoint with placeholders.
+
+    Args:
+        endpoint: API endpoint, e.g. "/builds/5f1a.../steps/abc/logs"
+
+    Returns:
+        Endpoint template, e.g. "/builds/{id}/steps/{id}/logs"
+    """
+    path = "/" + endpoint.split("?", 1)[0].strip("/")
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+def escape_label_value(value: Any) -> str:
+    """Escape a Prometheus label value: backslashes, double quotes and line feeds."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else self.buckets[-2]
+        return self.buckets[-2]
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean and estimated p50/p95/p99 in seconds."""
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """In-process registry of request, tool and cache metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all recorded metrics."""
+        with self._lock:
+            self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+            self.request_latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+            self.bytes_in: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.bytes_out: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.retries: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.coalesced: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.errors: Dict[Tuple[str, str, str], int] = defaultdict(int)
+            self.cache: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.tool_calls: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.tool_latency: Dict[str, Histogram] = defaultdict(Histogram)
+            self.started_at = time.time()
+
+    def record_request(
+        self,
+        method: str,
+        endpoint: str,
+        status: Optional[int],
+        latency: float,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+        retries: int = 0,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """
+        Record one API request, including all of its retries.
+
+        Args:
+            method: HTTP method
+            endpoint: API endpoint, identifiers are replaced by endpoint_template
+            status: Final HTTP status code, None if no response was received
+            latency: Seconds from the first attempt to the final response or error
+            bytes_in: Response body size
+            bytes_out: Request body size
+            retries: Number of retries before the final attempt
+            error: Exception raised by the request, if any
+        """
+        key = (method.upper(), endpoint_template(endpoint))
+        with self._lock:
+            self.requests[(*key, str(status) if status is not None else "none")] += 1
+            self.request_latency[key].observe(latency)
+            self.bytes_in[key] += bytes_in
+            self.bytes_out[key] += bytes_out
+            self.retries[key] += retries
+            if error is not None:
+                self.errors[(*key, type(error).__name__)] += 1
+
+    def record_coalesced(self, method: str, endpoint: str) -> None:
+        """Record a request that shared an identical request already in flight instead of being sent."""
+        with self._lock:
+            self.coalesced[(method.upper(), endpoint_template(endpoint))] += 1
+
+    def record_cache(self, endpoint: str, outcome: str) -> None:
+        """Record a response cache outcome: 'hit', 'disk_hit', 'miss' or 'revalidated'."""
+        with self._lock:
+            self.cache[(endpoint_template(endpoint), outcome)] += 1
+
+    def record_tool(self, tool: str, latency: float, error: Optional[BaseException] = None) -> None:
+        """Record one tool call."""
+        with self._lock:
+            self.tool_calls[(tool, "error" if error is not None else "ok")] += 1
+            self.tool_latency[tool].observe(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            endpoints: Dict[str, Dict[str, Any]] = {}
+            for (method, endpoint), histogram in self.request_latency.items():
+                key = (method, endpoint)
+                endpoints[f"{method} {endpoint}"] = {
+                    "latency": histogram.summary(),
+                    "status": {
+                        status: count for (m, e, status), count in self.requests.items() if (m, e) == key
+                    },
+                    "bytes_in": self.bytes_in[key],
+                    "bytes_out": self.bytes_out[key],
+                    "retries": self.retries[key],
+                    "coalesced": self.coalesced.get(key, 0),
+                    "errors": {
+                        error: count for (m, e, error), count in self.errors.items() if (m, e) == key
+                    },
+                }
+
+            cache: Dict[str, Dict[str, Any]] = defaultdict(dict)
+            for (endpoint, outcome), count in self.cache.items():
+                cache[endpoint][outcome] = count
+            for counts in cache.values():
+                hits = counts.get("hit", 0) + counts.get("disk_hit", 0)
+                lookups = hits + counts.get("miss", 0) + counts.get("revalidated", 0)
+                counts["hit_rate"] = round(hits / lookups, 4) if lookups else None
+
+            tools = {
+                tool: {
+                    "latency": histogram.summary(),
+                    "ok": self.tool_calls[(tool, "ok")],
+                    "error": self.tool_calls[(tool, "error")],
+                }
+                for tool, histogram in self.tool_latency.items()
+            }
+
+            return {
+                "uptime": round(time.time() - self.started_at, 1),
+                "endpoints": endpoints,
+                "cache": dict(cache),
+                "tools": tools,
+            }
+
+    def prometheus(self) -> str:
+        """Get all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def labels(**values: str) -> str:
+            return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in values.items()) + "}"
+
+        def histogram(name: str, histograms: Dict[Any, Histogram], label_names: Tuple[str, ...]) -> None:
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in histograms.items():
+                values = dict(zip(label_names, key if isinstance(key, tuple) else (key,)))
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{labels(**values, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{labels(**values)} {hist.sum}")
+                lines.append(f"{name}_count{labels(**values)} {hist.count}")
+
+        def counter(name: str, counters: Dict[Any, int], label_names: Tuple[str, ...]) -> None:
+            lines.append(f"# TYPE {name} counter")
+            for key, value in counters.items():
+                values = dict(zip(label_names, key if isinstance(key, tuple) else (key,)))
+                lines.append(f"{name}{labels(**values)} {value}")
+
+        with self._lock:
+            counter("codemagic_api_requests_total", self.requests, ("method", "endpoint", "status"))
+            histogram("codemagic_api_request_duration_seconds", self.request_latency, ("method", "endpoint"))
+            counter("codemagic_api_response_bytes_total", self.bytes_in, ("method", "endpoint"))
+            counter("codemagic_api_request_bytes_total", self.bytes_out, ("method", "endpoint"))
+            counter("codemagic_api_retries_total", self.retries, ("method", "endpoint"))
+            counter("codemagic_api_coalesced_total", self.coalesced, ("method", "endpoint"))
+            counter("codemagic_api_errors_total", self.errors, ("method", "endpoint", "error"))
+            counter("codemagic_cache_lookups_total", self.cache, ("endpoint", "outcome"))
+            counter("codemagic_tool_calls_total", self.tool_calls, ("tool", "outcome"))
+            histogram("codemagic_tool_duration_seconds", self.tool_latency, ("tool",))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class SpanExporter:
+    """Appends finished spans as OpenTelemetry-style JSON lines to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Dict[str, Any]) -> None:
+        """Write one finished span."""
+        line = json.dumps(span, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+_exporter = SpanExporter(TRACE_FILE) if TRACE_FILE else None
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "codemagic_current_span", default=None
+)
+
+
+@contextmanager
+def span(name: str, kind: str = "INTERNAL", **attributes: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Trace a block of code as a span, nested under the current span if any.
+
+    Does nothing unless CODEMAGIC_TRACE_FILE is set. Attributes can be
+    added to the yielded span while the block runs.
+
+    Args:
+        name: Span name
+        kind: OpenTelemetry span kind, e.g. 'SERVER' or 'CLIENT'
+        **attributes: Initial span attributes
+
+    Yields:
+        The span dictionary, or None when tracing is off
+    """
+    if _exporter is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = {
+        "traceId": parent["traceId"] if parent else secrets.token_hex(16),
+        "spanId": secrets.token_hex(8),
+        "parentSpanId": parent["spanId"] if parent else None,
+        "name": name,
+        "kind": f"SPAN_KIND_{kind}",
+        "startTimeUnixNano": time.time_ns(),
+        "attributes": dict(attributes),
+        "status": {"code": "STATUS_CODE_OK"},
+    }
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current["status"] = {"code": "STATUS_CODE_ERROR", "message": f"{type(e).__name__}: {e}"}
+        raise
+    finally:
+        _current_span.reset(token)
+        current["endTimeUnixNano"] = time.time_ns()
+        _exporter.export(current)
+
+
+def register_metrics_tools(mcp: FastMCP) -> None:
+    """Register all metrics tools with the MCP server."""
+
+    @mcp.tool()
+    async def get_metrics(format: str = "json", reset: bool = False) -> Dict[str, Any]:
+        """
+        Get the server's API request, tool call and cache metrics.
+
+        Args:
+            format: 'json' for a summary with p50/p95/p99 latencies, 'prometheus' for Prometheus text (default: 'json')
+            reset: Reset all metrics after reading them (default: False)
+
+        Returns:
+            Dictionary with the metrics, or with the Prometheus text under 'prometheus'
+        """
+        if format not in ("json", "prometheus"):
+            raise ValueError("format must be either 'json' or 'prometheus'")
+
+        result = metrics.snapshot() if format == "json" else {"prometheus": metrics.prometheus()}
+        if reset:
+            metrics.reset()
+        return result
@@ -0,0 +1,205 @@
+"""
+Response projection and compaction for Codemagic MCP server.
+
+Tools parse an API response once and trim it here before it is serialized
+into the client's context: either to an explicit selection of fields, or
+to a compact form without nulls, empty values, default values, bulky blobs
+and long text.
+"""
+import re
+from typing import Any, Dict, List, Optional, Union
+
+
+# Keys dropped by compaction per resource type, at any depth
+COMPACT_DROP_KEYS = {
+    "build": {"config", "workflows", "branches"},
+    "builds": {"config", "workflows", "branches", "environment"},
+    "summary": {"config", "workflows", "branches"},
+    "applications": {"workflows", "branches", "config"},
+}
+
+# Values the API reports for unset fields, dropped by compaction like nulls;
+# a missing flag reads as false
+COMPACT_DEFAULT_VALUES = (False,)
+
+# Strings longer than this are cut by compaction
+COMPACT_MAX_STRING_LENGTH = 300
+
+_TOKEN = re.compile(r"([^.\[\]]+)|\[(\*|\d*)\]")
+
+Trie = Dict[Union[str, int], Optional["Trie"]]
+
+
+def parse_field_path(path: str) -> List[Union[str, int]]:
+    """
+    Split a field path into keys, list indexes and wildcards.
+
+    Paths use dots between keys and brackets for lists, e.g.
+    "builds[*].status", "builds[0]._id" or "build.commit.authorName".
+    "[]" and "*" are both wildcards over all list items or dict values.
+
+    Args:
+        path: Field path
+
+    Returns:
+        List of tokens: strings for keys and "*", ints for list indexes
+    """
+    tokens: List[Union[str, int]] = []
+    position = 0
+    for match in _TOKEN.finditer(path):
+        if path[position:match.start()].strip("."):
+            raise ValueError(f"Invalid field path: {path}")
+        key, index = match.groups()
+        if key is not None:
+            tokens.append(key)
+        elif index in ("", "*"):
+            tokens.append("*")
+        else:
+            tokens.append(int(index))
+        position = match.end()
+    if not tokens or path[position:].strip("."):
+        raise ValueError(f"Invalid field path: {path}")
+    return tokens
+
+
+def _build_trie(fields: List[str]) -> Trie:
+    trie: Trie = {}
+    for field in fields:
+        node = trie
+        tokens = parse_field_path(field)
+        for token in tokens[:-1]:
+            child = node.get(token, {})
+            # An ancestor that is already selected whole stays whole
+            if child is None:
+                break
+            node = node.setdefault(token, child)
+        else:
+            node[tokens[-1]] = None
+    return trie
+
+
+_MISSING = object()
+
+
+def _or_empty(value: Any) -> Any:
+    return {} if value is _MISSING else value
+
+
+def _project(value: Any, trie: Optional[Trie]) -> Any:
+    if trie is None:
+        return value
+
+    if isinstance(value, list):
+        # Items without any selected field stay in place as empty dicts, so positions are kept
+        if "*" in trie:
+            return [_or_empty(_project(item, trie["*"])) for item in value]
+        indexes = [token for token in trie if isinstance(token, int)]
+        if indexes:
+            return [
+                _or_empty(_project(value[index], trie[index]))
+                for index in indexes if -len(value) <= index < len(value)
+            ]
+        # Keys applied to a list select them from every item
+        return [_or_empty(_project(item, trie)) for item in value]
+
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if "*" in trie:
+                projected = _project(item, trie["*"])
+            elif key in trie:
+                projected = _project(item, trie[key])
+            else:
+                continue
+            if projected is not _MISSING:
+                result[key] = projected
+        return result if result else _MISSING
+
+    return _MISSING
+
+
+def select_fields(data: Any, fields: List[str]) -> Any:
+    """
+    Keep only the selected fields of a parsed response, preserving its structure.
+
+    Args:
+        data: Parsed JSON response
+        fields: Field paths to keep, see parse_field_path
+
+    Returns:
+        The response reduced to the selected fields
+    """
+    projected = _project(data, _build_trie(fields))
+    if projected is _MISSING:
+        return {} if isinstance(data, dict) else []
+    return projected
+
+
+def _is_default(value: Any) -> bool:
+    # bool is checked by type, so that 0 is not taken for False
+    return any(type(value) is type(default) and value == default for default in COMPACT_DEFAULT_VALUES)
+
+
+def compact(data: Any, resource: Optional[str] = None, drop_defaults: bool = True) -> Any:
+    """
+    Drop nulls, empty values, default values and bulky keys, and cut long strings.
+
+    Args:
+        data: Parsed JSON response
+        resource: Resource type selecting the keys to drop, see COMPACT_DROP_KEYS
+        drop_defaults: Also drop values in COMPACT_DEFAULT_VALUES
+
+    Returns:
+        Compacted copy of the response
+    """
+    drop_keys = COMPACT_DROP_KEYS.get(resource or "", set())
+
+    def walk(value: Any) -> Any:
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key in drop_keys:
+                    continue
+                item = walk(item)
+                if item is None or item == {} or item == [] or item == "":
+                    continue
+                if drop_defaults and _is_default(item):
+                    continue
+                result[key] = item
+            return result
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        if isinstance(value, str) and len(value) > COMPACT_MAX_STRING_LENGTH:
+            return f"{value[:COMPACT_MAX_STRING_LENGTH]}... [{len(value) - COMPACT_MAX_STRING_LENGTH} more characters]"
+        return value
+
+    return walk(data)
+
+
+def shape_response(
+    data: Any,
+    fields: Optional[List[str]] = None,
+    compact_response: bool = False,
+    resource: Optional[str] = None
+) -> Any:
+    """
+    Apply a tool's fields and compact parameters to a parsed response.
+
+    With fields, only those fields are kept and compaction does not drop
+    any of them by key or default value, it only removes empty values and
+    cuts long strings.
+
+    Args:
+        data: Parsed JSON response
+        fields: Optional field paths to keep
+        compact_response: Compact the response
+        resource: Resource type for compaction, see COMPACT_DROP_KEYS
+
+    Returns:
+        The shaped response
+    """
+    if fields:
+        data = select_fields(data, fields)
+    if compact_response:
+        data = compact(data, None if fields else resource, drop_defaults=not fields)
+    return data
@@ -0,0 +1,253 @@
+"""
+Request scheduling for Codemagic MCP server: rate limiting, retries and circuit breaking.
+"""
+import asyncio
+import os
+import random
+import time
+import httpx
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+
+# Sustained requests per second and burst size allowed towards the API
+RATE_LIMIT = float(os.environ.get("CODEMAGIC_RATE_LIMIT", "10"))
+RATE_BURST = int(os.environ.get("CODEMAGIC_RATE_BURST", "20"))
+
+# Retries for failed requests, with jittered exponential backoff between them
+MAX_RETRIES = int(os.environ.get("CODEMAGIC_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Longest Retry-After honoured, in seconds; longer ones are cut so one response cannot stall all requests
+MAX_RETRY_AFTER = float(os.environ.get("CODEMAGIC_MAX_RETRY_AFTER", "60"))
+
+# Consecutive failures that open the circuit, and seconds before it is tried again
+CIRCUIT_THRESHOLD = int(os.environ.get("CODEMAGIC_CIRCUIT_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CODEMAGIC_CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Methods that can be repeated without changing the result
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Status codes worth retrying; 429 is the only one a non-idempotent request is retried on,
+# since the API rejected it without processing it
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Transport errors raised before the request reached the API, safe to retry for any method
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request while the API is considered down."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header into a number of seconds.
+
+    Args:
+        value: Header value, either delay seconds or an HTTP date
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Get a full-jitter exponential backoff delay for a retry attempt (starting at 0)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class TokenBucket:
+    """Token bucket limiting the rate of outgoing requests."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests for a while, e.g. after a 429 with Retry-After."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Fails requests fast after repeated server or network failures.
+
+    After threshold consecutive failures the circuit opens and requests are
+    rejected for reset_timeout seconds. Then a single trial request is let
+    through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state: 'closed', 'open' or 'half-open'."""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_request(self) -> bool:
+        """
+        Raise CircuitOpenError if requests are currently not allowed.
+
+        Returns:
+            Whether the request is the trial of a half-open circuit, which must be
+            released with release_trial once it is done, however it ended
+        """
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            retry_in = self.reset_timeout - (time.monotonic() - self._opened_at)
+            raise CircuitOpenError(
+                f"Codemagic API is unavailable after {self._failures} consecutive failures, "
+                f"retry in {max(0.0, retry_in):.0f} seconds"
+            )
+        if state == "half-open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        """Let another trial request through if the last one ended without an outcome, e.g. was cancelled."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit once the threshold is reached."""
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.threshold > 0 and (self._failures >= self.threshold or self._opened_at is not None):
+            self._opened_at = time.monotonic()
+
+
+class RequestScheduler:
+    """Sends requests through the rate limiter, circuit breaker and retry policy."""
+
+    def __init__(self, bucket: TokenBucket, breaker: CircuitBreaker, max_retries: int):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_retries = max_retries
+
+    async def send(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        idempotent: bool
+    ) -> httpx.Response:
+        """
+        Send a request, retrying it when that is safe.
+
+        Idempotent requests are retried on transport errors and on 429 and
+        5xx responses. Other requests are only retried when they never reached
+        the API: connection failures and 429 responses.
+
+        Args:
+            send: Coroutine function performing the request once
+            idempotent: Whether the request can safely be repeated
+
+        Returns:
+            The last response, which may still be an error response
+        """
+        attempt = 0
+        while True:
+            trial = self.breaker.before_request()
+            try:
+                await self.bucket.acquire()
+                response = await send()
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                retryable = idempotent or isinstance(e, UNSENT_ERRORS)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            finally:
+                # A cancelled trial must not keep the circuit half-open with nothing let through
+                if trial:
+                    self.breaker.release_trial()
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            retryable = response.status_code in RETRYABLE_STATUS_CODES and (
+                idempotent or response.status_code == 429
+            )
+            if not retryable or attempt >= self.max_retries:
+                response.extensions["retries"] = attempt
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            if retry_after is not None:
+                retry_after = min(retry_after, MAX_RETRY_AFTER)
+            if response.status_code == 429 and retry_after is not None:
+                self.bucket.pause(retry_after)
+            await response.aclose()
+            await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+            attempt += 1
+
+
+def create_scheduler(rate_limit: Optional[float] = None, rate_burst: Optional[int] = None) -> RequestScheduler:
+    """
+    Create a request scheduler configured from the environment.
+
+    Args:
+        rate_limit: Optional sustained requests per second, overriding CODEMAGIC_RATE_LIMIT
+        rate_burst: Optional burst size, overriding CODEMAGIC_RATE_BURST
+    """
+    return RequestScheduler(
+        TokenBucket(
+            RATE_LIMIT if rate_limit is None else rate_limit,
+            RATE_BURST if rate_burst is None else rate_burst
+        ),
+        CircuitBreaker(CIRCUIT_THRESHOLD, CIRCUIT_RESET_TIMEOUT),
+        MAX_RETRIES
+    )
@@ -1,27 +1,420 @@
 """
 Main Codemagic MCP server module.
+
+Tool modules are registered lazily: list_tools is answered from a cached
+manifest of the tool schemas, and a tool module is only imported the first
+time one of its tools is called. The manifest is rebuilt whenever a source
+file of this package or the installed FastMCP changes.
+
+In multi-tenant mode (see tenants.py) every tool gets a tenant argument,
+which is taken out of the arguments before the call and selects the
+credentials the tool runs with.
+
+Besides stdio, the server can run as one long-lived process serving many
+MCP clients over streamable HTTP or SSE, sharing its response caches and
+connection pools between them. Tool calls are bounded by a concurrency
+limit with a bounded wait queue, and on shutdown the server stops taking
+new calls and lets the running ones finish before it exits.
+
+With CODEMAGIC_WEBHOOK_PORT set, the server also receives build webhooks
+(see webhooks.py) for as long as it runs.
 """
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import server as fastmcp_server
+from mcp.types import Tool as MCPTool
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from .metrics import metrics, span
+from .tenants import is_multi_tenant, load_tenants, use_tenant, DEFAULT_TENANT
+
+
+# Tool modules of this package and the function registering their tools, in listing order
+TOOL_MODULES = {
+    "applications": "register_applications_tools",
+    "artifacts": "register_artifacts_tools",
+    "builds": "register_builds_tools",
+    "workflows": "register_workflows_tools",
+    "caches": "register_caches_tools",
+    "teams": "register_teams_tools",
+    "history": "register_history_tools",
+    "analytics": "register_analytics_tools",
+    "comparison": "register_comparison_tools",
+    "watch": "register_watch_tools",
+    "webhooks": "register_webhooks_tools",
+    "logs": "register_logs_tools",
+    "diagnosis": "register_diagnosis_tools",
+    "bulk": "register_bulk_tools",
+    "export": "register_export_tools",
+    "metrics": "register_metrics_tools",
+}
+
+# Cached tool schemas, so that listing tools does not need to import and register every module
+MANIFEST_PATH = os.path.expanduser(
+    os.environ.get("CODEMAGIC_TOOL_MANIFEST", "~/.cache/codemagic-mcp/tools.json")
+)
+
+# Transport used when the server is started directly: 'stdio', 'sse' or 'streamable-http'
+TRANSPORT = os.environ.get("CODEMAGIC_TRANSPORT", "stdio")
+
+# Address the HTTP and SSE transports listen on
+HTTP_HOST = os.environ.get("CODEMAGIC_HOST", "127.0.0.1")
+HTTP_PORT = int(os.environ.get("CODEMAGIC_PORT", "8000"))
+
+# Maximum number of tool calls running at once (0 for no limit)
+MAX_CONCURRENT_CALLS = int(os.environ.get("CODEMAGIC_MAX_CONCURRENT_CALLS", "64"))
+
+# Maximum number of tool calls waiting for a free slot; calls beyond it are rejected right away
+MAX_QUEUED_CALLS = int(os.environ.get("CODEMAGIC_MAX_QUEUED_CALLS", "256"))
+
+# Seconds a shutdown waits for running tool calls to finish
+SHUTDOWN_TIMEOUT = float(os.environ.get("CODEMAGIC_SHUTDOWN_TIMEOUT", "30"))
+
+# Seconds the server keeps serving after the last tool call finished, to deliver its result
+RESPONSE_FLUSH_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def manifest_key() -> str:
+    """
+    Get a key identifying the current tool definitions.
+
+    Derived from the size and modification time of every source file of
+    this package and of FastMCP, which generates the schemas.
+    """
+    digest = hashlib.sha1(sys.version.encode())
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = sorted(entry.path for entry in os.scandir(package_dir) if entry.name.endswith(".py"))
+    for path in [*paths, fastmcp_server.__file__]:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def load_manifest(key: str) -> Optional[List[Dict[str, Any]]]:
+    """Load the cached tool manifest, or None if it is missing, unreadable or stale."""
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("key") != key:
+        return None
+    return manifest.get("tools")
+
+
+def save_manifest(key: str, tools: List[Dict[str, Any]]) -> None:
+    """Write the tool manifest atomically; failing to do so only costs startup time."""
+    try:
+        os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+        temp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"key": key, "tools": tools}, file)
+        os.replace(temp_path, MANIFEST_PATH)
+    except OSError:
+        pass
+
+
+def add_tenant_argument(tool: MCPTool) -> MCPTool:
+    """Add the tenant argument to the input schema of a tool."""
+    schema = dict(tool.inputSchema)
+    schema["properties"] = {
+        **schema.get("properties", {}),
+        "tenant": {
+            "title": "Tenant",
+            "type": "string",
+            "enum": list(load_tenants()),
+            "default": DEFAULT_TENANT,
+            "description": "Named credentials to run the tool with",
+        },
+    }
+    return tool.model_copy(update={"inputSchema": schema})
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when a tool call is rejected because the server is at capacity or shutting down."""
+
+
+class CallLimiter:
+    """
+    Admission control for tool calls.
+
+    At most max_concurrent calls run at once and at most max_queued more
+    wait for a slot; further calls fail immediately, so that clients back
+    off instead of piling up behind a slow API.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.active = 0
+        self.queued = 0
+        self.closed = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind(self) -> None:
+        # Semaphores and events belong to one event loop; rebind when idle on a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop and self.active == 0 and self.queued == 0:
+            self._slots = asyncio.Semaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._loop = loop
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of a tool call, waiting for one if all are taken."""
+        if self.closed:
+            raise ServerBusyError("Server is shutting down, retry on another instance or later")
+        self._bind()
+        if self._slots is not None and self._slots.locked() and self.queued >= self.max_queued:
+            raise ServerBusyError(
+                f"Server is busy ({self.active} calls running, {self.queued} waiting), retry later"
+            )
+
+        self.queued += 1
+        self._idle.clear()
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+        except BaseException:
+            self.queued -= 1
+            self._set_idle()
+            raise
+        self.queued -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if self._slots is not None:
+                self._slots.release()
+            self._set_idle()
+
+    def _set_idle(self) -> None:
+        if self.active == 0 and self.queued == 0:
+            self._idle.set()
+
+    def close(self) -> None:
+        """Reject all further calls."""
+        self.closed = True
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Wait for the running and queued calls to finish.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Whether all calls finished in time
+        """
+        if self._idle is None or self._idle.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of running and waiting calls and the limits."""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "closed": self.closed,
+        }
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Run the webhook receiver, if configured, from the first MCP session until the last one ends."""
+    # Only imported when enabled, to keep the tool modules it needs out of the startup path
+    if not os.environ.get("CODEMAGIC_WEBHOOK_PORT"):
+        yield
+        return
+
+    from .webhooks import start_webhook_receiver, stop_webhook_receiver
+    await start_webhook_receiver()
+    try:
+        yield
+    finally:
+        await stop_webhook_receiver()
+
+
+class CodemagicMCP(FastMCP):
+    """FastMCP server with lazily registered tool modules that records metrics of every tool call."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._registered_modules: Set[str] = set()
+        self._manifest: Optional[List[Dict[str, Any]]] = None
+        self._tool_modules: Dict[str, str] = {}
+        self.limiter = CallLimiter(MAX_CONCURRENT_CALLS, MAX_QUEUED_CALLS)
+
+    def register_module(self, module: str) -> None:
+        """Import a tool module and register its tools, once."""
+        if module in self._registered_modules:
+            return
+        register = getattr(importlib.import_module(f".{module}", __package__), TOOL_MODULES[module])
+        register(self)
+        self._registered_modules.add(module)
+
+    def register_all(self) -> None:
+        """Import and register every tool module."""
+        for module in TOOL_MODULES:
+            self.register_module(module)
+
+    def _load_manifest(self) -> Optional[List[Dict[str, Any]]]:
+        if self._manifest is None:
+            self._manifest = load_manifest(manifest_key())
+            if self._manifest is not None:
+                self._tool_modules = {entry["tool"]["name"]: entry["module"] for entry in self._manifest}
+        return self._manifest
+
+    async def list_tools(self) -> List[MCPTool]:
+        tools = await self._list_tools()
+        if is_multi_tenant():
+            return [add_tenant_argument(tool) for tool in tools]
+        return tools
+
+    async def _list_tools(self) -> List[MCPTool]:
+        manifest = self._load_manifest()
+        if manifest is not None:
+            return [MCPTool.model_validate(entry["tool"]) for entry in manifest]
+
+        self.register_all()
+        tools = await super().list_tools()
+        self._tool_modules = {
+            info.name: info.fn.__module__.rsplit(".", 1)[-1] for info in self._tool_manager.list_tools()
+        }
+        self._manifest = [
+            {"module": self._tool_modules[tool.name], "tool": tool.model_dump(mode="json", by_alias=True, exclude_none=True)}
+            for tool in tools
+        ]
+        save_manifest(manifest_key(), self._manifest)
+        return tools
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
+        self._load_manifest()
+        module = self._tool_modules.get(name)
+        if module in TOOL_MODULES:
+            self.register_module(module)
+        else:
+            self.register_all()
+
+        arguments = dict(arguments or {})
+        tenant = arguments.pop("tenant", None) if is_multi_tenant() else None
+        with use_tenant(tenant) as tenant:
+            with span(f"tool {name}", "SERVER", **{"mcp.tool": name, "codemagic.tenant": tenant}):
+                started = time.perf_counter()
+                try:
+                    async with self.limiter.slot():
+                        result = await super().call_tool(name, arguments)
+                except Exception as e:
+                    metrics.record_tool(name, time.perf_counter() - started, e)
+                    raise
+                metrics.record_tool(name, time.perf_counter() - started)
+                return result
+
+    async def run_sse_async(self, mount_path: Optional[str] = None) -> None:
+        await self.serve_http("sse", mount_path)
+
+    async def run_streamable_http_async(self) -> None:
+        await self.serve_http("streamable-http")
+
+    async def serve_http(self, transport: str, mount_path: Optional[str] = None) -> None:
+        """
+        Serve MCP clients over HTTP until interrupted, then shut down gracefully.
+
+        On SIGINT or SIGTERM the server rejects new tool calls, waits up to
+        SHUTDOWN_TIMEOUT seconds for the running ones, then closes client
+        connections and the pooled connections to the Codemagic API.
+        The webhook receiver, if configured, runs for as long as the server
+        rather than from the first client, so no event is missed before one
+        connects.
+
+        Args:
+            transport: 'streamable-http' or 'sse'
+            mount_path: Optional mount path of the SSE endpoints
+        """
+        import uvicorn
+        from .base import close_client
+
+        app = self.streamable_http_app() if transport == "streamable-http" else self.sse_app(mount_path)
+        limiter = self.limiter
+
+        class DrainingServer(uvicorn.Server):
+            # Uvicorn (and the SSE streams, which watch its exit flag) only learn
+            # about the signal once the running calls are done, so their responses
+            # still reach the clients
+            draining = False
+
+            async def serve(self, sockets: Optional[List[Any]] = None) -> None:
+                self.loop = asyncio.get_running_loop()
+                await super().serve(sockets)
+
+            def handle_exit(self, sig: int, frame: Any) -> None:
+                # A second signal skips the drain
+                if self.draining:
+                    return super().handle_exit(sig, frame)
+                self.draining = True
+                limiter.close()
+                self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self.drain(sig, frame)))
+
+            async def drain(self, sig: int, frame: Any) -> None:
+                logger.info("Waiting for %d running tool calls", limiter.active + limiter.queued)
+                if not await limiter.drain(SHUTDOWN_TIMEOUT):
+                    logger.warning("Tool calls still running after %.0f seconds, shutting down anyway", SHUTDOWN_TIMEOUT)
+                # The results of the last calls are still being streamed to their clients
+                await asyncio.sleep(RESPONSE_FLUSH_SECONDS)
+                uvicorn.Server.handle_exit(self, sig, frame)
+
+        config = uvicorn.Config(
+            app,
+            host=self.settings.host,
+            port=self.settings.port,
+            log_level=self.settings.log_level.lower(),
+            timeout_graceful_shutdown=SHUTDOWN_TIMEOUT,
+        )
+        try:
+            async with lifespan(self):
+                await DrainingServer(config).serve()
+        finally:
+            await close_client()
 
-# Import all module registration functions
-from .applications import register_applications_tools
-from .artifacts import register_artifacts_tools
-from .builds import register_builds_tools
-from .workflows import register_workflows_tools
-from .caches import register_caches_tools
-from .teams import register_teams_tools
 
 # Create the MCP server instance
-mcp = FastMCP("Codemagic MCP", dependencies=["requests"])
+mcp = CodemagicMCP("Codemagic MCP", dependencies=["httpx"], host=HTTP_HOST, port=HTTP_PORT, lifespan=lifespan)
+
+
+def main() -> None:
+    """Run the server with the transport given on the command line or in CODEMAGIC_TRANSPORT."""
+    parser = argparse.ArgumentParser(description="Codemagic MCP server")
+    parser.add_argument(
+        "transport",
+        nargs="?",
+        default=TRANSPORT,
+        choices=["stdio", "sse", "streamable-http"],
+        help=f"Transport to serve MCP clients over (default: {TRANSPORT})"
+    )
+    args = parser.parse_args()
+    mcp.run(args.transport)
 
-# Register all tools from each module
-register_applications_tools(mcp)
-register_artifacts_tools(mcp)
-register_builds_tools(mcp)
-register_workflows_tools(mcp)
-register_caches_tools(mcp)
-register_teams_tools(mcp)
 
 # Run the server if this module is executed directly
 if __name__ == "__main__":
-    mcp.run()
+    main()
@@ -10,7 +10,7 @@ def register_teams_tools(mcp: FastMCP) -> None:
     """Register all team-related tools with the MCP server."""
     
     @mcp.tool()
-    def invite_team_member(team_id: str, email: str, role: str) -> Dict[str, Any]:
+    async def invite_team_member(team_id: str, email: str, role: str) -> Dict[str, Any]:
         """
         Invite a new team member to your team.
         
@@ -30,11 +30,11 @@ def register_teams_tools(mcp: FastMCP) -> None:
             "role": role
         }
         
-        response = make_request("POST", f"/team/{team_id}/invitation", json=data)
+        response = await make_request("POST", f"/team/{team_id}/invitation", json=data)
         return response.json()
 
     @mcp.tool()
-    def delete_team_member(team_id: str, user_id: str) -> Dict[str, Any]:
+    async def delete_team_member(team_id: str, user_id: str) -> Dict[str, Any]:
         """
         Remove a team member from the team.
         
@@ -45,5 +45,5 @@ def register_teams_tools(mcp: FastMCP) -> None:
         Returns:
             Response from the API (empty if successful)
         """
-        response = make_request("DELETE", f"/team/{team_id}/collaborator/{user_id}")
+        response = await make_request("DELETE", f"/team/{team_id}/collaborator/{user_id}")
         return response.json() if response.content else {}
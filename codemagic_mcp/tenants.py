@@ -0,0 +1,147 @@
+"""
+Named credentials for serving several Codemagic teams from one server process.
+
+Tenants are read from the JSON file named by CODEMAGIC_TENANTS_FILE, which
+maps a tenant name to its API key (or the environment variable holding it)
+and optional rate limit:
+
+    {
+        "acme": {"api_key_env": "ACME_CODEMAGIC_TOKEN", "rate_limit": 5, "rate_burst": 10},
+        "globex": {"api_key": "..."}
+    }
+
+Every tool then accepts a tenant argument selecting the credentials of the
+call. Calls without one use CODEMAGIC_DEFAULT_TENANT, which is the
+"default" tenant authenticated with CODEMAGIC_API_KEY unless configured
+otherwise. Each tenant gets its own connection pool, rate limit budget,
+response cache and on-disk namespace, so tenants never see each other's data.
+"""
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, Optional
+
+
+TENANTS_FILE = os.environ.get("CODEMAGIC_TENANTS_FILE")
+
+# Name of the tenant authenticated with CODEMAGIC_API_KEY
+ENV_TENANT = "default"
+
+# Tenant used by calls that do not name one
+DEFAULT_TENANT = os.environ.get("CODEMAGIC_DEFAULT_TENANT", ENV_TENANT)
+
+
+class TenantConfig:
+    """Credentials and rate limit of a tenant."""
+
+    def __init__(
+        self,
+        name: str,
+        api_key: Optional[str] = None,
+        api_key_env: Optional[str] = None,
+        rate_limit: Optional[float] = None,
+        rate_burst: Optional[int] = None
+    ):
+        self.name = name
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+
+    def get_api_key(self) -> str:
+        """Get the API key, read from the environment on every call so that it can be rotated."""
+        api_key = os.environ.get(self.api_key_env) if self.api_key_env else self.api_key
+        if not api_key:
+            if self.api_key_env:
+                raise ValueError(f"{self.api_key_env} environment variable is required")
+            raise ValueError(f"Tenant '{self.name}' has no api_key")
+        return api_key
+
+
+_tenants: Optional[Dict[str, TenantConfig]] = None
+
+_current_tenant: ContextVar[Optional[str]] = ContextVar("codemagic_tenant", default=None)
+
+
+def load_tenants() -> Dict[str, TenantConfig]:
+    """
+    Get the configured tenants, reading CODEMAGIC_TENANTS_FILE on first use.
+
+    Returns:
+        Tenant name to configuration; always includes the CODEMAGIC_API_KEY tenant
+    """
+    global _tenants
+
+    if _tenants is None:
+        tenants = {ENV_TENANT: TenantConfig(ENV_TENANT, api_key_env="CODEMAGIC_API_KEY")}
+        if TENANTS_FILE:
+            with open(os.path.expanduser(TENANTS_FILE), encoding="utf-8") as file:
+                entries: Dict[str, Dict[str, Any]] = json.load(file)
+            for name, entry in entries.items():
+                tenants[name] = TenantConfig(
+                    name,
+                    api_key=entry.get("api_key"),
+                    api_key_env=entry.get("api_key_env"),
+                    rate_limit=entry.get("rate_limit"),
+                    rate_burst=entry.get("rate_burst")
+                )
+        _tenants = tenants
+    return _tenants
+
+
+def is_multi_tenant() -> bool:
+    """Whether tools accept a tenant argument."""
+    return bool(TENANTS_FILE)
+
+
+def current_tenant() -> str:
+    """Get the name of the tenant the current tool call runs for."""
+    return _current_tenant.get() or DEFAULT_TENANT
+
+
+def get_tenant_config(name: Optional[str] = None) -> TenantConfig:
+    """
+    Get the configuration of a tenant.
+
+    Args:
+        name: Tenant name (default: the tenant of the current call)
+
+    Returns:
+        The tenant's configuration
+    """
+    name = name or current_tenant()
+    tenants = load_tenants()
+    if name not in tenants:
+        raise ValueError(f"Unknown tenant '{name}', expected one of: {', '.join(tenants)}")
+    return tenants[name]
+
+
+@contextmanager
+def use_tenant(name: Optional[str]) -> Iterator[str]:
+    """
+    Run the enclosed code, and the tasks it creates, for a tenant.
+
+    Args:
+        name: Tenant name, or None for the default tenant
+
+    Yields:
+        The tenant name
+    """
+    name = get_tenant_config(name).name
+    token = _current_tenant.set(name)
+    try:
+        yield name
+    finally:
+        _current_tenant.reset(token)
+
+
+def namespaced(key: str) -> str:
+    """
+    Prefix a key for shared storage with the current tenant.
+
+    Keys of the CODEMAGIC_API_KEY tenant are left unchanged, so
+    single-tenant deployments keep their existing cache entries.
+    """
+    tenant = current_tenant()
+    return key if tenant == ENV_TENANT else f"{tenant}/{key}"
@@ -0,0 +1,273 @@
+"""
+Build watching tools for Codemagic MCP server.
+
+A single poller task runs per build, however many tool calls are waiting
+on it, and polls less often the longer a build has been in a phase that
+is not about to finish. Builds that webhook events (see webhooks.py) report
+on are resolved from those events, and only polled now and then in case an
+event is lost.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, List, Set
+from .base import TERMINAL_BUILD_STATUSES
+from .builds import fetch_build_status
+from .tenants import current_tenant
+
+
+# Base poll interval in seconds per build status
+PHASE_POLL_INTERVALS = {
+    "queued": 20.0,
+    "preparing": 10.0,
+    "fetching": 10.0,
+    "building": 15.0,
+    "testing": 15.0,
+    "publishing": 5.0,
+    "finishing": 3.0,
+}
+DEFAULT_POLL_INTERVAL = 10.0
+MAX_POLL_INTERVAL = 60.0
+
+# Elapsed seconds after which the poll interval has doubled
+POLL_BACKOFF_SECONDS = 300.0
+
+# Poll interval of builds reported on by webhook events, which only covers lost events
+EVENT_FALLBACK_POLL_INTERVAL = 300.0
+
+# Maximum number of build states kept; the least recently updated ones not being watched are dropped
+MAX_TRACKED_BUILDS = 10000
+
+# Default seconds to wait for builds before returning
+DEFAULT_WAIT_TIMEOUT = 600.0
+
+
+def next_poll_interval(status: Optional[str], elapsed: float) -> float:
+    """
+    Get the delay before the next status poll of a build.
+
+    Args:
+        status: Current build status
+        elapsed: Seconds since the build started being watched
+
+    Returns:
+        Delay in seconds
+    """
+    base = PHASE_POLL_INTERVALS.get(status or "", DEFAULT_POLL_INTERVAL)
+    return min(MAX_POLL_INTERVAL, base * (1 + elapsed / POLL_BACKOFF_SECONDS))
+
+
+def is_terminal(build: Optional[Dict[str, Any]]) -> bool:
+    """Whether a build has reached a state it will never leave."""
+    return bool(build) and build.get("status") in TERMINAL_BUILD_STATUSES
+
+
+class BuildWatcher:
+    """
+    Tracks build states and shares one poller per build between all waiters.
+    """
+
+    def __init__(self):
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._changed: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = defaultdict(int)
+        self._from_events: Set[str] = set()
+
+    def latest(self, build_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent known state of a build."""
+        return self._latest.get(build_id)
+
+    def update(self, build_id: str, build: Dict[str, Any], from_event: bool = False) -> None:
+        """
+        Record a new state for a build and wake its poller.
+
+        Args:
+            build_id: The build identifier
+            build: The new build state
+            from_event: Whether the state comes from a webhook event; such builds are
+                no longer polled at the usual rate
+        """
+        # Moved to the end, so that the least recently updated builds come first
+        self._latest.pop(build_id, None)
+        self._latest[build_id] = build
+        if from_event:
+            self._from_events.add(build_id)
+        changed = self._changed.get(build_id)
+        if changed is not None:
+            changed.set()
+        self._trim()
+
+    def _trim(self) -> None:
+        excess = len(self._latest) - MAX_TRACKED_BUILDS
+        if excess <= 0:
+            return
+        unwatched = [build_id for build_id in self._latest if build_id not in self._pollers]
+        for build_id in unwatched[:excess]:
+            del self._latest[build_id]
+            self._from_events.discard(build_id)
+
+    async def _poll(self, build_id: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        # The state from a webhook event is current, no need to ask the API first
+        fetch = build_id not in self._from_events
+        while True:
+            build = self._latest.get(build_id)
+            if fetch and not is_terminal(build):
+                data = await fetch_build_status(build_id)
+                build = data.get("build", {})
+                self._latest[build_id] = build
+            if is_terminal(build):
+                return build
+
+            changed = self._changed[build_id]
+            changed.clear()
+            interval = next_poll_interval(build.get("status"), time.monotonic() - started)
+            if build_id in self._from_events:
+                interval = max(interval, EVENT_FALLBACK_POLL_INTERVAL)
+            try:
+                await asyncio.wait_for(changed.wait(), interval)
+                # Woken by an update, no need to ask the API again
+                fetch = False
+            except asyncio.TimeoutError:
+                fetch = True
+
+    def _acquire(self, build_id: str) -> asyncio.Task:
+        task = self._pollers.get(build_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._poll(build_id))
+            self._pollers[build_id] = task
+            task.add_done_callback(lambda done: self._forget(build_id, done))
+        self._waiters[build_id] += 1
+        return task
+
+    def _release(self, build_id: str) -> None:
+        self._waiters[build_id] -= 1
+        if self._waiters[build_id] <= 0:
+            del self._waiters[build_id]
+            task = self._pollers.pop(build_id, None)
+            # Nobody is interested in this build anymore
+            if task is not None and not task.done():
+                task.cancel()
+
+    def _forget(self, build_id: str, task: asyncio.Task) -> None:
+        if self._pollers.get(build_id) is task:
+            del self._pollers[build_id]
+        self._changed.pop(build_id, None)
+
+    async def wait(
+        self,
+        build_ids: List[str],
+        timeout: float,
+        return_when: str = asyncio.ALL_COMPLETED
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Wait for builds to reach a terminal state.
+
+        Args:
+            build_ids: Build identifiers to wait for
+            timeout: Maximum seconds to wait
+            return_when: asyncio.ALL_COMPLETED or asyncio.FIRST_COMPLETED
+
+        Returns:
+            Build ID to a dictionary with done, status and the build or error
+        """
+        build_ids = list(dict.fromkeys(build_ids))
+        tasks = {build_id: self._acquire(build_id) for build_id in build_ids}
+        try:
+            # Shielded so that a waiter timing out does not stop a shared poller
+            shielded = {asyncio.shield(task): build_id for build_id, task in tasks.items()}
+            done, pending = await asyncio.wait(shielded, timeout=timeout, return_when=return_when)
+            for future in pending:
+                future.cancel()
+        finally:
+            for build_id in build_ids:
+                self._release(build_id)
+
+        results = {}
+        for build_id, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                error = task.exception()
+                results[build_id] = {"done": False, "error": f"{type(error).__name__}: {error}"}
+                continue
+            build = task.result() if task.done() and not task.cancelled() else self._latest.get(build_id)
+            results[build_id] = {
+                "done": is_terminal(build),
+                "status": (build or {}).get("status"),
+                "build": build,
+            }
+        return results
+
+
+_watchers: Dict[str, BuildWatcher] = {}
+
+
+def get_build_watcher() -> BuildWatcher:
+    """Get the build watcher of the current tenant, whose pollers fetch with its credentials."""
+    tenant = current_tenant()
+    if tenant not in _watchers:
+        _watchers[tenant] = BuildWatcher()
+    return _watchers[tenant]
+
+
+def register_watch_tools(mcp: FastMCP) -> None:
+    """Register all build watching tools with the MCP server."""
+
+    @mcp.tool()
+    async def wait_for_build(build_id: str, timeout: float = DEFAULT_WAIT_TIMEOUT) -> Dict[str, Any]:
+        """
+        Wait until a build finishes, fails, is canceled or times out, instead of polling get_build_status.
+
+        Args:
+            build_id: The build identifier
+            timeout: Maximum number of seconds to wait (default: 600)
+
+        Returns:
+            Dictionary with done (whether the build reached a terminal state), status,
+            the latest build information and the number of seconds waited
+        """
+        started = time.monotonic()
+        result = (await get_build_watcher().wait([build_id], timeout))[build_id]
+        return {"build_id": build_id, **result, "waited": round(time.monotonic() - started, 1)}
+
+    @mcp.tool()
+    async def watch_builds(
+        build_ids: List[str],
+        timeout: float = DEFAULT_WAIT_TIMEOUT,
+        return_when: str = "all"
+    ) -> Dict[str, Any]:
+        """
+        Wait for several builds at once and report their states.
+
+        Args:
+            build_ids: The build identifiers to watch
+            timeout: Maximum number of seconds to wait (default: 600)
+            return_when: 'all' to wait for every build, 'first' to return when any build is done (default: 'all')
+
+        Returns:
+            Dictionary with the status of each build and the lists of done and pending build IDs
+        """
+        modes = {"all": asyncio.ALL_COMPLETED, "first": asyncio.FIRST_COMPLETED}
+        if return_when not in modes:
+            raise ValueError("return_when must be either 'all' or 'first'")
+        if not build_ids:
+            raise ValueError("At least one build ID is required")
+
+        started = time.monotonic()
+        results = await get_build_watcher().wait(build_ids, timeout, modes[return_when])
+        builds = {
+            build_id: {
+                "done": result["done"],
+                "status": result.get("status"),
+                "finishedAt": (result.get("build") or {}).get("finishedAt"),
+                **({"error": result["error"]} if "error" in result else {}),
+            }
+            for build_id, result in results.items()
+        }
+        return {
+            "builds": builds,
+            "done": [build_id for build_id, result in results.items() if result["done"]],
+            "pending": [build_id for build_id, result in results.items() if not result["done"]],
+            "waited": round(time.monotonic() - started, 1),
+        }
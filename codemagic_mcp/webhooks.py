@@ -0,0 +1,327 @@
+"""
+Webhook receiver for Codemagic MCP server.
+
+When CODEMAGIC_WEBHOOK_PORT is set, the server also listens for Codemagic
+build webhooks on that port, whichever transport it serves MCP clients
+over. Every event updates the build state that wait_for_build and
+watch_builds are resolved from, drops the cached responses of the build and
+updates the build index, so waiting tools return as soon as the event
+arrives and builds with events are only polled now and then in case an
+event is lost.
+
+Point the webhook at http://<host>:<port>/webhook, or /webhook/<tenant> for
+a named tenant. Without CODEMAGIC_WEBHOOK_SECRET the receiver only listens on
+a loopback address, since anyone who can reach it can rewrite build state. Any HTTP client can post a sample payload:
+
+    curl -X POST http://127.0.0.1:8787/webhook \\
+        -d '{"build": {"_id": "5fabc6414c483700143f4f92", "status": "finished"}}'
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from mcp.server.fastmcp import FastMCP
+from typing import Optional, Dict, Any, Tuple
+from .base import invalidate_cache
+from .index import get_build_index
+from .tenants import use_tenant, get_tenant_config
+from .watch import get_build_watcher
+
+
+# Address the webhook receiver listens on; it is off unless a port is set
+WEBHOOK_HOST = os.environ.get("CODEMAGIC_WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ["CODEMAGIC_WEBHOOK_PORT"]) if os.environ.get("CODEMAGIC_WEBHOOK_PORT") else None
+
+# Shared secret, sent as the token query parameter or the X-Webhook-Token header;
+# required unless the receiver listens on a loopback address
+WEBHOOK_SECRET = os.environ.get("CODEMAGIC_WEBHOOK_SECRET")
+
+# Path events are posted to, optionally followed by /<tenant>
+WEBHOOK_PATH = "/webhook"
+
+# Largest accepted payload in bytes
+MAX_PAYLOAD_BYTES = 1024 * 1024
+
+# Seconds a client has to send its whole request
+REQUEST_TIMEOUT = 10.0
+
+# Number of recent events reported by get_webhook_status
+RECENT_EVENTS = 20
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookError(Exception):
+    """A request the receiver rejects, with the HTTP status to answer it with."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def extract_build(payload: Any) -> Optional[Dict[str, Any]]:
+    """
+    Get the build from a webhook payload.
+
+    Accepts the shape of the /builds/{id} response ({"build": {...}, "application": {...}})
+    as well as a bare build record.
+
+    Args:
+        payload: Parsed webhook payload
+
+    Returns:
+        The build with its _id set, or None if the payload has no build ID
+    """
+    if not isinstance(payload, dict):
+        return None
+    build = payload["build"] if isinstance(payload.get("build"), dict) else payload
+    build_id = build.get("_id") or build.get("id") or payload.get("buildId")
+    if not build_id:
+        return None
+    return {**build, "_id": build_id}
+
+
+class WebhookReceiver:
+    """Minimal HTTP server turning posted build events into build state updates."""
+
+    def __init__(self, host: str, port: int, secret: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        self.recent: deque = deque(maxlen=RECENT_EVENTS)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None and self._server.is_serving()
+
+    async def start(self) -> None:
+        """Start listening, unless already listening on the current event loop."""
+        if self.running:
+            return
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        # With port 0 the system picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Receiving webhooks on http://%s:%d%s", self.host, self.port, WEBHOOK_PATH)
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle_event(self, payload: Any, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Apply a build event: update the build state, drop its cached responses and update the index.
+
+        Args:
+            payload: Parsed webhook payload
+            tenant: Tenant the event belongs to (default: the default tenant)
+
+        Returns:
+            Summary of the event
+        """
+        build = extract_build(payload)
+        if build is None:
+            raise WebhookError(HTTPStatus.BAD_REQUEST, "Payload has no build ID")
+        build_id = build["_id"]
+
+        with use_tenant(tenant) as tenant:
+            watcher = get_build_watcher()
+            # Events may carry only part of the build, keep what is already known
+            build = {**(watcher.latest(build_id) or {}), **build}
+            watcher.update(build_id, build, from_event=True)
+            invalidate_cache(f"/builds/{build_id}")
+            build_index = get_build_index()
+            await build_index.run(build_index.record, build)
+
+        self.received += 1
+        event = {
+            "tenant": tenant,
+            "build_id": build_id,
+            "status": build.get("status"),
+            "received_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.recent.appendleft(event)
+        return event
+
+    def status(self) -> Dict[str, Any]:
+        """Get the address, event counts and most recent events of the receiver."""
+        return {
+            "enabled": True,
+            "running": self.running,
+            "url": f"http://{self.host}:{self.port}{WEBHOOK_PATH}",
+            "secret_required": bool(self.secret),
+            "received": self.received,
+            "rejected": self.rejected,
+            "recent_events": list(self.recent),
+        }
+
+    def _authorized(self, headers: Dict[str, str], query: Dict[str, Any]) -> bool:
+        if not self.secret:
+            return True
+        token = headers.get("x-webhook-token") or (query.get("token") or [""])[0]
+        return hmac.compare_digest(token.encode(), self.secret.encode())
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise WebhookError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        method, target, _ = request_line
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        if method == "GET" and path in ("", "/health"):
+            return HTTPStatus.OK, {"status": "ok"}
+        if path != WEBHOOK_PATH and not path.startswith(f"{WEBHOOK_PATH}/"):
+            raise WebhookError(HTTPStatus.NOT_FOUND, f"Post events to {WEBHOOK_PATH}")
+        if method != "POST":
+            raise WebhookError(HTTPStatus.METHOD_NOT_ALLOWED, "Only POST is supported")
+        if not self._authorized(headers, parse_qs(url.query)):
+            raise WebhookError(HTTPStatus.UNAUTHORIZED, "Invalid or missing webhook token")
+
+        tenant = path[len(WEBHOOK_PATH) + 1:] or None
+        try:
+            get_tenant_config(tenant)
+        except ValueError as e:
+            raise WebhookError(HTTPStatus.NOT_FOUND, str(e))
+
+        if "content-length" not in headers:
+            raise WebhookError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+        length = int(headers["content-length"])
+        if length > MAX_PAYLOAD_BYTES:
+            raise WebhookError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Payload exceeds {MAX_PAYLOAD_BYTES} bytes")
+        try:
+            payload = json.loads(await reader.readexactly(length))
+        except ValueError:
+            raise WebhookError(HTTPStatus.BAD_REQUEST, "Payload is not valid JSON")
+        return HTTPStatus.ACCEPTED, await self.handle_event(payload, tenant)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, body = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+        except WebhookError as e:
+            status, body = e.status, {"error": str(e)}
+        except asyncio.TimeoutError:
+            status, body = HTTPStatus.REQUEST_TIMEOUT, {"error": "Request not received in time"}
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            status, body = HTTPStatus.BAD_REQUEST, {"error": "Malformed request"}
+        except Exception as e:
+            logger.exception("Failed to handle webhook")
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+        if status >= 400:
+            self.rejected += 1
+
+        content = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + content
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def is_loopback(host: str) -> bool:
+    """Check whether a listen address only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+_receiver: Optional[WebhookReceiver] = None
+# Number of running servers and sessions the receiver was started for
+_receiver_users = 0
+
+
+def get_webhook_receiver() -> Optional[WebhookReceiver]:
+    """Get the webhook receiver, or None if CODEMAGIC_WEBHOOK_PORT is not set."""
+    global _receiver
+
+    if _receiver is None and WEBHOOK_PORT is not None:
+        _receiver = WebhookReceiver(WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET)
+    return _receiver
+
+
+async def start_webhook_receiver() -> None:
+    """
+    Start the webhook receiver if it is configured; failing to do so leaves builds to polling.
+
+    Every call must be paired with a call to stop_webhook_receiver.
+    """
+    global _receiver_users
+
+    receiver = get_webhook_receiver()
+    if receiver is None:
+        return
+    _receiver_users += 1
+    if receiver.running:
+        return
+    if not receiver.secret:
+        if not is_loopback(receiver.host):
+            logger.error(
+                "Not receiving webhooks on %s:%d: set CODEMAGIC_WEBHOOK_SECRET to accept events "
+                "on an address other hosts can reach", receiver.host, receiver.port
+            )
+            return
+        logger.warning(
+            "CODEMAGIC_WEBHOOK_SECRET is not set: any local process can post build events "
+            "to http://%s:%d%s", receiver.host, receiver.port, WEBHOOK_PATH
+        )
+    try:
+        await receiver.start()
+    except OSError as e:
+        logger.error("Could not receive webhooks on %s:%d: %s", receiver.host, receiver.port, e)
+
+
+async def stop_webhook_receiver() -> None:
+    """Stop the webhook receiver once every server and session it was started for has ended."""
+    global _receiver_users
+
+    if _receiver is None or _receiver_users == 0:
+        return
+    _receiver_users -= 1
+    if _receiver_users == 0:
+        await _receiver.stop()
+
+
+def register_webhooks_tools(mcp: FastMCP) -> None:
+    """Register all webhook tools with the MCP server."""
+
+    @mcp.tool()
+    async def get_webhook_status() -> Dict[str, Any]:
+        """
+        Get the state of the embedded webhook receiver that resolves wait_for_build and watch_builds from build events.
+
+        Returns:
+            Dictionary with whether the receiver is enabled and running, its URL, the number of
+            received and rejected requests and the most recent build events
+        """
+        receiver = get_webhook_receiver()
+        if receiver is None:
+            return {"enabled": False, "hint": "Set CODEMAGIC_WEBHOOK_PORT to receive build webhooks"}
+        return receiver.status()
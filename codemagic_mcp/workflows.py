@@ -2,43 +2,57 @@
 Workflows API module for Codemagic MCP server.
 """
 from mcp.server.fastmcp import FastMCP
-from typing import Dict, Any
+from typing import Optional, Dict, Any, List
 from .base import make_request
+from .builds import fetch_build_resource
+from .projection import shape_response
 
 
 def register_workflows_tools(mcp: FastMCP) -> None:
     """Register all workflow-related tools with the MCP server."""
     
     @mcp.tool()
-    def get_workflows(app_id: str) -> Dict[str, Any]:
+    async def get_workflows(
+        app_id: str,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
         """
         Get all workflows for a specific application.
         
         Args:
             app_id: The application identifier
+            fields: Optional field paths to return, e.g. ['workflows[*]._id', 'workflows[*].name']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing the list of workflows for the application
         """
-        response = make_request("GET", f"/apps/{app_id}/workflows")
-        return response.json()
+        response = await make_request("GET", f"/apps/{app_id}/workflows")
+        return shape_response(response.json(), fields, compact)
 
     @mcp.tool()
-    def get_workflow_details(workflow_id: str) -> Dict[str, Any]:
+    async def get_workflow_details(
+        workflow_id: str,
+        fields: Optional[List[str]] = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
         """
         Get detailed information about a specific workflow.
         
         Args:
             workflow_id: The workflow identifier
+            fields: Optional field paths to return, e.g. ['name', 'triggering']
+            compact: Drop empty and default values and bulky fields and cut long strings (default: False)
             
         Returns:
             Dictionary containing detailed workflow information
         """
-        response = make_request("GET", f"/workflows/{workflow_id}")
-        return response.json()
+        response = await make_request("GET", f"/workflows/{workflow_id}")
+        return shape_response(response.json(), fields, compact)
 
     @mcp.tool()
-    def get_build_steps(build_id: str) -> Dict[str, Any]:
+    async def get_build_steps(build_id: str) -> Dict[str, Any]:
         """
         Get the individual steps and their execution details for a specific build.
         
@@ -48,11 +62,10 @@ def register_workflows_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing build steps with their status, timing, and output
         """
-        response = make_request("GET", f"/builds/{build_id}/steps")
-        return response.json()
+        return await fetch_build_resource(build_id, "steps")
 
     @mcp.tool()
-    def get_build_step_logs(build_id: str, step_id: str) -> Dict[str, Any]:
+    async def get_build_step_logs(build_id: str, step_id: str) -> Dict[str, Any]:
         """
         Get the logs for a specific step within a build.
         
@@ -63,11 +76,10 @@ def register_workflows_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing the step logs and metadata
         """
-        response = make_request("GET", f"/builds/{build_id}/steps/{step_id}/logs")
-        return response.json()
+        return await fetch_build_resource(build_id, f"steps/{step_id}/logs")
 
     @mcp.tool()
-    def get_build_timeline(build_id: str) -> Dict[str, Any]:
+    async def get_build_timeline(build_id: str) -> Dict[str, Any]:
         """
         Get a timeline of events for a specific build showing the progression through steps.
         
@@ -77,5 +89,4 @@ def register_workflows_tools(mcp: FastMCP) -> None:
         Returns:
             Dictionary containing the build timeline with timestamps and events
         """
-        response = make_request("GET", f"/builds/{build_id}/timeline")
-        return response.json()
+        return await fetch_build_resource(build_id, "timeline")
@@ -0,0 +1,70 @@
+"""
+Shared fixtures of the local test suite.
+
+The tests run against the mock API of benchmarks/mock_server.py, started
+once per session. The package reads its configuration when imported, so
+the environment is pointed at the mock API and at throwaway cache and
+index locations here, before any test module imports codemagic_mcp.
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.mock_server import MockCodemagicServer, MockConfig
+
+# Size of every artifact served by the mock API, not a multiple of the chunk sizes on purpose
+ARTIFACT_BYTES = 3 * 1024 * 1024 + 123
+
+_server = MockCodemagicServer(
+    MockConfig(builds=50, log_bytes=64 * 1024, artifact_bytes=ARTIFACT_BYTES, latency=0, jitter=0)
+).start()
+_state_dir = tempfile.mkdtemp(prefix="codemagic-mcp-tests-")
+
+os.environ.update({
+    "CODEMAGIC_API_URL": _server.url,
+    "CODEMAGIC_RATE_LIMIT": "0",
+    "CODEMAGIC_DISK_CACHE_DIR": os.path.join(_state_dir, "builds"),
+    "CODEMAGIC_INDEX_PATH": os.path.join(_state_dir, "index.sqlite3"),
+    "CODEMAGIC_TOOL_MANIFEST": os.path.join(_state_dir, "tools.json"),
+})
+os.environ.setdefault("CODEMAGIC_API_KEY", "test-key")
+
+
+@pytest.fixture
+def mock_api(monkeypatch: pytest.MonkeyPatch) -> MockCodemagicServer:
+    """
+    The mock API, with its latency and log responses restored after the test.
+
+    Tests change them with monkeypatch.setattr, e.g. on mock_api.config.latency
+    or mock_api.build_log.
+    """
+    monkeypatch.setattr(_server.config, "latency", _server.config.latency)
+    monkeypatch.setattr(_server, "build_log", _server.build_log)
+    monkeypatch.setattr(_server, "step_log", _server.step_log)
+    return _server
+
+
+@pytest.fixture
+def requests_made(mock_api: MockCodemagicServer):
+    """Get a function returning the number of requests the mock API received since the test started."""
+    before = mock_api.counters()["requests"]
+    return lambda: mock_api.counters()["requests"] - before
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    """Start every test without cached API responses."""
+    from codemagic_mcp.base import clear_cache
+
+    clear_cache()
+    yield
+    clear_cache()
+
+
+@pytest.fixture
+def running_build(mock_api: MockCodemagicServer, monkeypatch: pytest.MonkeyPatch) -> str:
+    """The ID of a build the mock API reports as still building during the test."""
+    build_id = "build00001"
+    monkeypatch.setitem(mock_api.builds_by_id[build_id], "status", "building")
+    return build_id
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Run the local test suite with pytest.
+
+Run with: poetry run python local_only/run_all_tests.py [pytest arguments ...]
+
+The tests need no Codemagic account: they run against the mock API in
+benchmarks/mock_server.py. Extra arguments are passed on to pytest, e.g.
+`run_all_tests.py -k scheduler` or `run_all_tests.py local_only/test_watch.py`.
+"""
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main() -> int:
+    os.chdir(os.path.dirname(TESTS_DIR))
+    print("🧪 Running the local test suite")
+    exit_code = pytest.main(sys.argv[1:] or [TESTS_DIR])
+    if exit_code == pytest.ExitCode.OK:
+        print("🎉 All tests passed")
+    elif exit_code == pytest.ExitCode.NO_TESTS_COLLECTED:
+        print("❌ No tests collected")
+    else:
+        print(f"❌ Tests failed (pytest exit code {int(exit_code)})")
+    return int(exit_code)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Tests of single-flight coalescing of concurrent identical GET requests, against the mock API.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from codemagic_mcp.base import make_request
+
+
+@pytest.fixture(autouse=True)
+def slow_api(mock_api, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Requests must still be in flight when the identical ones arrive
+    monkeypatch.setattr(mock_api.config, "latency", 0.1)
+
+
+async def test_concurrent_identical_requests_coalesced(requests_made):
+    responses = await asyncio.gather(*(make_request("GET", "/builds/build00002/steps") for _ in range(20)))
+    assert requests_made() == 1
+    assert all(response.json() == responses[0].json() for response in responses)
+
+
+async def test_different_requests_not_coalesced(requests_made):
+    await asyncio.gather(
+        make_request("GET", "/builds/build00003/steps"),
+        make_request("GET", "/builds/build00004/steps"),
+        make_request("GET", "/builds/build00003/steps", params={"page": 2}),
+    )
+    assert requests_made() == 3
+
+
+async def test_requests_with_other_arguments_not_coalesced(requests_made):
+    await asyncio.gather(*(
+        make_request("GET", "/builds/build00005/steps", headers={"Accept": "application/json"}) for _ in range(2)
+    ))
+    assert requests_made() == 2
+
+
+async def test_cancelled_caller_does_not_cancel_shared_request(requests_made):
+    first = asyncio.create_task(make_request("GET", "/builds/build00006/steps"))
+    second = asyncio.create_task(make_request("GET", "/builds/build00006/steps"))
+    await asyncio.sleep(0.02)
+    first.cancel()
+    response = await second
+    assert response.status_code == 200
+    assert first.cancelled()
+    assert requests_made() == 1
+
+
+async def test_coalesced_callers_share_errors(requests_made):
+    results = await asyncio.gather(
+        *(make_request("GET", "/builds/missing/steps") for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, httpx.HTTPStatusError) for result in results)
+    assert requests_made() == 1
+
+
+async def test_request_after_completion_not_coalesced(requests_made):
+    await make_request("GET", "/builds/build00007/steps")
+    await make_request("GET", "/builds/build00007/steps")
+    assert requests_made() == 2
@@ -0,0 +1,70 @@
+"""
+Tests of failure diagnosis: matching error signatures against the lines of a log served by the mock API.
+"""
+import pytest
+
+from benchmarks.mock_server import step_log_response
+from codemagic_mcp import diagnosis
+from codemagic_mcp.diagnosis import add_error_signature, find_failed_step, get_prefilter, scan_log
+from codemagic_mcp.logs import MAX_LINE_LENGTH, log_endpoint
+
+ENDPOINT = log_endpoint("build00001", "step0")
+
+
+@pytest.fixture
+def serve_log(mock_api, monkeypatch: pytest.MonkeyPatch):
+    """Get a function making the mock API serve the given text as the step log."""
+    return lambda text: monkeypatch.setattr(mock_api, "step_log", step_log_response(text.encode()))
+
+
+def test_find_failed_step():
+    steps = [{"name": "Install", "status": "success"}, {"name": "Build", "status": "Timeout"}, {"status": "failed"}]
+    assert find_failed_step(steps)["name"] == "Build"
+    assert find_failed_step(steps[:1]) is None
+
+
+async def test_match_in_long_line(serve_log):
+    # The error follows 5000 characters on its line, past the excerpt length
+    serve_log("ok\n" * 10 + "x" * 5000 + " error: no such module 'Alamofire'\n" + "ok\n" * 10)
+    result = await scan_log(ENDPOINT)
+    assert result["scanned_lines"] == 21
+    cause = result["causes"][0]
+    assert cause["signature"] == "xcode_missing_module"
+    assert cause["first_line"] == 11
+    assert all(
+        len(line["text"]) <= MAX_LINE_LENGTH for window in cause["windows"] for line in window["lines"]
+    )
+
+
+async def test_causes_ranked_by_score(serve_log):
+    serve_log("compiling\nerror: something went wrong\n** BUILD FAILED **\nerror: no such module 'Alamofire'\n")
+    result = await scan_log(ENDPOINT)
+    causes = result["causes"]
+    assert causes[0]["signature"] == "xcode_missing_module"
+    assert [cause["score"] for cause in causes] == sorted((cause["score"] for cause in causes), reverse=True)
+    assert "tail" not in result
+
+
+async def test_window_has_context_lines(serve_log):
+    serve_log("".join(f"line {number}\n" for number in range(10)) + "error: no such module 'Foo'\n" + "after\n" * 5)
+    window = (await scan_log(ENDPOINT))["causes"][0]["windows"][0]
+    assert window["match_line"] == 11
+    assert [line["line"] for line in window["lines"]] == list(range(11 - 3, 11 + 3 + 1))
+
+
+async def test_tail_returned_without_match(serve_log):
+    serve_log("".join(f"line {number}\n" for number in range(50)))
+    result = await scan_log(ENDPOINT)
+    assert result["causes"] == []
+    assert [line["text"] for line in result["tail"]] == [f"line {number}" for number in range(30, 50)]
+
+
+async def test_custom_signature(serve_log, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(diagnosis, "ERROR_SIGNATURES", list(diagnosis.ERROR_SIGNATURES))
+    monkeypatch.setattr(diagnosis, "_prefilter", None)
+    get_prefilter()
+    add_error_signature("flaky_simulator", "project", r"Simulator .* failed to boot", 20, "Retry the build")
+    # Adding a signature rebuilds the prefilter
+    assert get_prefilter().search("Simulator iPhone 15 failed to boot")
+    serve_log("error: something went wrong\nSimulator iPhone 15 failed to boot\n")
+    assert (await scan_log(ENDPOINT))["causes"][0]["signature"] == "flaky_simulator"
@@ -0,0 +1,102 @@
+"""
+Tests of resumable artifact downloads, against the mock API.
+"""
+import functools
+import hashlib
+
+import pytest
+
+from benchmarks.mock_server import MockHandler
+from codemagic_mcp.artifacts import content_range_start, download_artifact_to
+
+SECURE_FILENAME = "uuid1/uuid2/app-release.ipa"
+
+
+@functools.lru_cache(maxsize=1)
+def artifact_content(size: int) -> bytes:
+    # The mock API serves byte i of every artifact as i % 256
+    return bytes(i % 256 for i in range(size))
+
+
+@pytest.fixture
+def expected(mock_api) -> bytes:
+    """The content of every artifact served by the mock API."""
+    return artifact_content(mock_api.config.artifact_bytes)
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "app.ipa")
+
+
+def write_part(path: str, content: bytes) -> None:
+    with open(f"{path}.part", "wb") as f:
+        f.write(content)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_content_range_start():
+    assert content_range_start("bytes 100-199/200") == 100
+    assert content_range_start("bytes */200") is None
+    assert content_range_start(None) is None
+
+
+async def test_full_download(path, expected):
+    result = await download_artifact_to(SECURE_FILENAME, path)
+    assert read(path) == expected
+    assert result["size"] == len(expected)
+    assert result["sha256"] == hashlib.sha256(expected).hexdigest()
+
+
+async def test_partial_file_removed_after_download(path, tmp_path):
+    await download_artifact_to(SECURE_FILENAME, path)
+    assert [entry.name for entry in tmp_path.iterdir()] == ["app.ipa"]
+
+
+async def test_resume_continues_partial_file(path, expected):
+    write_part(path, expected[:1024 * 1024 + 7])
+    result = await download_artifact_to(SECURE_FILENAME, path)
+    assert read(path) == expected
+    assert result["sha256"] == hashlib.sha256(expected).hexdigest()
+
+
+async def test_resume_disabled_overwrites_partial_file(path, expected):
+    write_part(path, b"garbage" * 1000)
+    await download_artifact_to(SECURE_FILENAME, path, resume=False)
+    assert read(path) == expected
+
+
+async def test_oversized_partial_file_restarts(path, expected):
+    # The API answers 416 for a range past the end of the artifact
+    write_part(path, b"\0" * (len(expected) + 10))
+    result = await download_artifact_to(SECURE_FILENAME, path)
+    assert read(path) == expected
+    assert result["sha256"] == hashlib.sha256(expected).hexdigest()
+
+
+async def test_range_starting_elsewhere_restarts(path, expected, monkeypatch: pytest.MonkeyPatch):
+    # An API answering every request with the whole artifact as a 206 from byte 0
+    monkeypatch.setattr(MockHandler, "_byte_range", lambda self, size: (0, size - 1))
+    write_part(path, expected[:4096])
+    result = await download_artifact_to(SECURE_FILENAME, path)
+    assert read(path) == expected
+    assert result["sha256"] == hashlib.sha256(expected).hexdigest()
+
+
+async def test_progress_reported(path, expected):
+    reports = []
+
+    async def progress(downloaded: int, total):
+        reports.append((downloaded, total))
+
+    write_part(path, expected[:1000])
+    await download_artifact_to(SECURE_FILENAME, path, progress=progress)
+    assert reports
+    assert all(total == len(expected) for _, total in reports)
+    downloaded = [downloaded for downloaded, _ in reports]
+    assert downloaded == sorted(downloaded)
+    assert downloaded[0] > 1000 and downloaded[-1] == len(expected)
@@ -0,0 +1,80 @@
+"""
+Tests of log streaming: extracting the log text from JSON log responses and reading it line by line.
+"""
+import json
+
+import pytest
+
+from benchmarks.mock_server import build_log_response, step_log_response
+from codemagic_mcp.logs import LogTextScanner, classify_severity, iter_log_lines, log_endpoint
+
+LOG = "compiling main.swift\n\tlinking é ✓ 🚀 \"quoted\" back\\slash\r\nerror: cannot find 'Foo' in scope\nlast line"
+
+
+def scan(document: str, chunk_size: int) -> str:
+    scanner = LogTextScanner()
+    return "".join(
+        fragment
+        for start in range(0, len(document), chunk_size)
+        for fragment in scanner.feed(document[start:start + chunk_size])
+    )
+
+
+async def collect_lines(endpoint: str, byte_offset: int = 0):
+    return [(position, line) async for position, line in iter_log_lines(endpoint, byte_offset)]
+
+
+def test_scanner_extracts_step_log():
+    document = json.dumps({"content": LOG, "status": "failed", "meta": {"logs": 3}})
+    assert scan(document, 1000) == LOG
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_scanner_independent_of_chunk_size(chunk_size: int, ensure_ascii: bool):
+    # Escapes, \u sequences and surrogate pairs split across chunks must decode the same way
+    document = json.dumps({"content": LOG}, ensure_ascii=ensure_ascii)
+    assert scan(document, chunk_size) == LOG
+
+
+def test_scanner_joins_step_logs_and_skips_other_fields():
+    document = json.dumps({"steps": [
+        {"name": "error: not log text", "logs": "first step\n"},
+        {"name": "Build", "status": "failed", "logs": "second step"},
+        {"name": "Publish", "logs": "third step"},
+    ]})
+    assert scan(document, 5) == "first step\nsecond step\nthird step"
+
+
+def test_scanner_accepts_plain_string():
+    assert scan(json.dumps("only\nlog"), 3) == "only\nlog"
+
+
+def test_classify_severity():
+    assert classify_severity("error: cannot find 'Foo' in scope") == "error"
+    assert classify_severity("warning: deprecated API") == "warning"
+    assert classify_severity("Compiling Source.swift") == "info"
+
+
+async def test_lines_match_log(mock_api, monkeypatch: pytest.MonkeyPatch):
+    log = LOG.encode()
+    monkeypatch.setattr(mock_api, "step_log", step_log_response(log))
+    lines = await collect_lines(log_endpoint("build00001", "step0"))
+    assert [line for _, line in lines] == [line.rstrip("\r") for line in LOG.split("\n")]
+    # Offsets count UTF-8 bytes of the log text, line breaks included
+    assert lines[-1][0] == len(log)
+
+
+async def test_lines_resume_from_byte_offset(mock_api, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(mock_api, "step_log", step_log_response(LOG.encode()))
+    endpoint = log_endpoint("build00001", "step0")
+    lines = await collect_lines(endpoint)
+    for index, (position, _) in enumerate(lines):
+        assert await collect_lines(endpoint, position) == lines[index + 1:]
+
+
+async def test_build_log_lines_cover_every_step(mock_api, monkeypatch: pytest.MonkeyPatch):
+    log = "".join(f"line {number}\n" for number in range(100)).encode()
+    monkeypatch.setattr(mock_api, "build_log", build_log_response(log))
+    lines = await collect_lines(log_endpoint("build00001"))
+    assert [line for _, line in lines] == [f"line {number}" for number in range(100)]
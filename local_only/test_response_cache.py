@@ -0,0 +1,86 @@
+"""
+Tests of the response cache of GET requests, against the mock API.
+"""
+import asyncio
+
+import httpx
+
+from codemagic_mcp.base import ResponseCache, get_cache_ttl, invalidate_cache, make_request, peek_cache
+
+
+async def test_fresh_response_served_from_cache(requests_made):
+    first = await make_request("GET", "/apps")
+    second = await make_request("GET", "/apps")
+    assert requests_made() == 1
+    assert second.json() == first.json()
+
+
+async def test_invalidate_forces_refetch(requests_made):
+    await make_request("GET", "/apps/app0")
+    invalidate_cache("/apps/app0")
+    await make_request("GET", "/apps/app0")
+    assert requests_made() == 2
+
+
+async def test_invalidate_drops_every_params_variant(requests_made):
+    await make_request("GET", "/apps", params={"page": 1})
+    await make_request("GET", "/apps", params={"page": 2})
+    invalidate_cache("/apps")
+    await make_request("GET", "/apps", params={"page": 1})
+    await make_request("GET", "/apps", params={"page": 2})
+    assert requests_made() == 4
+
+
+async def test_cache_keyed_by_params(requests_made):
+    await make_request("GET", "/apps", params={"page": 1})
+    await make_request("GET", "/apps", params={"page": 2})
+    await make_request("GET", "/apps", params={"page": 1})
+    assert requests_made() == 2
+
+
+async def test_uncached_endpoint_always_fetched(requests_made):
+    assert get_cache_ttl("/builds/build00001/steps") == 0
+    await make_request("GET", "/builds/build00001/steps")
+    await make_request("GET", "/builds/build00001/steps")
+    assert requests_made() == 2
+
+
+async def test_non_get_requests_not_cached(requests_made):
+    await make_request("POST", "/builds/build00001/cancel")
+    await make_request("POST", "/builds/build00001/cancel")
+    assert requests_made() == 2
+
+
+async def test_peek_does_not_request(requests_made):
+    assert peek_cache("/builds/build00003") is None
+    response = await make_request("GET", "/builds/build00003")
+    assert peek_cache("/builds/build00003") is response
+    assert requests_made() == 1
+
+
+def test_lru_eviction():
+    cache = ResponseCache(2)
+    for name in ("a", "b"):
+        cache.put((name, ()), httpx.Response(200), 60)
+    # Using "a" makes "b" the least recently used entry
+    assert cache.get(("a", ())) is not None
+    cache.put(("c", ()), httpx.Response(200), 60)
+    assert cache.get(("b", ())) is None
+    assert cache.get(("a", ())) is not None and cache.get(("c", ())) is not None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(0)
+    cache.put(("a", ()), httpx.Response(200), 60)
+    assert cache.get(("a", ())) is None
+
+
+async def test_expired_entry_is_stale():
+    cache = ResponseCache(2)
+    cache.put(("a", ()), httpx.Response(200), 0.01)
+    await asyncio.sleep(0.02)
+    entry = cache.get(("a", ()))
+    assert entry is not None and not entry.is_fresh()
+    # Pinning keeps an entry forever
+    cache.pin("a")
+    assert cache.get(("a", ())).is_fresh()
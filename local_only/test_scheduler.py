@@ -0,0 +1,183 @@
+"""
+Tests of the request scheduler: rate limiting, retries, Retry-After and circuit breaking.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from codemagic_mcp import scheduler
+from codemagic_mcp.scheduler import CircuitBreaker, CircuitOpenError, RequestScheduler, TokenBucket, parse_retry_after
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE", 0.001)
+
+
+def make_scheduler(threshold: int = 3, reset_timeout: float = 0.1, max_retries: int = 3) -> RequestScheduler:
+    return RequestScheduler(TokenBucket(0, 0), CircuitBreaker(threshold, reset_timeout), max_retries)
+
+
+def responder(*status_codes: int, headers=None):
+    """Get a send function answering with the given status codes in turn, and the list of its calls."""
+    calls = []
+
+    async def send() -> httpx.Response:
+        calls.append(time.monotonic())
+        return httpx.Response(status_codes[min(len(calls), len(status_codes)) - 1], headers=headers)
+
+    return send, calls
+
+
+async def open_circuit(request_scheduler: RequestScheduler) -> None:
+    failing, _ = responder(500)
+    await request_scheduler.send(failing, idempotent=True)
+    assert request_scheduler.breaker.state == "open"
+
+
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    for _ in range(7):
+        await bucket.acquire()
+    # Two requests go out in the burst, the other five at 50 per second
+    assert 0.08 <= time.monotonic() - started < 0.5
+
+
+async def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.1)
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+async def test_idempotent_request_retried_on_5xx():
+    send, calls = responder(503, 502, 200)
+    response = await make_scheduler().send(send, idempotent=True)
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert response.extensions["retries"] == 2
+
+
+async def test_non_idempotent_request_not_retried_on_5xx():
+    send, calls = responder(503, 200)
+    response = await make_scheduler().send(send, idempotent=False)
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+async def test_non_idempotent_request_retried_on_429():
+    send, calls = responder(429, 200)
+    response = await make_scheduler().send(send, idempotent=False)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_transport_error_retried_until_max_retries():
+    calls = []
+
+    async def send() -> httpx.Response:
+        calls.append(1)
+        raise httpx.ReadError("connection reset")
+
+    with pytest.raises(httpx.ReadError):
+        await make_scheduler(threshold=100, max_retries=2).send(send, idempotent=True)
+    assert len(calls) == 3
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+async def test_retry_after_clamped(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(scheduler, "MAX_RETRY_AFTER", 0.05)
+    send, calls = responder(429, 200, headers={"Retry-After": "3600"})
+    started = time.monotonic()
+    response = await make_scheduler().send(send, idempotent=True)
+    assert response.status_code == 200
+    assert 0.04 <= time.monotonic() - started < 1.0
+
+
+async def test_circuit_opens_and_fails_fast():
+    request_scheduler = make_scheduler(threshold=2, reset_timeout=60, max_retries=0)
+    send, calls = responder(500)
+    for _ in range(2):
+        await request_scheduler.send(send, idempotent=True)
+    assert request_scheduler.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await request_scheduler.send(send, idempotent=True)
+    assert len(calls) == 2
+
+
+async def test_half_open_trial_closes_circuit():
+    request_scheduler = make_scheduler(threshold=1, reset_timeout=0.05, max_retries=0)
+    await open_circuit(request_scheduler)
+    await asyncio.sleep(0.06)
+    assert request_scheduler.breaker.state == "half-open"
+    succeeding, _ = responder(200)
+    await request_scheduler.send(succeeding, idempotent=True)
+    assert request_scheduler.breaker.state == "closed"
+
+
+async def test_failed_trial_reopens_circuit():
+    request_scheduler = make_scheduler(threshold=1, reset_timeout=0.05, max_retries=0)
+    await open_circuit(request_scheduler)
+    await asyncio.sleep(0.06)
+    await open_circuit(request_scheduler)
+
+
+async def test_only_one_trial_while_half_open():
+    request_scheduler = make_scheduler(threshold=1, reset_timeout=0.05, max_retries=0)
+    await open_circuit(request_scheduler)
+    await asyncio.sleep(0.06)
+
+    release = asyncio.Event()
+
+    async def slow() -> httpx.Response:
+        await release.wait()
+        return httpx.Response(200)
+
+    trial = asyncio.create_task(request_scheduler.send(slow, idempotent=True))
+    await asyncio.sleep(0.01)
+    with pytest.raises(CircuitOpenError):
+        await request_scheduler.send(slow, idempotent=True)
+    release.set()
+    assert (await trial).status_code == 200
+    assert request_scheduler.breaker.state == "closed"
+
+
+async def test_cancelled_trial_releases_half_open_circuit():
+    request_scheduler = make_scheduler(threshold=1, reset_timeout=0.05, max_retries=0)
+    await open_circuit(request_scheduler)
+    await asyncio.sleep(0.06)
+
+    async def hang() -> httpx.Response:
+        await asyncio.sleep(3600)
+
+    trial = asyncio.create_task(request_scheduler.send(hang, idempotent=True))
+    await asyncio.sleep(0.01)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    succeeding, calls = responder(200)
+    response = await request_scheduler.send(succeeding, idempotent=True)
+    assert response.status_code == 200 and len(calls) == 1
+    assert request_scheduler.breaker.state == "closed"
+
+
+async def test_unexpected_error_counts_as_failure():
+    request_scheduler = make_scheduler(threshold=1, reset_timeout=60, max_retries=3)
+
+    async def broken() -> httpx.Response:
+        raise RuntimeError("bug in the request")
+
+    with pytest.raises(RuntimeError):
+        await request_scheduler.send(broken, idempotent=True)
+    assert request_scheduler.breaker.state == "open"
@@ -0,0 +1,85 @@
+"""
+Tests of build watching: one shared poller per build, released with its last waiter.
+"""
+import asyncio
+
+import pytest
+
+from codemagic_mcp.watch import BuildWatcher, next_poll_interval
+
+
+@pytest.fixture
+def watcher() -> BuildWatcher:
+    return BuildWatcher()
+
+
+async def started(watcher: BuildWatcher, build_ids, timeout: float = 5) -> asyncio.Task:
+    """Start waiting for builds in a task, and let its pollers make their first request."""
+    task = asyncio.create_task(watcher.wait(build_ids, timeout))
+    await asyncio.sleep(0.05)
+    return task
+
+
+def test_poll_interval_backs_off():
+    assert next_poll_interval("finishing", 0) < next_poll_interval("queued", 0)
+    assert next_poll_interval("building", 300) == 2 * next_poll_interval("building", 0)
+    assert next_poll_interval("building", 10 ** 6) == 60.0
+
+
+async def test_concurrent_waits_share_one_poller(watcher, running_build, requests_made):
+    waits = [await started(watcher, [running_build]) for _ in range(3)]
+    assert list(watcher._pollers) == [running_build]
+    assert watcher._waiters[running_build] == 3
+    assert requests_made() == 1
+
+    watcher.update(running_build, {"_id": running_build, "status": "finished"}, from_event=True)
+    results = await asyncio.gather(*waits)
+    assert all(result[running_build]["done"] and result[running_build]["status"] == "finished" for result in results)
+    # The update resolved the waits without asking the API again
+    assert requests_made() == 1
+    assert not watcher._pollers and not watcher._waiters
+
+
+async def test_poller_kept_while_a_waiter_remains(watcher, running_build):
+    short = await started(watcher, [running_build], timeout=0.1)
+    long = await started(watcher, [running_build])
+    poller = watcher._pollers[running_build]
+    await short
+    assert not poller.done()
+    assert watcher._waiters[running_build] == 1
+    long.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await long
+    await asyncio.wait([poller], timeout=1)
+    assert poller.cancelled()
+
+
+async def test_last_waiter_timing_out_cancels_poller(watcher, running_build):
+    wait = await started(watcher, [running_build], timeout=0.1)
+    poller = watcher._pollers[running_build]
+    await wait
+    await asyncio.wait([poller], timeout=1)
+    assert poller.cancelled()
+    assert not watcher._pollers and not watcher._waiters
+
+
+async def test_timeout_returns_pending_builds(watcher, running_build):
+    results = await watcher.wait([running_build, "build00002"], timeout=0.1)
+    assert results[running_build]["done"] is False
+    assert results[running_build]["status"] == "building"
+    assert results["build00002"]["done"] is True
+
+
+async def test_first_completed_returns_early(watcher, running_build):
+    results = await asyncio.wait_for(
+        watcher.wait([running_build, "build00002"], timeout=5, return_when=asyncio.FIRST_COMPLETED), 1
+    )
+    assert results["build00002"]["done"] is True
+    assert results[running_build]["done"] is False
+
+
+async def test_poll_error_reported_per_build(watcher, running_build):
+    results = await watcher.wait([running_build, "missing"], timeout=0.1)
+    assert results["missing"]["done"] is False
+    assert "HTTPStatusError" in results["missing"]["error"]
+    assert results[running_build]["status"] == "building"
@@ -0,0 +1,94 @@
+"""
+Tests of the webhook receiver: build events posted over HTTP resolve waiting tools and drop cached responses.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from codemagic_mcp import watch
+from codemagic_mcp.base import make_request, peek_cache
+from codemagic_mcp.server import mcp
+from codemagic_mcp.webhooks import WebhookReceiver
+
+SECRET = "webhook-secret"
+
+
+@pytest.fixture(autouse=True)
+def fresh_watchers(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Build states recorded from events must not leak into other tests
+    monkeypatch.setattr(watch, "_watchers", {})
+
+
+@pytest.fixture
+async def receiver():
+    """A receiver listening on a port picked by the system."""
+    receiver = WebhookReceiver("127.0.0.1", 0, SECRET)
+    await receiver.start()
+    yield receiver
+    await receiver.stop()
+
+
+@pytest.fixture
+async def post(receiver: WebhookReceiver):
+    """Get a function posting a payload to a path of the receiver."""
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{receiver.port}") as client:
+        async def send(payload, path: str = "/webhook", token: str = SECRET, **kwargs) -> httpx.Response:
+            return await client.post(path, params={"token": token}, json=payload, **kwargs)
+
+        yield send
+
+
+def finished(build_id: str):
+    return {"build": {"_id": build_id, "status": "finished", "finishedAt": "2026-01-01T00:00:00Z"}}
+
+
+async def test_receiver_picks_free_port(receiver):
+    assert receiver.running
+    assert receiver.port != 0
+
+
+async def test_event_resolves_wait_for_build(post, running_build, requests_made):
+    wait = asyncio.create_task(mcp.call_tool("wait_for_build", {"build_id": running_build, "timeout": 10}))
+    # Let the poller fetch the build once before the event arrives
+    while watch.get_build_watcher().latest(running_build) is None:
+        await asyncio.sleep(0.01)
+    assert requests_made() == 1
+
+    response = await post(finished(running_build))
+    assert response.status_code == 202
+    result = (await asyncio.wait_for(wait, 1))[1]["result"]
+    assert result["done"] is True
+    assert result["status"] == "finished"
+    # The event carried the new state, the build was not fetched again
+    assert requests_made() == 1
+
+
+async def test_event_invalidates_build_cache(post, running_build):
+    await make_request("GET", f"/builds/{running_build}")
+    assert peek_cache(f"/builds/{running_build}") is not None
+    assert (await post(finished(running_build))).status_code == 202
+    assert peek_cache(f"/builds/{running_build}") is None
+
+
+async def test_token_accepted_as_header(receiver, post):
+    response = await post(finished("build00003"), token="", headers={"X-Webhook-Token": SECRET})
+    assert response.status_code == 202
+    assert receiver.received == 1
+
+
+async def test_bad_token_rejected(receiver, post, running_build):
+    response = await post(finished(running_build), token="wrong")
+    assert response.status_code == 401
+    assert receiver.rejected == 1 and receiver.received == 0
+    assert watch.get_build_watcher().latest(running_build) is None
+
+
+async def test_unknown_tenant_rejected(receiver, post):
+    response = await post(finished("build00003"), path="/webhook/no-such-tenant")
+    assert response.status_code == 404
+    assert receiver.received == 0
+
+
+async def test_payload_without_build_id_rejected(post):
+    assert (await post({"build": {"status": "finished"}})).status_code == 400